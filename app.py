@@ -1,8 +1,10 @@
-from flask import Flask
-from app.routes import export, import_routes
+from flask import Flask, jsonify
+from app.jobs import init_job_queue
+from app.routes import export, import_routes, jobs, lookup
 from config.settings import APISettings
-from db.database import init_db
+from db.database import get_version, init_db, start_expiry_sweeper
 from utils.logging import setup_logging
+from utils.metrics import init_metrics
 
 def create_app():
   """Initializē Flask app"""
@@ -12,9 +14,22 @@ def create_app():
   with app.app_context():
     setup_logging()
     init_db()
+    start_expiry_sweeper(app)
+    init_job_queue(app)
+    init_metrics(app)
 
     app.register_blueprint(export.bp)
     app.register_blueprint(import_routes.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(lookup.bp)
+
+  @app.route('/health')
+  def health():
+    """Pārbauda, vai API un datubāze ir pieejama (izmanto host.py pēc ugunsmūra izmaiņām)"""
+    try:
+      return jsonify({'status': 'ok', 'version': get_version()})
+    except Exception as e:
+      return jsonify({'status': 'error', 'error': str(e)}), 503
   
   return app
 
@@ -0,0 +1,138 @@
+import csv
+import glob
+import io
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+import pandas as pd
+from flask import current_app
+from app.jobs import report_ingest, report_progress
+from app.importers.files import BoundedReader, complete_lines_end, make_checkpoint, resume_offset
+from db.database import IngestResult, bulk_ingest, get_checkpoints, get_flow_window, save_flow_window
+
+logger = logging.getLogger(__name__)
+
+IMPORTER = 'elastiflow'
+
+def read_new_rows(path: str, offset: int, end: int, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+  """
+  Nolasa CSV rindas starp offset un end pa daļām.
+  Kolonnu nosaukumi tiek ņemti no faila pirmās rindas, jo lasīšana var sākties faila vidū.
+  """
+  with open(path, 'rb') as f:
+    header = next(csv.reader([f.readline().decode('utf-8', 'replace')]), [])
+    missing = [column for column in columns if column not in header]
+    if missing:
+      raise ValueError(f"Missing columns {missing} in {path}")
+
+    start = max(offset, f.tell())
+    if start >= end:
+      return
+    f.seek(start)
+    yield from pd.read_csv(
+      io.BufferedReader(BoundedReader(f, end)),
+      names=header,
+      header=None,
+      usecols=columns,
+      dtype=str,
+      chunksize=chunk_size
+    )
+
+def find_offenders(flows: pd.Series, pairs: pd.DataFrame, source_column: str,
+                   history_flows: Dict[str, int], history_ports: List[Tuple[str, str]]) -> List[str]:
+  """
+  Atgriež avota adreses, kuru plūsmu skaits sasniedz ELASTIFLOW_MIN_FLOWS
+  vai dažādo mērķa portu skaits sasniedz ELASTIFLOW_MIN_PORTS.
+  Šīs palaišanas rindām tiek pieskaitītas iepriekšējās palaišanās saglabātās vērtības.
+  """
+  config = current_app.config
+  offenders = set()
+  if config['ELASTIFLOW_MIN_FLOWS'] > 0 and len(flows):
+    totals = flows.add(pd.Series(history_flows, dtype='int64'), fill_value=0)
+    offenders.update(totals[totals >= config['ELASTIFLOW_MIN_FLOWS']].index)
+  if config['ELASTIFLOW_MIN_PORTS'] > 0 and len(pairs):
+    history = pd.DataFrame(history_ports, columns=pairs.columns, dtype=str)
+    ports = pd.concat([pairs, history]).drop_duplicates()[source_column].value_counts()
+    offenders.update(ports[ports >= config['ELASTIFLOW_MIN_PORTS']].index)
+  return sorted(offenders)
+
+def import_elastiflow() -> Tuple[IngestResult, dict]:
+  """
+  Apstrādā ELASTIFLOW_DIR CSV failos kopš iepriekšējās palaišanas pievienotās rindas
+  un pievieno melnajam sarakstam adreses, kas pārsniedz konfigurētos sliekšņus.
+  Katram failam tiek saglabāts kontrolpunkts (inode, izmērs, baitu offset), tāpēc
+  katrā palaišanā tiek lasīti tikai jaunie baiti. Sliekšņi attiecas uz pēdējās
+  ELASTIFLOW_WINDOW sekundēs nolasītajām rindām: katras palaišanas plūsmu skaits un porti
+  tiek saglabāti kopā ar kontrolpunktiem, tāpēc lēns skenētājs tiek pamanīts arī tad,
+  ja vienā palaišanā tas nesasniedz slieksni.
+  """
+  config = current_app.config
+  source_column = config['ELASTIFLOW_SRC_COLUMN']
+  port_column = config['ELASTIFLOW_PORT_COLUMN']
+  columns = [source_column] + ([port_column] if port_column else [])
+  checkpoints = get_checkpoints(IMPORTER)
+  started = time.perf_counter()
+
+  stats = {'files': 0, 'bytes_read': 0, 'rows': 0}
+  flows = pd.Series(dtype='int64')
+  pairs = []
+  new_checkpoints = []
+
+  for path in sorted(glob.glob(os.path.join(config['ELASTIFLOW_DIR'], '*.csv'))):
+    try:
+      stat = os.stat(path)
+      offset = resume_offset(path, stat, checkpoints.get(path))
+      with open(path, 'rb') as f:
+        end = complete_lines_end(f, stat.st_size)
+      if end > offset:
+        for chunk in read_new_rows(path, offset, end, columns, config['ELASTIFLOW_CHUNK_SIZE']):
+          chunk = chunk.dropna(subset=[source_column])
+          stats['rows'] += len(chunk)
+          flows = flows.add(chunk[source_column].value_counts(), fill_value=0)
+          if port_column:
+            pairs.append(chunk[[source_column, port_column]].drop_duplicates())
+        stats['files'] += 1
+        stats['bytes_read'] += end - offset
+        report_progress(**stats)
+      new_checkpoints.append(make_checkpoint(path, stat, max(end, offset)))
+    except (OSError, ValueError) as e:
+      logger.error(f"Skipping Elastiflow file {path}: {str(e)}")
+      if path in checkpoints:
+        new_checkpoints.append(checkpoints[path])
+
+  pairs = (
+    pd.concat(pairs).drop_duplicates() if pairs
+    else pd.DataFrame(columns=[source_column, port_column] if port_column else [source_column], dtype=str)
+  )
+  now = datetime.now()
+  since = now - timedelta(seconds=config['ELASTIFLOW_WINDOW'])
+  if config['ELASTIFLOW_WINDOW'] > 0:
+    history_flows, history_ports = get_flow_window(flows.index, since)
+  else:
+    history_flows, history_ports = {}, []
+
+  result = bulk_ingest(
+    find_offenders(flows, pairs, source_column, history_flows, history_ports),
+    'blacklist',
+    IMPORTER,
+    reason='Elastiflow flow threshold exceeded',
+    comment='Imported from elastiflow',
+    progress=report_ingest
+  )
+  # Kontrolpunkti un loga vērtības tiek saglabāti tikai pēc veiksmīga importa
+  save_flow_window(
+    {ip: int(count) for ip, count in flows.items()} if config['ELASTIFLOW_WINDOW'] > 0 else {},
+    pairs.itertuples(index=False, name=None) if port_column and config['ELASTIFLOW_WINDOW'] > 0 else [],
+    now,
+    since,
+    IMPORTER,
+    new_checkpoints
+  )
+  stats['scan_seconds'] = round(time.perf_counter() - started, 3)
+  logger.info(
+    f"Processed {stats['rows']} Elastiflow rows ({stats['bytes_read']} bytes) "
+    f"from {stats['files']} files in {stats['scan_seconds']}s"
+  )
+  return result, stats
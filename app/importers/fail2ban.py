@@ -0,0 +1,148 @@
+import glob
+import gzip
+import io
+import os
+import re
+import time
+import logging
+from typing import Dict, Tuple
+from flask import current_app
+from app.jobs import report_progress
+from app.importers.files import (
+  FINGERPRINT_BYTES, BoundedReader, complete_lines_end, fingerprint_bytes, make_checkpoint, read_head, resume_offset
+)
+from db.database import IngestResult, apply_changes, get_checkpoints
+from utils.validators import validate_fail2ban_file
+
+logger = logging.getLogger(__name__)
+
+IMPORTER = 'fail2ban'
+
+# Piemērs: 2024-01-15 10:30:00,123 fail2ban.actions [1234]: NOTICE  [sshd] Ban 192.168.1.100
+ACTION_PATTERN = re.compile(rb'\[(?P<jail>[^\]]+)\]\s+(?P<action>Restore Ban|Ban|Unban)\s+(?P<ip>[0-9A-Fa-f:.]+)')
+
+def rotation_key(path: str) -> tuple:
+  """
+  Sakārto žurnālus no vecākā uz jaunāko: pēc izmaiņu laika, tad pēc rotācijas numura
+  (fail2ban.log.2.gz, fail2ban.log.1, fail2ban.log).
+  """
+  name = os.path.basename(path)
+  if name.endswith('.gz'):
+    name = name[:-3]
+  suffix = name.rsplit('.', 1)[-1]
+  return os.stat(path).st_mtime, -int(suffix) if suffix.isdigit() else 0
+
+def find_offset(path: str, stat: os.stat_result, checkpoints: Dict[str, dict]) -> Tuple[int, bool]:
+  """
+  Atrod, cik baitu no faila jau ir apstrādāts (gzip failiem - atspiestā satura baitu).
+  Kontrolpunkts tiek meklēts pēc inode, bet pārsauktiem kopētiem vai saspiestiem
+  rotētiem failiem - pēc sākuma baitu nospieduma. Otrā vērtība ir True, ja
+  nemainīts gzip fails jau ir pilnībā apstrādāts.
+  """
+  compressed = path.endswith('.gz')
+  for checkpoint in checkpoints.values():
+    if checkpoint['inode'] != stat.st_ino:
+      continue
+    if compressed and checkpoint['path'].endswith('.gz') and checkpoint['size'] == stat.st_size:
+      return checkpoint['offset'], True
+    if not compressed:
+      offset = resume_offset(path, stat, checkpoint)
+      if offset:
+        return offset, False
+
+  head = read_head(path)
+  offset = 0
+  for checkpoint in checkpoints.values():
+    length = min(checkpoint['offset'], FINGERPRINT_BYTES)
+    if length and checkpoint['fingerprint'] == fingerprint_bytes(head, length):
+      offset = max(offset, checkpoint['offset'])
+  if not compressed and offset > stat.st_size:
+    return 0, False
+  return offset, False
+
+def scan_lines(lines, actions: Dict[str, Tuple[str, str]]) -> int:
+  """
+  Atjaunina katras adreses pēdējo darbību (ban/unban un jail) un atgriež nolasīto baitu skaitu.
+  """
+  consumed = 0
+  for line in lines:
+    consumed += len(line)
+    if b'Ban ' not in line and b'Unban ' not in line:
+      continue
+    match = ACTION_PATTERN.search(line)
+    if match is None:
+      continue
+    action = 'unban' if match.group('action') == b'Unban' else 'ban'
+    actions[match.group('ip').decode('ascii')] = (action, match.group('jail').decode('utf-8', 'replace'))
+  return consumed
+
+def scan_file(path: str, stat: os.stat_result, offset: int, actions: Dict[str, Tuple[str, str]]) -> int:
+  """
+  Apstrādā faila rindas pēc offset un atgriež jauno offset.
+  Parastiem failiem nepabeigtā pēdējā rinda tiek atstāta nākamajai reizei.
+  """
+  if path.endswith('.gz'):
+    with gzip.open(path, 'rb') as f:
+      f.seek(offset)
+      return offset + scan_lines(f, actions)
+
+  with open(path, 'rb') as f:
+    end = complete_lines_end(f, stat.st_size)
+    if end <= offset:
+      return offset
+    f.seek(offset)
+    scan_lines(io.BufferedReader(BoundedReader(f, end)), actions)
+    return end
+
+def import_fail2ban() -> Tuple[IngestResult, dict]:
+  """
+  Apstrādā jaunās Ban/Unban rindas FAIL2BAN_DIR žurnālos (arī rotētos un gzip saspiestos).
+  Katrai adresei tiek ņemta pēdējā darbība: bloķētās tiek pievienotas melnajam sarakstam,
+  atbloķētās - dzēstas no fail2ban avota ierakstiem. Izmaiņas un kontrolpunkti tiek
+  saglabāti vienā transakcijā, tāpēc izmaksas ir atkarīgas tikai no jauno rindu apjoma.
+  """
+  checkpoints = get_checkpoints(IMPORTER)
+  started = time.perf_counter()
+  stats = {'files': 0, 'bytes_read': 0}
+  actions = {}
+  new_checkpoints = []
+
+  paths = [
+    path for path in glob.glob(os.path.join(current_app.config['FAIL2BAN_DIR'], '*'))
+    if validate_fail2ban_file(path)
+  ]
+  for path in sorted(paths, key=rotation_key):
+    try:
+      stat = os.stat(path)
+      offset, complete = find_offset(path, stat, checkpoints)
+      if complete:
+        new_checkpoints.append(make_checkpoint(path, stat, offset))
+        continue
+      end = scan_file(path, stat, offset, actions)
+      if end > offset:
+        stats['files'] += 1
+        stats['bytes_read'] += end - offset
+        report_progress(**stats)
+      new_checkpoints.append(make_checkpoint(path, stat, end))
+    except (OSError, EOFError) as e:
+      logger.error(f"Skipping fail2ban file {path}: {str(e)}")
+      if path in checkpoints:
+        new_checkpoints.append(checkpoints[path])
+
+  bans = {ip: f'fail2ban {jail}' for ip, (action, jail) in actions.items() if action == 'ban'}
+  unbans = [ip for ip, (action, _) in actions.items() if action == 'unban']
+  result = apply_changes(
+    'blacklist',
+    IMPORTER,
+    bans,
+    unbans,
+    comment='Imported from fail2ban',
+    importer=IMPORTER,
+    checkpoints=new_checkpoints
+  )
+  stats.update(bans=len(bans), unbans=len(unbans), scan_seconds=round(time.perf_counter() - started, 3))
+  logger.info(
+    f"Processed {stats['bytes_read']} fail2ban log bytes from {stats['files']} files "
+    f"({len(bans)} bans, {len(unbans)} unbans) in {stats['scan_seconds']}s"
+  )
+  return result, stats
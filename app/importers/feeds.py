@@ -0,0 +1,244 @@
+import hashlib
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from app.jobs import report_progress
+from db.database import apply_changes, get_feed_state, get_source_ips, has_feed_entries, missing_feed_entries, missing_ips
+from utils.iprange import parse_network
+from utils.metrics import record_import
+
+logger = logging.getLogger(__name__)
+
+def parse_lines(text: str) -> Iterator[str]:
+  """
+  Viena adrese vai tīkls katrā rindā. Tukšas rindas un komentāri (# vai ;) tiek izlaisti,
+  no rindas tiek ņemts pirmais vārds (piemēram, "1.10.16.0/20 ; SBL256894").
+  """
+  for line in text.splitlines():
+    line = line.split('#', 1)[0].split(';', 1)[0].strip()
+    if line:
+      yield line.split()[0]
+
+@dataclass
+class Feed:
+  """
+  Ārēja adrešu saraksta (barotnes) apraksts.
+  ttl ir ierakstu noklusējuma derīguma laiks (SOURCE_TTLS to var aizstāt),
+  interval - cik sekundes pēc pēdējās pārbaudes barotne netiek lejupielādēta atkārtoti.
+  """
+  name: str
+  url: str
+  source: str
+  parser: Callable[[str], Iterable[str]] = parse_lines
+  ttl: Optional[int] = None
+  interval: int = 3600
+  list_type: str = 'blacklist'
+  reason: Optional[str] = None
+
+FEEDS: Dict[str, Feed] = {}
+
+def register_feed(feed: Feed) -> Feed:
+  FEEDS[feed.name] = feed
+  return feed
+
+register_feed(Feed(
+  name='blocklist.de',
+  url='https://lists.blocklist.de/lists/all.txt',
+  source='blocklist.de',
+  ttl=172800,
+  interval=1800,
+  reason='Reported to blocklist.de'
+))
+register_feed(Feed(
+  name='spamhaus-drop',
+  url='https://www.spamhaus.org/drop/drop.txt',
+  source='spamhaus-drop',
+  ttl=259200,
+  interval=43200,
+  reason='Spamhaus DROP'
+))
+register_feed(Feed(
+  name='et-compromised',
+  url='https://rules.emergingthreats.net/blockrules/compromised-ips.txt',
+  source='et-compromised',
+  ttl=172800,
+  interval=3600,
+  reason='Emerging Threats compromised host'
+))
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+  """Koplietota HTTP sesija ar savienojumu pūlu visām barotnēm"""
+  global _session
+  with _session_lock:
+    if _session is None:
+      _session = requests.Session()
+      adapter = HTTPAdapter(pool_connections=8, pool_maxsize=current_app.config['FEED_WORKERS'])
+      _session.mount('http://', adapter)
+      _session.mount('https://', adapter)
+    return _session
+
+def _config_map(value: str) -> Dict[str, str]:
+  """Nolasa "nosaukums=vērtība,..." konfigurāciju"""
+  result = {}
+  for item in value.split(','):
+    name, _, setting = item.partition('=')
+    if name.strip() and setting.strip():
+      result[name.strip()] = setting.strip()
+  return result
+
+def feed_url(feed: Feed) -> str:
+  """Barotnes URL; FEED_URLS var to aizstāt (piemēram, testiem ar vietēju serveri)"""
+  return _config_map(current_app.config['FEED_URLS']).get(feed.name, feed.url)
+
+def enabled_feeds() -> List[Feed]:
+  names = [name.strip() for name in current_app.config['FEEDS_ENABLED'].split(',') if name.strip()]
+  unknown = [name for name in names if name not in FEEDS]
+  if unknown:
+    raise ValueError(f'Unknown feeds in FEEDS_ENABLED: {unknown}')
+  return [FEEDS[name] for name in names]
+
+def _is_due(feed: Feed, state: Optional[dict], now: datetime) -> bool:
+  if state is None:
+    return True
+  return datetime.fromisoformat(str(state['checked_at'])) + timedelta(seconds=feed.interval) <= now
+
+def import_feed(feed: Feed, force: bool = False) -> dict:
+  """
+  Lejupielādē barotni ar nosacījuma pieprasījumu (If-None-Match / If-Modified-Since)
+  un piemēro tikai atšķirības pret avota pašreizējiem ierakstiem: jaunās adreses tiek
+  pievienotas, vairs neesošās - dzēstas. Ja saturs nav mainījies (304 vai tas pats
+  nospiedums), tiek tikai pagarināts ierakstu derīguma termiņš un atjaunotas barotnes adreses,
+  kas pa to laiku izdzēstas no saraksta (piemēram, ja tās bija cita avota ieraksti).
+  Adreses, kas jau ir citu avotu ierakstos, netiek ievietotas atkārtoti.
+  Ja kopš pēdējās pārbaudes nav pagājis feed.interval un nav force, barotne tiek izlaista.
+  """
+  url = feed_url(feed)
+  now = datetime.now()
+  state = get_feed_state(feed.name)
+  # Bez saglabātās adrešu kopas 304 atbildes gadījumā nevarētu atjaunot dzēstās adreses
+  if state is not None and (state['url'] != url or not has_feed_entries(feed.name)):
+    state = None
+  if not force and not _is_due(feed, state, now):
+    return {'feed': feed.name, 'status': 'skipped'}
+
+  headers = {}
+  if state is not None and state['etag']:
+    headers['If-None-Match'] = state['etag']
+  if state is not None and state['last_modified']:
+    headers['If-Modified-Since'] = state['last_modified']
+
+  started = time.perf_counter()
+  response = get_session().get(url, headers=headers, timeout=current_app.config['FEED_TIMEOUT'])
+  fetch_seconds = time.perf_counter() - started
+  if response.status_code not in (200, 304):
+    raise RuntimeError(f'Failed to fetch {feed.name}: HTTP {response.status_code}')
+
+  new_state = dict(state or {}, feed=feed.name, url=url, checked_at=str(now))
+  if response.status_code == 200:
+    new_state['etag'] = response.headers.get('ETag')
+    new_state['last_modified'] = response.headers.get('Last-Modified')
+    digest = hashlib.sha1(response.content).hexdigest()
+    unchanged = state is not None and state['digest'] == digest
+    new_state['digest'] = digest
+  else:
+    unchanged = True
+
+  removed, entries, networks = [], None, None
+  if not unchanged:
+    new_state['changed_at'] = str(now)
+    networks = set()
+    invalid = 0
+    # Barotnes parasti nenorāda kodējumu, un requests minējums var būt nepareizs (piemēram, UTF-16)
+    for value in feed.parser(response.content.decode('utf-8', errors='replace')):
+      parsed = parse_network(value)
+      if parsed is None:
+        invalid += 1
+      else:
+        networks.add(parsed[0])
+    current = get_source_ips(feed.list_type, feed.source)
+    # Tukša atbilde (piemēram, kļūdas lapa) nedrīkst izdzēst visus avota ierakstus
+    if not networks and current:
+      raise RuntimeError(f'Feed {feed.name} returned no valid addresses')
+    added = missing_ips(feed.list_type, networks)
+    removed = list(current - networks)
+    entries = len(networks)
+  else:
+    added = missing_feed_entries(feed.name, feed.list_type)
+
+  result = apply_changes(
+    feed.list_type,
+    feed.source,
+    dict.fromkeys(added, feed.reason),
+    removed,
+    comment=f'Imported from {feed.name}',
+    default_ttl=feed.ttl,
+    renew=True,
+    feed_state=new_state,
+    feed_entries=networks
+  )
+  if not unchanged:
+    result.invalid += invalid
+  record_import(f'feed:{feed.name}', result)
+
+  status = 'unchanged' if unchanged else 'updated'
+  logger.info(
+    f"Feed {feed.name} {status} (HTTP {response.status_code}, {len(response.content)} bytes "
+    f"in {fetch_seconds:.3f}s): {result.inserted} added, {result.removed} removed"
+  )
+  return dict(
+    result.to_dict(),
+    feed=feed.name,
+    status=status,
+    entries=entries,
+    fetch_seconds=round(fetch_seconds, 3),
+    message=f'Added {result.inserted} and removed {result.removed} IPs from {feed.name}'
+  )
+
+def import_feeds(names: Optional[List[str]] = None, force: bool = False) -> dict:
+  """
+  Vienlaikus (FEED_WORKERS pavedienos) atjaunina norādītās vai visas ieslēgtās barotnes.
+  Vienas barotnes kļūda neaptur pārējās, un tā tiek atgriezta tās rezultātā.
+  """
+  if names is None:
+    feeds = enabled_feeds()
+  else:
+    unknown = [name for name in names if name not in FEEDS]
+    if unknown:
+      raise ValueError(f'Unknown feeds: {unknown}')
+    feeds = [FEEDS[name] for name in names]
+
+  app = current_app._get_current_object()
+  results = {}
+
+  def run(feed: Feed) -> dict:
+    with app.app_context():
+      try:
+        return import_feed(feed, force)
+      except Exception as e:
+        logger.error(f"Feed {feed.name} import failed: {str(e)}")
+        return {'feed': feed.name, 'status': 'failed', 'error': str(e)}
+
+  with ThreadPoolExecutor(max_workers=max(1, min(len(feeds), app.config['FEED_WORKERS']))) as executor:
+    for feed, result in zip(feeds, executor.map(run, feeds)):
+      results[feed.name] = result
+      report_progress(feeds_done=len(results), feeds_total=len(feeds))
+
+  updated = [result for result in results.values() if result['status'] == 'updated']
+  failed = [result for result in results.values() if result['status'] == 'failed']
+  return {
+    'feeds': list(results.values()),
+    'inserted': sum(result['inserted'] for result in updated),
+    'removed': sum(result['removed'] for result in updated),
+    'failed': len(failed),
+    'message': f'Updated {len(updated)} of {len(feeds)} feeds ({len(failed)} failed)'
+  }
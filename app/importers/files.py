@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import io
+import os
+from typing import Optional
+
+# Cik sākuma baitu tiek izmantoti faila nospiedumam
+FINGERPRINT_BYTES = 1024
+
+def file_fingerprint(path: str, length: int = FINGERPRINT_BYTES) -> Optional[str]:
+  """
+  Atgriež faila pirmo baitu SHA-1 nospiedumu, ar kuru atpazīst aizstātu vai
+  no jauna izveidotu failu ar to pašu inode. Gzip failiem tiek izmantots
+  atspiestais saturs, tāpēc saspiests rotēts fails atbilst oriģinālam.
+  """
+  if length <= 0:
+    return None
+  return fingerprint_bytes(read_head(path, length), length)
+
+def read_head(path: str, length: int = FINGERPRINT_BYTES) -> bytes:
+  """Nolasa faila (gzip failiem atspiestā satura) pirmos baitus"""
+  opener = gzip.open if path.endswith('.gz') else open
+  with opener(path, 'rb') as f:
+    return f.read(length)
+
+def fingerprint_bytes(head: bytes, length: int) -> Optional[str]:
+  if length <= 0 or len(head) < length:
+    return None
+  return hashlib.sha1(head[:length]).hexdigest()
+
+def resume_offset(path: str, stat: os.stat_result, checkpoint: Optional[dict]) -> int:
+  """
+  Atgriež baitu offset, no kura turpināt faila lasīšanu.
+  Ja fails ir cits (mainīts inode, samazināts izmērs vai atšķirīgs sākums), lasīšana sākas no 0.
+  """
+  if checkpoint is None or checkpoint['inode'] != stat.st_ino or stat.st_size < checkpoint['offset']:
+    return 0
+  length = min(checkpoint['offset'], FINGERPRINT_BYTES)
+  if checkpoint['fingerprint'] != file_fingerprint(path, length):
+    return 0
+  return checkpoint['offset']
+
+def make_checkpoint(path: str, stat: os.stat_result, offset: int) -> dict:
+  return {
+    'path': path,
+    'inode': stat.st_ino,
+    'size': stat.st_size,
+    'offset': offset,
+    'fingerprint': file_fingerprint(path, min(offset, FINGERPRINT_BYTES))
+  }
+
+def complete_lines_end(f, size: int, block: int = 65536) -> int:
+  """
+  Atgriež pozīciju aiz pēdējā pilnā rindas beigu simbola, lai netiktu nolasīta
+  rinda, ko rakstītājs vēl nav pabeidzis.
+  """
+  position = size
+  while position > 0:
+    start = max(0, position - block)
+    f.seek(start)
+    data = f.read(position - start)
+    index = data.rfind(b'\n')
+    if index >= 0:
+      return start + index + 1
+    position = start
+  return 0
+
+class BoundedReader(io.RawIOBase):
+  """
+  Lasa failu no pašreizējās pozīcijas līdz norādītajam offset.
+  """
+  def __init__(self, f, end: int):
+    self._f = f
+    self._end = end
+
+  def readable(self) -> bool:
+    return True
+
+  def readinto(self, buffer) -> int:
+    remaining = self._end - self._f.tell()
+    if remaining <= 0:
+      return 0
+    view = memoryview(buffer)[:remaining]
+    return self._f.readinto(view)
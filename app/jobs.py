@@ -0,0 +1,161 @@
+import threading
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Darbs, ko izpilda pašreizējais darba pavediens (progresa ziņošanai)
+_current = threading.local()
+
+class QueueFull(Exception):
+  """Rindā jau ir maksimālais neizpildīto darbu skaits"""
+
+class Job:
+  """
+  Viens fona importa darbs ar stāvokli (queued, running, succeeded, failed),
+  progresu, rezultātu un izpildes laikiem.
+  """
+  def __init__(self, name: str, keys: Sequence[str] = ()):
+    self.id = uuid.uuid4().hex
+    self.name = name
+    self.keys = tuple(keys)
+    self.state = 'queued'
+    self.progress = {}
+    self.result = None
+    self.error = None
+    self.submitted_at = datetime.now()
+    self.started_at = None
+    self.finished_at = None
+
+  @property
+  def done(self) -> bool:
+    return self.state in ('succeeded', 'failed')
+
+  @property
+  def duration(self) -> Optional[float]:
+    if self.started_at is None:
+      return None
+    return ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+
+  def to_dict(self) -> dict:
+    return {
+      'id': self.id,
+      'name': self.name,
+      'state': self.state,
+      'progress': self.progress,
+      'result': self.result,
+      'error': self.error,
+      'submitted_at': self.submitted_at.isoformat(),
+      'started_at': self.started_at.isoformat() if self.started_at else None,
+      'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+      'duration': round(self.duration, 3) if self.duration is not None else None
+    }
+
+class JobQueue:
+  """
+  Ierobežots fona darbu izpildītājs importiem.
+  Vienlaikus darbojas IMPORT_WORKERS pavedieni, un rindā var gaidīt ne vairāk kā
+  IMPORT_QUEUE_SIZE darbi. Darbi ar vienādu atslēgu (avotu), kamēr kāds no tiem
+  vēl nav pabeigts, tiek apvienoti vienā. Darbam var būt vairākas atslēgas (piemēram,
+  visu barotņu atjaunināšanai - katras barotnes atslēga), un tas tiek apvienots ar
+  jebkuru nepabeigtu darbu, kuram ir kāda no tām.
+  """
+  def __init__(self, app):
+    self.app = app
+    workers = app.config['IMPORT_WORKERS']
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-job')
+    self._limit = workers + app.config['IMPORT_QUEUE_SIZE']
+    self._history = app.config['JOB_HISTORY']
+    self._jobs = OrderedDict()
+    self._active = {}
+    self._lock = threading.Lock()
+
+  def submit(self, name: str, func: Callable[[], dict],
+             key: Union[str, Sequence[str], None] = None) -> Tuple[Job, bool]:
+    """
+    Pievieno darbu rindai. Atgriež darbu un False, ja tas apvienots ar jau esošu darbu.
+    """
+    keys = (key,) if isinstance(key, str) else tuple(key or ())
+    with self._lock:
+      for item in keys:
+        if item in self._active:
+          return self._active[item], False
+      pending = sum(1 for job in self._jobs.values() if not job.done)
+      if pending >= self._limit:
+        raise QueueFull(f'Import queue is full ({pending} pending jobs)')
+      job = Job(name, keys)
+      self._jobs[job.id] = job
+      for item in keys:
+        self._active[item] = job
+      self._prune()
+    self._executor.submit(self._run, job, func)
+    return job, True
+
+  def _run(self, job: Job, func: Callable[[], dict]):
+    job.state = 'running'
+    job.started_at = datetime.now()
+    _current.job = job
+    try:
+      with self.app.app_context():
+        job.result = func()
+      if isinstance(job.result, dict) and 'error' in job.result:
+        job.error = job.result['error']
+        job.state = 'failed'
+      else:
+        job.state = 'succeeded'
+    except Exception as e:
+      job.error = str(e)
+      job.state = 'failed'
+      logger.error(f"Job {job.name} ({job.id}) failed: {str(e)}")
+    finally:
+      _current.job = None
+      job.finished_at = datetime.now()
+      with self._lock:
+        for item in job.keys:
+          if self._active.get(item) is job:
+            del self._active[item]
+    logger.info(f"Job {job.name} ({job.id}) {job.state} in {job.duration:.3f}s")
+
+  def _prune(self):
+    """Aizmirst vecākos pabeigtos darbus, ja to ir vairāk par JOB_HISTORY"""
+    for job_id in list(self._jobs):
+      if len(self._jobs) <= self._history:
+        break
+      if self._jobs[job_id].done:
+        del self._jobs[job_id]
+
+  def get(self, job_id: str) -> Optional[Job]:
+    return self._jobs.get(job_id)
+
+  def recent(self, limit: int = 50) -> List[Job]:
+    with self._lock:
+      return list(self._jobs.values())[-limit:][::-1]
+
+def init_job_queue(app) -> JobQueue:
+  """Izveido lietojumprogrammas importu darbu rindu"""
+  queue = JobQueue(app)
+  app.extensions['jobs'] = queue
+  return queue
+
+def get_job_queue() -> JobQueue:
+  return current_app.extensions['jobs']
+
+def report_progress(**values):
+  """Atjaunina pašreizējā fona darba progresu; ārpus darba neko nedara"""
+  job = getattr(_current, 'job', None)
+  if job is not None:
+    job.progress.update(values)
+
+def report_ingest(result):
+  """bulk_ingest progresa funkcija, kas ziņo apstrādāto rindu skaitu"""
+  report_progress(
+    inserted=result.inserted,
+    duplicates=result.duplicates,
+    invalid=result.invalid,
+    rows_per_second=round(result.rows_per_second, 1)
+  )
@@ -1,9 +1,9 @@
-from pydantic import BaseModel, IPvAnyAddress
-from typing import List, Optional
+from pydantic import BaseModel, IPvAnyAddress, IPvAnyNetwork
+from typing import List, Optional, Union
 from datetime import datetime
 
 class IPEntry(BaseModel):
-  ip: IPvAnyAddress
+  ip: Union[IPvAnyAddress, IPvAnyNetwork]
   source: str
   added_at: datetime = datetime.now()
   reason: Optional[str] = None
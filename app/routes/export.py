@@ -1,13 +1,175 @@
-from flask import Blueprint, jsonify, request, send_file, current_app
-from db.database import get_blacklist, get_whitelist
-from app.models.schemas import ExportFilter
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from db.database import get_blacklist, get_blacklist_snapshot, get_blacklist_delta, get_page, iter_entries, get_snapshot_tag, get_version, get_whitelist_ranges, add_change_listener
+from utils.cache import ExportCache
+from utils.iprange import aggregate_networks, ip_to_range, pack_ranges
+from utils.notify import ChangeNotifier
 import csv
+import gzip
 import io
+import json
 import logging
+import time
 
 bp = Blueprint('export', __name__, url_prefix='/export')
 logger = logging.getLogger(__name__)
 
+CSV_FIELDS = ['ip', 'source', 'added_at', 'reason', 'comment', 'expires_at']
+
+# Gatavās eksportu atbildes; tiek iztukšotas pēc katras šī procesa rakstīšanas
+export_cache = ExportCache()
+add_change_listener(export_cache.invalidate)
+
+# Pamodina izmaiņu straumes un ilgās aptaujas pieprasījumus pēc rakstīšanas
+change_notifier = ChangeNotifier()
+add_change_listener(change_notifier.notify)
+
+def get_page_args():
+  """
+  Nolasa keyset lapošanas parametrus ?limit=&after= (limit None nozīmē bez lapošanas).
+  after ir iepriekšējās atbildes next vērtība: rowid vai "rowid:n".
+  """
+  limit = request.args.get('limit', type=int)
+  if limit is not None:
+    limit = max(1, min(limit, current_app.config['EXPORT_MAX_PAGE_SIZE']))
+  return limit, request.args.get('after')
+
+def get_aggregate_args():
+  """Nolasa ?aggregate=true&max_prefix=&max_prefix6= parametrus"""
+  if request.args.get('aggregate', 'false').lower() not in ('true', '1', 't'):
+    return None
+  limits = {}
+  for name, bits in (('max_prefix', 32), ('max_prefix6', 128)):
+    value = request.args.get(name, type=int)
+    if value is not None and not 0 <= value <= bits:
+      raise ValueError(f'{name} must be between 0 and {bits}')
+    limits[name] = value
+  return limits
+
+def aggregated_networks(limits: dict) -> tuple:
+  """
+  Atgriež datu versiju un melno sarakstu, apvienotu minimālā CIDR kopā.
+  Baltais saraksts tiek atņemts vēlreiz pēc paplašināšanas līdz max_prefix.
+  """
+  version, blacklist = get_blacklist_snapshot()
+  return version, aggregate_networks(
+    (ip_to_range(entry['ip']) for entry in blacklist),
+    excluded=get_whitelist_ranges(),
+    **limits
+  )
+
+def stream_csv(chunks):
+  """
+  Ģenerē CSV rindas pa daļām; galvene tiek nosūtīta pirms vaicājuma izpildes.
+  Kļūda straumes vidū tiek izmesta tālāk, lai savienojums tiktu pārtraukts un klients
+  nesaņemtu nepilnu, bet korektu failu.
+  """
+  buffer = io.StringIO()
+  writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+  writer.writeheader()
+  yield buffer.getvalue()
+  try:
+    for entries in chunks:
+      buffer.seek(0)
+      buffer.truncate()
+      writer.writerows(entries)
+      yield buffer.getvalue()
+  except Exception as e:
+    logger.error(f"CSV export stream failed: {str(e)}")
+    raise
+
+def stream_json(chunks):
+  """
+  Ģenerē JSON masīvu pa daļām. Ja straume neizdodas, masīvs netiek aizvērts,
+  tāpēc klients nevar nepilnu sarakstu uzskatīt par pilnu.
+  """
+  yield '['
+  separator = ''
+  try:
+    for entries in chunks:
+      if entries:
+        yield separator + ','.join(current_app.json.dumps(entry) for entry in entries)
+        separator = ','
+  except Exception as e:
+    logger.error(f"JSON export stream failed: {str(e)}")
+    raise
+  yield ']'
+
+def wait_for_change(version: int, timeout: float) -> bool:
+  """
+  Gaida, līdz datu versija atšķiras no norādītās, vai līdz beidzas timeout.
+  Šī procesa izmaiņas pamodina uzreiz; citu procesu (piemēram, citu API darba
+  procesu) izmaiņas tiek pamanītas ik pēc STREAM_POLL_INTERVAL sekundēm.
+  """
+  deadline = time.monotonic() + timeout
+  poll = current_app.config['STREAM_POLL_INTERVAL']
+  while True:
+    generation = change_notifier.generation
+    if get_version() != version:
+      return True
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      return False
+    change_notifier.wait(generation, min(poll, remaining))
+
+def sse_event(event: str, data: dict, event_id: int = None) -> str:
+  lines = [f'id: {event_id}'] if event_id is not None else []
+  lines.append(f'event: {event}')
+  lines.append(f'data: {json.dumps(data)}')
+  return '\n'.join(lines) + '\n\n'
+
+def stream_changes(since: int):
+  """
+  Ģenerē SSE notikumus: delta ar melnā saraksta izmaiņām pēc katras jaunas versijas,
+  keepalive komentāru ik pēc STREAM_KEEPALIVE sekundēm un resync, ja izmaiņas
+  kopš klienta versijas vairs nav pieejamas. Pēc STREAM_MAX_SECONDS straume tiek
+  aizvērta, un klients pievienojas no jauna ar pēdējo saņemto versiju.
+  """
+  config = current_app.config
+  deadline = time.monotonic() + config['STREAM_MAX_SECONDS']
+  yield f"retry: {config['STREAM_RETRY_MS']}\n\n"
+  while time.monotonic() < deadline:
+    delta = get_blacklist_delta(since)
+    if delta is None:
+      yield sse_event('resync', {'since': since})
+      return
+    if delta['version'] != since:
+      delta['format'] = 'delta'
+      yield sse_event('delta', delta, event_id=delta['version'])
+      since = delta['version']
+
+    while not wait_for_change(since, min(config['STREAM_KEEPALIVE'], max(deadline - time.monotonic(), 0))):
+      if time.monotonic() >= deadline:
+        return
+      yield ': keepalive\n\n'
+
+def cached_response(key: str, render, mimetype: str = 'application/json') -> Response:
+  """
+  Atgriež eksportu, kas sagatavots vienreiz katrai datu versijai, ar stipru ETag.
+  Ja klienta If-None-Match sakrīt, atbild ar 304 bez satura.
+  render atgriež vārdnīcu (tiek kodēta JSON) vai gatavus baitus.
+  """
+  etag = f'{key}-{get_snapshot_tag()}'
+  if request.if_none_match.contains(etag):
+    response = Response(status=304)
+  else:
+    def encode():
+      body = render()
+      return body if isinstance(body, bytes) else current_app.json.dumps(body).encode('utf-8')
+    response = Response(export_cache.get_or_render(key, etag, encode), mimetype=mimetype)
+  response.set_etag(etag)
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
+
+def csv_response(chunks, filename: str) -> Response:
+  return Response(
+    stream_with_context(stream_csv(chunks)),
+    mimetype='text/csv',
+    headers={'Content-Disposition': f'attachment; filename={filename}'}
+  )
+
+def json_response(chunks) -> Response:
+  return Response(stream_with_context(stream_json(chunks)), mimetype='application/json')
+
 @bp.route('/blacklist', methods=['GET'])
 def export_blacklist():
   """Eksportē melno sarakstu CSV or JSON"""
@@ -18,25 +180,21 @@ def export_blacklist():
   try:
     # Get blacklist
     logger.info("Called /export/blacklist endpoint")
-    blacklist = get_blacklist(source=source)
-    
+    limit, after = get_page_args()
+    if limit:
+      blacklist, next_cursor = get_page('blacklist', source=source, limit=limit, after=after)
+      if export_format != 'csv':
+        return jsonify({'entries': blacklist, 'next': next_cursor})
+      response = csv_response(iter([blacklist]), 'blacklist.csv')
+      if next_cursor:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+      return response
+
+    # Stream rows from the cursor in chunks instead of building the whole table in memory
+    chunks = iter_entries('blacklist', source=source)
     if export_format == 'csv':
-      # Create CSV in memory
-      output = io.StringIO()
-      writer = csv.DictWriter(output, fieldnames=['ip', 'source', 'added_at', 'reason', 'comment'])
-      writer.writeheader()
-      writer.writerows(blacklist)
-      
-      # Create response
-      output.seek(0)
-      return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='blacklist.csv'
-      )
-    else:
-      return jsonify(blacklist)
+      return csv_response(chunks, 'blacklist.csv')
+    return json_response(chunks)
       
   except Exception as e:
     logger.error(f"Blacklist export failed: {str(e)}")
@@ -52,25 +210,21 @@ def export_whitelist():
   try:
     # Get whitelist
     logger.info("Called /export/whitelist endpoint")
-    whitelist = get_whitelist(source=source)
-    
+    limit, after = get_page_args()
+    if limit:
+      whitelist, next_cursor = get_page('whitelist', source=source, limit=limit, after=after)
+      if export_format != 'csv':
+        return jsonify({'entries': whitelist, 'next': next_cursor})
+      response = csv_response(iter([whitelist]), 'whitelist.csv')
+      if next_cursor:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+      return response
+
+    # Stream rows from the cursor in chunks instead of building the whole table in memory
+    chunks = iter_entries('whitelist', source=source)
     if export_format == 'csv':
-      # Create CSV in memory
-      output = io.StringIO()
-      writer = csv.DictWriter(output, fieldnames=['ip', 'source', 'added_at', 'reason', 'comment'])
-      writer.writeheader()
-      writer.writerows(whitelist)
-      
-      # Create response
-      output.seek(0)
-      return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='whitelist.csv'
-      )
-    else:
-      return jsonify(whitelist)
+      return csv_response(chunks, 'whitelist.csv')
+    return json_response(chunks)
       
   except Exception as e:
     logger.error(f"Whitelist export failed: {str(e)}")
@@ -78,20 +232,66 @@ def export_whitelist():
 
 @bp.route('/iptables', methods=['GET'])
 def export_iptables():
-  """Eksportē aktīvo melno sarkastu JSON"""
+  """Eksportē aktīvo melno sarkastu JSON vai tā izmaiņas kopš klienta versijas"""
   try:
-    # Get current blacklist excluding expired entries
+    since = request.args.get('since', type=int)
     logger.info("Called /export/iptables endpoint")
-    blacklist = get_blacklist()
-    
-    # Extract just the IPs
-    ips = [entry['ip'] for entry in blacklist]
-    
-    return jsonify({
-      'count': len(ips),
-      'ips': ips,
-      'format': 'plain'
-    })
+
+    limits = get_aggregate_args()
+    if limits is not None:
+      def render_aggregated():
+        version, networks = aggregated_networks(limits)
+        return {
+          'count': len(networks),
+          'ips': networks,
+          'version': version,
+          'aggregated': True,
+          'format': 'plain'
+        }
+
+      key = f"iptables-aggregated-{limits['max_prefix']}-{limits['max_prefix6']}"
+      return cached_response(key, render_aggregated)
+
+    if since is not None:
+      delta = get_blacklist_delta(since)
+      # Ilgā aptauja: ar ?wait=N atbilde tiek aizturēta līdz pirmajai izmaiņai
+      wait = min(request.args.get('wait', 0, type=float), current_app.config['STREAM_MAX_WAIT'])
+      if delta is not None and wait > 0 and not delta['added'] and not delta['removed']:
+        if wait_for_change(delta['version'], wait):
+          delta = get_blacklist_delta(since)
+      if delta is not None:
+        delta['format'] = 'delta'
+        return jsonify(delta)
+      if request.args.get('full', 'true').lower() in ('false', '0', 'f'):
+        # Klients pilno sarakstu ielādēs citā formātā (piemēram, binārā)
+        return jsonify({'since': since, 'format': 'resync'})
+
+    limit, after = get_page_args()
+    if limit:
+      blacklist, next_cursor = get_page('blacklist', limit=limit, after=after)
+      ips = [entry['ip'] for entry in blacklist]
+      return jsonify({
+        'count': len(ips),
+        'ips': ips,
+        'next': next_cursor,
+        'format': 'plain'
+      })
+
+    def render():
+      # Get current blacklist excluding expired entries
+      version, blacklist = get_blacklist_snapshot()
+      
+      # Extract just the IPs
+      ips = [entry['ip'] for entry in blacklist]
+      
+      return {
+        'count': len(ips),
+        'ips': ips,
+        'version': version,
+        'format': 'plain'
+      }
+
+    return cached_response('iptables', render)
     
   except Exception as e:
     logger.error(f"Iptables export failed: {str(e)}")
@@ -102,19 +302,93 @@ def export_iptables_rules():
   """Eksportē aktīvo melno sarkastu iptables komandu formātā"""
   try:
     logger.info("Called /export/iptables/rules endpoint")
-    blacklist = get_blacklist()
-    rules = []
-    for entry in blacklist:
-      rules.append(
-        f"iptables -A INPUT -s {entry['ip']} -j DROP # {entry['source']}"
-      )
-    
-    return jsonify({
-      'count': len(rules),
-      'rules': rules,
-      'format': 'iptables'
-    })
+
+    limits = get_aggregate_args()
+    if limits is not None:
+      def render_aggregated():
+        _, networks = aggregated_networks(limits)
+        rules = [f"iptables -A INPUT -s {network} -j DROP # aggregated" for network in networks]
+        return {
+          'count': len(rules),
+          'rules': rules,
+          'aggregated': True,
+          'format': 'iptables'
+        }
+
+      key = f"iptables-rules-aggregated-{limits['max_prefix']}-{limits['max_prefix6']}"
+      return cached_response(key, render_aggregated)
+
+    def render():
+      blacklist = get_blacklist()
+      rules = []
+      for entry in blacklist:
+        rules.append(
+          f"iptables -A INPUT -s {entry['ip']} -j DROP # {entry['source']}"
+        )
+      
+      return {
+        'count': len(rules),
+        'rules': rules,
+        'format': 'iptables'
+      }
+
+    return cached_response('iptables-rules', render)
     
   except Exception as e:
     logger.error(f"Iptables rules export failed: {str(e)}")
-    return jsonify({'error': str(e)}), 400
\ No newline at end of file
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/iptables/binary', methods=['GET'])
+def export_iptables_binary():
+  """Eksportē aktīvo melno sarakstu kompaktā binārā diapazonu formātā (gzip, ja klients to atbalsta)"""
+  try:
+    logger.info("Called /export/iptables/binary endpoint")
+    compress = 'gzip' in request.accept_encodings
+
+    def render():
+      version, blacklist = get_blacklist_snapshot()
+      body = pack_ranges(version, (ip_to_range(entry['ip']) for entry in blacklist))
+      return gzip.compress(body, compresslevel=6, mtime=0) if compress else body
+
+    response = cached_response(
+      'iptables-binary-gzip' if compress else 'iptables-binary',
+      render,
+      mimetype='application/octet-stream'
+    )
+    if compress:
+      response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+  except Exception as e:
+    logger.error(f"Iptables binary export failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/stream', methods=['GET'])
+def export_stream():
+  """
+  Straumē melnā saraksta izmaiņas kopš klienta versijas kā server-sent events.
+  Versiju norāda ar ?since= vai Last-Event-ID galveni (automātiskai atjaunošanai).
+  """
+  try:
+    since = request.args.get('since', type=int)
+    if since is None:
+      since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+      return jsonify({'error': 'Missing since parameter'}), 400
+
+    logger.info(f"Opened change stream since version {since}")
+    return Response(
+      stream_with_context(stream_changes(since)),
+      mimetype='text/event-stream',
+      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+  except Exception as e:
+    logger.error(f"Change stream failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/cache', methods=['GET'])
+def export_cache_stats():
+  """Atgriež eksportu keša trāpījumu un netrāpījumu skaitītājus"""
+  return jsonify(export_cache.stats())
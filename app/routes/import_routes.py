@@ -1,12 +1,18 @@
-from flask import Blueprint, jsonify, request
-from db.database import add_to_blacklist, add_to_whitelist, bulk_add, bulk_add_to_blacklist, bulk_add_to_whitelist
-from app.models.schemas import IPEntry, BulkImportRequest
-from utils.validators import validate_ip, parse_ip_range
-import os
-import csv
-import requests
+from flask import Blueprint, jsonify, request, url_for
+from db.database import LIST_TYPES, add_to_blacklist, add_to_whitelist, bulk_ingest
+from app.models.schemas import IPEntry
+from app.jobs import QueueFull, get_job_queue, report_ingest
+from app.importers.elastiflow import import_elastiflow
+from app.importers.fail2ban import import_fail2ban
+from app.importers.feeds import FEEDS, enabled_feeds, import_feed, import_feeds
+from utils.validators import validate_ip
+from utils.iprange import normalize_network
+from utils.metrics import record_import
+import io
+import shutil
+import tempfile
+import json
 import logging
-from datetime import datetime
 
 bp = Blueprint('import', __name__, url_prefix='/import')
 logger = logging.getLogger(__name__)
@@ -21,8 +27,12 @@ def import_single():
       return jsonify({'error': 'Invalid IP address'}), 400
       
     list_type = data.get('type', 'blacklist')
+    if list_type not in LIST_TYPES:
+      return jsonify({'error': f'Invalid list type {list_type}'}), 400
+    ttl = data.get('ttl')
+    ttl = int(ttl) if ttl is not None else None
     entry = IPEntry(
-      ip=ip,
+      ip=normalize_network(ip),
       source=data.get('source', 'manual'),
       comment=data.get('comment'),
       reason=data.get('reason')
@@ -33,14 +43,16 @@ def import_single():
         ip=str(entry.ip),
         source=entry.source,
         reason=entry.reason,
-        comment=entry.comment
+        comment=entry.comment,
+        ttl=ttl
       )
     else:
       message = add_to_whitelist(
         ip=str(entry.ip),
         source=entry.source,
         reason=entry.reason,
-        comment=entry.comment
+        comment=entry.comment,
+        ttl=ttl
       )
     
     return jsonify({'message': message}), 201
@@ -49,69 +61,188 @@ def import_single():
     logger.error(f"Single import failed: {str(e)}")
     return jsonify({'error': str(e)}), 400
 
+def read_lines(stream):
+  """Nolasa saturu pa rindām, neielādējot to visu atmiņā"""
+  for line in io.TextIOWrapper(stream, encoding='utf-8', errors='replace'):
+    yield line.strip()
+
+def text_addresses(lines):
+  """Viena adrese katrā rindā; tukšas rindas un # komentāri tiek izlaisti"""
+  for line in lines:
+    yield None if not line or line.startswith('#') else line
+
+def ndjson_addresses(lines):
+  """Katrā rindā JSON virkne vai objekts ar lauku ip; nederīgas rindas tiek nodotas kā noraidāmas"""
+  for line in lines:
+    if not line:
+      yield None
+      continue
+    try:
+      item = json.loads(line)
+    except ValueError:
+      yield line
+      continue
+    yield item.get('ip', line) if isinstance(item, dict) else item
+
+def wants_async(default: bool) -> bool:
+  value = request.args.get('async')
+  if value is None:
+    return default
+  return value.lower() in ('true', '1', 't')
+
+def run_import(name: str, func, key=None, default_async: bool = True):
+  """
+  Izpilda importu fona darbu rindā (202 ar darba id) vai pieprasījuma laikā (201 ar rezultātu).
+  Režīmu var mainīt ar ?async=true|false. Darbi ar kopīgu key (viena atslēga vai saraksts), kamēr iepriekšējais
+  vēl nav pabeigts, tiek apvienoti, un atbildē tiek atgriezts esošais darbs.
+  """
+  if not wants_async(default_async):
+    result = func()
+    return jsonify(result), 400 if 'error' in result else 201
+
+  try:
+    job, created = get_job_queue().submit(name, func, key=key)
+  except QueueFull as e:
+    return jsonify({'error': str(e)}), 503
+
+  location = url_for('jobs.get_job', job_id=job.id)
+  response = jsonify(dict(job.to_dict(), coalesced=not created, location=location))
+  response.headers['Location'] = location
+  return response, 202
+
+def spool_body():
+  """
+  Saglabā pieprasījuma saturu pagaidu failā, lai fona darbs to varētu nolasīt pēc atbildes.
+  Līdz 8 MB saturs paliek atmiņā.
+  """
+  spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+  shutil.copyfileobj(request.stream, spool)
+  spool.seek(0)
+  return spool
+
 @bp.route('/bulk', methods=['POST'])
 def import_bulk():
-  """Importē vairākas IP adreses melnajā vai baltajā sarakstā"""
+  """
+  Importē vairākas IP adreses melnajā vai baltajā sarakstā.
+  JSON saturs satur sarakstu ips; NDJSON un teksta saturs tiek apstrādāts straumēti,
+  un importa parametri tiek norādīti vaicājuma virknē. Ar ?async=true imports tiek
+  izpildīts fona darbā.
+  """
   try:
-    data = request.get_json()
+    background = wants_async(False)
+    if request.is_json:
+      data = request.get_json()
+      body = None
+    else:
+      data = request.args
+      body = spool_body() if background else request.stream
+      ndjson = 'ndjson' in request.mimetype or 'jsonl' in request.mimetype
+
     list_type = data.get('type', 'blacklist') 
+    if list_type not in LIST_TYPES:
+      return jsonify({'error': f'Invalid list type {list_type}'}), 400
     source = data.get('source', 'bulk-import')
-    entries = []
-
-    for ip in data['ips']:
-      validated_ip = validate_ip(ip)
-      if validated_ip:
-        if '/' in validated_ip:
-          ip_list = parse_ip_range(validated_ip)
-          entries.extend([
-            (
-              ip, 
-              source, 
-              datetime.now(), 
-              data.get('reason'), 
-              data.get('comment')
-            )
-            for ip in ip_list
-          ])
-        else:
-          entries.append(
-            (
-              validated_ip, 
-              source, 
-              datetime.now(), 
-              data.get('reason'), 
-              data.get('comment')
-            )
-          )
+    reason = data.get('reason')
+    comment = data.get('comment')
+    ttl = data.get('ttl')
+    ttl = int(ttl) if ttl is not None else None
+
+    def run():
+      if body is None:
+        ips = iter(data['ips'])
+      else:
+        lines = read_lines(body)
+        ips = ndjson_addresses(lines) if ndjson else text_addresses(lines)
+
+      # CIDR tīkli tiek saglabāti kā viens diapazona ieraksts, nevis izvērsti pa hostiem
+      result = bulk_ingest(
+        ips,
+        list_type,
+        source,
+        reason=reason,
+        comment=comment,
+        ttl=ttl,
+        progress=report_ingest
+      )
+      record_import('bulk', result)
+      if not result.inserted and not result.duplicates:
+        return dict(result.to_dict(), error='No valid IPs provided')
+      return result.to_dict()
+
+    return run_import(f'bulk:{source}', run, default_async=False)
     
-    if not entries:
-      return jsonify({'error': 'No valid IPs provided'}), 400
+  except Exception as e:
+    logger.error(f"Bulk import failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+def wants_force() -> bool:
+  return request.args.get('force', 'false').lower() in ('true', '1', 't')
 
-    message = bulk_add(entries, list_type, source)
+@bp.route('/feeds', methods=['GET','POST'])
+def import_feeds_route():
+  """
+  Atjaunina visas ieslēgtās ārējās barotnes (FEEDS_ENABLED), kurām pienācis atjaunināšanas laiks.
+  Ar ?force=true barotnes tiek pārbaudītas neatkarīgi no intervāla.
+  """
+  try:
+    force = wants_force()
+    # Katras barotnes atslēga neļauj to vienlaikus atjaunināt arī /import/feeds/<name> darbam
+    keys = [f'feed:{feed.name}' for feed in enabled_feeds()]
+    return run_import('feeds', lambda: import_feeds(force=force), key=keys)
     
-    return jsonify({'message': message}), 201
+  except Exception as e:
+    logger.error(f"Feed import failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/feeds/<name>', methods=['GET','POST'])
+def import_feed_route(name):
+  """Atjaunina vienu ārējo barotni"""
+  try:
+    feed = FEEDS.get(name)
+    if feed is None:
+      return jsonify({'error': f'Unknown feed {name}'}), 404
+    force = wants_force()
+    return run_import(name, lambda: import_feed(feed, force), key=f'feed:{name}')
     
   except Exception as e:
-    logger.error(f"Bulk import failed: {str(e)}")
+    logger.error(f"Feed {name} import failed: {str(e)}")
     return jsonify({'error': str(e)}), 400
 
 @bp.route('/blocklist_de', methods=['GET','POST'])
 def import_blocklist_de():
-  """Importē IP adreses no blocklist.de"""
+  """Importē IP adreses no blocklist.de (pēc noklusējuma fona darbā)"""
+  return import_feed_route('blocklist.de')
+
+def run_elastiflow() -> dict:
+  result, stats = import_elastiflow()
+  record_import('elastiflow', result)
+  return dict(result.to_dict(), **stats, message=f'Added {result.inserted} IPs from elastiflow')
+
+@bp.route('/elastiflow', methods=['GET','POST'])
+def import_elastiflow_route():
+  """Importē adreses, kas pārsniedz plūsmu sliekšņus, no jaunajām Elastiflow CSV rindām"""
   try:
-    response = requests.get('https://api.blocklist.de/getlast.php?time=3600')
-    if response.status_code != 200:
-      return jsonify({'error': 'Failed to fetch from blocklist.de'}), 500
-      
-    ips = response.text.strip().split('\n')
-    entries = [
-      (ip, 'blocklist.de', datetime.now(), None, None, 'Imported from blocklist.de')
-      for ip in ips if validate_ip(ip)
-    ]
+    return run_import('elastiflow', run_elastiflow, key='elastiflow')
     
-    bulk_add_to_blacklist(entries)
-    return jsonify({'message': f'Added {len(entries)} IPs from blocklist.de'}), 201
+  except Exception as e:
+    logger.error(f"Elastiflow import failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+def run_fail2ban() -> dict:
+  result, stats = import_fail2ban()
+  record_import('fail2ban', result)
+  return dict(
+    result.to_dict(),
+    **stats,
+    message=f'Added {result.inserted} and removed {result.removed} IPs from fail2ban'
+  )
+
+@bp.route('/fail2ban', methods=['GET','POST'])
+def import_fail2ban_route():
+  """Piemēro jaunās fail2ban Ban/Unban darbības melnajam sarakstam"""
+  try:
+    return run_import('fail2ban', run_fail2ban, key='fail2ban')
     
   except Exception as e:
-    logger.error(f"Blocklist.de import failed: {str(e)}")
+    logger.error(f"Fail2ban import failed: {str(e)}")
     return jsonify({'error': str(e)}), 400
@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, request
+from app.jobs import get_job_queue
+import logging
+
+bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+logger = logging.getLogger(__name__)
+
+@bp.route('', methods=['GET'])
+def list_jobs():
+  """Atgriež pēdējos importa darbus, sākot ar jaunāko"""
+  try:
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'jobs': [job.to_dict() for job in get_job_queue().recent(limit)]})
+
+  except Exception as e:
+    logger.error(f"Job listing failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+  """Atgriež importa darba stāvokli, progresu, rezultātu un ilgumu"""
+  job = get_job_queue().get(job_id)
+  if job is None:
+    return jsonify({'error': 'Job not found'}), 404
+  return jsonify(job.to_dict())
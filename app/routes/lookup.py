@@ -0,0 +1,95 @@
+from flask import Blueprint, jsonify, request, current_app
+from db.database import lookup_ip, lookup_ips, get_blacklist_matcher, get_entries_by_id
+from utils.ipmatch import MatchResult
+import numpy as np
+import pandas as pd
+import io
+import logging
+
+bp = Blueprint('lookup', __name__, url_prefix='/lookup')
+logger = logging.getLogger(__name__)
+
+@bp.route('', methods=['GET'])
+def lookup():
+  """Pārbauda, vai IP adrese ir bloķēta, un atgriež to saturošo ierakstu un avotu"""
+  try:
+    ip = request.args.get('ip')
+    if not ip:
+      return jsonify({'error': 'Missing ip parameter'}), 400
+
+    result = lookup_ip(ip)
+    if 'error' in result:
+      return jsonify(result), 400
+    return jsonify(result)
+
+  except Exception as e:
+    logger.error(f"Lookup failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/batch', methods=['POST'])
+def lookup_batch():
+  """Pārbauda vairākas IP adreses vienā pieprasījumā"""
+  try:
+    data = request.get_json()
+    ips = data.get('ips')
+    if not isinstance(ips, list):
+      return jsonify({'error': 'ips must be a list'}), 400
+
+    max_batch = current_app.config['LOOKUP_MAX_BATCH']
+    if len(ips) > max_batch:
+      return jsonify({'error': f'At most {max_batch} IPs per request'}), 400
+
+    results = lookup_ips(ips)
+    return jsonify({
+      'results': results,
+      'blocked': sum(1 for result in results if result.get('blocked'))
+    })
+
+  except Exception as e:
+    logger.error(f"Batch lookup failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
+
+@bp.route('/match', methods=['POST'])
+def lookup_match():
+  """
+  Vektorizēti salīdzina augšupielādētu CSV vai NDJSON adrešu sarakstu ar melno sarakstu.
+  Adreses tiek nolasītas no kolonnas ?column= (noklusējums ip) pa MATCH_CHUNK_SIZE rindām.
+  """
+  try:
+    column = request.args.get('column', 'ip')
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    mimetype = upload.mimetype if upload else request.mimetype
+    filename = upload.filename if upload else ''
+    chunk_size = current_app.config['MATCH_CHUNK_SIZE']
+
+    if 'ndjson' in mimetype or 'jsonl' in mimetype or filename.endswith(('.ndjson', '.jsonl')):
+      reader = pd.read_json(io.TextIOWrapper(stream, encoding='utf-8'), lines=True, chunksize=chunk_size, dtype=False)
+    else:
+      reader = pd.read_csv(stream, usecols=[column], dtype=str, chunksize=chunk_size)
+
+    matcher = get_blacklist_matcher()
+    results = []
+    for chunk in reader:
+      if column not in chunk:
+        return jsonify({'error': f'Missing column {column}'}), 400
+      results.append(matcher.match(chunk[column].tolist()))
+    result = MatchResult.concat(results)
+
+    ids = result.ids.astype(object)
+    ids[result.ids < 0] = None
+    matched_ids = np.unique(result.ids[result.hits]).tolist()
+    entries = get_entries_by_id(matched_ids)
+
+    return jsonify({
+      'total': len(result.hits),
+      'matched': result.matched,
+      'invalid': result.invalid,
+      'hits': result.hits.tolist(),
+      'ids': ids.tolist(),
+      'entries': {str(entry_id): entry for entry_id, entry in entries.items()}
+    })
+
+  except Exception as e:
+    logger.error(f"Match failed: {str(e)}")
+    return jsonify({'error': str(e)}), 400
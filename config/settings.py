@@ -7,8 +7,43 @@ class APISettings:
   API_PORT: int = int(os.getenv('API_PORT', 5000))
   DATABASE_PATH: str = os.getenv('DATABASE_PATH', 'saraksts.db')
   ELASTIFLOW_DIR: str = os.getenv('ELASTIFLOW_DIR', 'data/elastiflow')
+  ELASTIFLOW_SRC_COLUMN: str = os.getenv('ELASTIFLOW_SRC_COLUMN', 'flow.src.ip.addr')
+  ELASTIFLOW_PORT_COLUMN: str = os.getenv('ELASTIFLOW_PORT_COLUMN', 'flow.dst.l4.port.id')
+  ELASTIFLOW_MIN_FLOWS: int = int(os.getenv('ELASTIFLOW_MIN_FLOWS', 1000))
+  ELASTIFLOW_MIN_PORTS: int = int(os.getenv('ELASTIFLOW_MIN_PORTS', 100))
+  ELASTIFLOW_CHUNK_SIZE: int = int(os.getenv('ELASTIFLOW_CHUNK_SIZE', 100000))
+  ELASTIFLOW_WINDOW: int = int(os.getenv('ELASTIFLOW_WINDOW', 3600))
   FAIL2BAN_DIR: str = os.getenv('FAIL2BAN_DIR', 'data/fail2ban')
   LOG_DIR: str = os.getenv('LOG_DIR', 'logs')
+  LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+  LOG_RATE_LIMITS: str = os.getenv('LOG_RATE_LIMITS', 'db.database=50,app.routes=50,app.importers=50')
+  DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 8))
+  DB_SYNCHRONOUS: str = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+  DB_CACHE_SIZE: int = int(os.getenv('DB_CACHE_SIZE', -65536))
+  DB_MMAP_SIZE: int = int(os.getenv('DB_MMAP_SIZE', 268435456))
+  DB_BUSY_TIMEOUT: float = float(os.getenv('DB_BUSY_TIMEOUT', 30))
+  CHANGELOG_RETENTION: int = int(os.getenv('CHANGELOG_RETENTION', 100000))
+  IMPORT_CHUNK_SIZE: int = int(os.getenv('IMPORT_CHUNK_SIZE', 20000))
+  IMPORT_MAX_REJECTS: int = int(os.getenv('IMPORT_MAX_REJECTS', 100))
+  IMPORT_WORKERS: int = int(os.getenv('IMPORT_WORKERS', 2))
+  IMPORT_QUEUE_SIZE: int = int(os.getenv('IMPORT_QUEUE_SIZE', 16))
+  JOB_HISTORY: int = int(os.getenv('JOB_HISTORY', 200))
+  FEEDS_ENABLED: str = os.getenv('FEEDS_ENABLED', 'blocklist.de')
+  FEED_URLS: str = os.getenv('FEED_URLS', '')
+  FEED_WORKERS: int = int(os.getenv('FEED_WORKERS', 4))
+  FEED_TIMEOUT: float = float(os.getenv('FEED_TIMEOUT', 60))
+  EXPORT_MAX_PAGE_SIZE: int = int(os.getenv('EXPORT_MAX_PAGE_SIZE', 10000))
+  EXPORT_CHUNK_SIZE: int = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+  STREAM_KEEPALIVE: float = float(os.getenv('STREAM_KEEPALIVE', 15))
+  STREAM_POLL_INTERVAL: float = float(os.getenv('STREAM_POLL_INTERVAL', 5))
+  STREAM_MAX_SECONDS: float = float(os.getenv('STREAM_MAX_SECONDS', 3600))
+  STREAM_MAX_WAIT: float = float(os.getenv('STREAM_MAX_WAIT', 60))
+  STREAM_RETRY_MS: int = int(os.getenv('STREAM_RETRY_MS', 5000))
+  SOURCE_TTLS: str = os.getenv('SOURCE_TTLS', 'blocklist.de=172800')
+  EXPIRY_SWEEP_INTERVAL: int = int(os.getenv('EXPIRY_SWEEP_INTERVAL', 60))
+  EXPIRY_SWEEP_BATCH: int = int(os.getenv('EXPIRY_SWEEP_BATCH', 500))
+  LOOKUP_MAX_BATCH: int = int(os.getenv('LOOKUP_MAX_BATCH', 10000))
+  MATCH_CHUNK_SIZE: int = int(os.getenv('MATCH_CHUNK_SIZE', 100000))
   DEBUG: bool = os.getenv('FLASK_DEBUG', 'True').lower() in ('true', '1', 't')
 
 @dataclass
@@ -16,10 +51,23 @@ class HostSettings:
   HOST_API_URL: str = os.getenv('HOST_API_URL', 'http://localhost:5000')
   IPFW_TABLE: int = int(os.getenv('IPFW_TABLE', 2))
   IPFW_RULE: int = int(os.getenv('IPFW_RULE', 1035))
+  IPFW_BIN: str = os.getenv('IPFW_BIN', 'ipfw')
+  IPFW_STANDBY_TABLE: int = int(os.getenv('IPFW_STANDBY_TABLE', 3))
+  IPFW_BATCH_SIZE: int = int(os.getenv('IPFW_BATCH_SIZE', 10000))
+  IPFW_SWAP_THRESHOLD: int = int(os.getenv('IPFW_SWAP_THRESHOLD', 1000))
+  SYNC_MODE: str = os.getenv('HOST_SYNC_MODE', 'poll')
+  SYNC_INTERVAL: int = int(os.getenv('HOST_SYNC_INTERVAL', 60))
+  STREAM_TIMEOUT: float = float(os.getenv('HOST_STREAM_TIMEOUT', 60))
+  STATE_FILE: str = os.getenv('HOST_STATE_FILE', 'data/host_state.bin')
+  DRIFT_CHECK_INTERVAL: int = int(os.getenv('HOST_DRIFT_CHECK_INTERVAL', 3600))
   LOG_FILE: str = os.getenv('HOST_LOG_FILE', 'logs/host.log')
 
 @dataclass
 class ControllerSettings:
   CONTROLLER_API_URL: str = os.getenv('CONTROLLER_API_URL', 'http://localhost:5000')
   SCAN_INTERVAL: int = int(os.getenv('SCAN_INTERVAL', 300))
+  SOURCE_INTERVALS: str = os.getenv('SOURCE_INTERVALS', 'feeds=300,elastiflow=300,fail2ban=60')
+  SCHEDULE_JITTER: float = float(os.getenv('SCHEDULE_JITTER', 0.1))
+  WORKERS: int = int(os.getenv('CONTROLLER_WORKERS', 3))
+  RETRY_BASE: float = float(os.getenv('RETRY_BASE', 10))
   LOG_FILE: str = os.getenv('CONTROLLER_LOG_FILE', 'logs/controller.log')
\ No newline at end of file
@@ -1,89 +1,394 @@
 import sqlite3
-from datetime import datetime
-from typing import List, Optional
+import ipaddress
+import queue
+import threading
+import atexit
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from contextlib import contextmanager
 from flask import current_app
+from utils.iprange import range_columns, unpack_address, ip_to_range, range_to_cidrs, range_overlaps, subtract_ranges, merge_ranges, flatten_ranges, parse_network
+from utils.iptrie import PrefixTrie
+from utils.ipmatch import MatchResult, RangeMatcher
+from utils.metrics import DB_CONNECTIONS_OPENED, observe_query
 import logging
 
 logger = logging.getLogger(__name__)
 
+LIST_TYPES = ('blacklist', 'whitelist')
+
+def check_list_type(list_type: str) -> str:
+  """
+  Pārbauda saraksta veidu, jo tas tiek ievietots SQL vaicājumā kā tabulas nosaukums.
+  """
+  if list_type not in LIST_TYPES:
+    raise ValueError(f'Invalid list type {list_type!r}, expected one of {", ".join(LIST_TYPES)}')
+  return list_type
+
+# Kolonnas, kas tiek atgrieztas API lietotājiem
+ENTRY_COLUMNS = 'ip, source, added_at, reason, comment, expires_at'
+ENTRY_FIELDS = tuple(ENTRY_COLUMNS.split(', '))
+EXPIRES_AT = ENTRY_FIELDS.index('expires_at')
+
+# Nosacījums, kas izslēdz ierakstus ar beigušos derīguma termiņu (izmanto expires_at indeksu)
+ACTIVE_FILTER = '(expires_at IS NULL OR expires_at > ?)'
+
+# Tas pats nosacījums visas tabulas nolasīšanai: unārais + neļauj izmantot expires_at indeksu,
+# jo MULTI-INDEX OR plāns katru rindu nolasa ar atsevišķu meklēšanu tabulā
+ACTIVE_SCAN_FILTER = '(+expires_at IS NULL OR +expires_at > ?)'
+
+class TimedConnection(sqlite3.Connection):
+  """
+  SQLite savienojums, kas mēra katra execute/executemany un commit izpildes laiku.
+  SELECT vaicājumiem tiek mērīts laiks līdz pirmajai rindai, nevis visa rezultāta nolasīšana.
+  """
+  def execute(self, sql, parameters=()):
+    started = time.perf_counter()
+    try:
+      return super().execute(sql, parameters)
+    finally:
+      observe_query(sql, time.perf_counter() - started)
+
+  def executemany(self, sql, parameters):
+    started = time.perf_counter()
+    try:
+      return super().executemany(sql, parameters)
+    finally:
+      observe_query(sql, time.perf_counter() - started)
+
+  def commit(self):
+    started = time.perf_counter()
+    try:
+      super().commit()
+    finally:
+      observe_query('COMMIT', time.perf_counter() - started)
+
+class ConnectionPool:
+  """
+  Uztur atvērtus SQLite savienojumus, lai pieprasījumi tos izmantotu atkārtoti.
+  Katrs savienojums tiek atvērts WAL režīmā ar konfigurācijā norādītajām pragmām.
+  """
+  def __init__(self, path: str, size: int, pragmas: dict, timeout: float):
+    self.path = path
+    self.pragmas = pragmas
+    self.timeout = timeout
+    self._idle = queue.LifoQueue(maxsize=size)
+
+  def _connect(self) -> sqlite3.Connection:
+    db = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, factory=TimedConnection)
+    DB_CONNECTIONS_OPENED.inc()
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    for name, value in self.pragmas.items():
+      db.execute(f'PRAGMA {name}={value}')
+    return db
+
+  def acquire(self) -> sqlite3.Connection:
+    try:
+      return self._idle.get_nowait()
+    except queue.Empty:
+      return self._connect()
+
+  def release(self, db: sqlite3.Connection):
+    # Nepabeigta transakcija nedrīkst palikt atvērta un turēt rakstīšanas slēdzeni
+    if db.in_transaction:
+      db.rollback()
+    try:
+      self._idle.put_nowait(db)
+    except queue.Full:
+      db.close()
+
+  def close(self):
+    while True:
+      try:
+        self._idle.get_nowait().close()
+      except queue.Empty:
+        break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+  """
+  Atgriež savienojumu pūlu konfigurētajai datubāzei, ja nepieciešams, to izveidojot.
+  """
+  config = current_app.config
+  path = config['DATABASE_PATH']
+  pool = _pools.get(path)
+  if pool is None:
+    with _pools_lock:
+      pool = _pools.get(path)
+      if pool is None:
+        pool = ConnectionPool(
+          path,
+          size=config['DB_POOL_SIZE'],
+          pragmas={
+            'synchronous': config['DB_SYNCHRONOUS'],
+            'cache_size': config['DB_CACHE_SIZE'],
+            'mmap_size': config['DB_MMAP_SIZE'],
+          },
+          timeout=config['DB_BUSY_TIMEOUT']
+        )
+        _pools[path] = pool
+  return pool
+
+@atexit.register
+def close_pools():
+  """
+  Aizver visus pūlos esošos savienojumus.
+  """
+  with _pools_lock:
+    for pool in _pools.values():
+      pool.close()
+    _pools.clear()
+
 @contextmanager
 def get_db():
   """
-  Izveido savienojumu ar datubāzi un nodrošina, ka tas tiek aizvērts pēc lietošanas.
+  Paņem savienojumu no pūla un pēc lietošanas to atgriež atpakaļ.
   """
-  db = sqlite3.connect(current_app.config['DATABASE_PATH'])
-  db.row_factory = sqlite3.Row
+  pool = get_pool()
+  db = pool.acquire()
   try:
     yield db
   finally:
-    db.close()
+    pool.release(db)
 
 def init_db():
   """
   Inicializē datubāzi, izveidojot nepieciešamās tabulas, ja tās nepastāv.
+  Katrs ieraksts glabā arī skaitlisku adrešu diapazonu (family, range_start, range_end),
+  lai CIDR tīkls aizņemtu vienu rindu. Diapazonu kolonnām nav indeksa, jo tās tiek
+  nolasītas tikai pilnā saraksta ielādē, un adrešu meklēšana notiek atmiņas prefiksu kokos.
   """
   with get_db() as db:
+    for list_type in LIST_TYPES:
+      db.execute(f'''
+        CREATE TABLE IF NOT EXISTS {list_type} (
+          ip TEXT PRIMARY KEY,
+          source TEXT NOT NULL,
+          added_at TIMESTAMP NOT NULL,
+          reason TEXT,
+          comment TEXT,
+          expires_at TIMESTAMP,
+          family INTEGER,
+          range_start BLOB,
+          range_end BLOB
+        )
+      ''')
+      _migrate_ranges(db, list_type)
+      _migrate_expiry(db, list_type)
+      # Indekss katrai ievietotajai rindai maksāja ~20% importa ātruma, bet neviens vaicājums to neizmantoja
+      db.execute(f'DROP INDEX IF EXISTS idx_{list_type}_range')
+      db.execute(f'CREATE INDEX IF NOT EXISTS idx_{list_type}_source ON {list_type} (source)')
+      # added_at indekss netiek veidots: neviens vaicājums pēc tā nefiltrē un nekārto, bet tas samazināja importa ātrumu par ~25%
+      db.execute(f'DROP INDEX IF EXISTS idx_{list_type}_added_at')
+      db.execute(f'CREATE INDEX IF NOT EXISTS idx_{list_type}_expires_at ON {list_type} (expires_at)')
+    _init_changelog(db)
     db.execute('''
-      CREATE TABLE IF NOT EXISTS blacklist (
-        ip TEXT PRIMARY KEY,
-        source TEXT NOT NULL,
-        added_at TIMESTAMP NOT NULL,
-        reason TEXT,
-        comment TEXT
+      CREATE TABLE IF NOT EXISTS import_checkpoints (
+        importer TEXT NOT NULL,
+        path TEXT NOT NULL,
+        inode INTEGER,
+        size INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        fingerprint TEXT,
+        updated_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (importer, path)
       )
     ''')
-    
     db.execute('''
-      CREATE TABLE IF NOT EXISTS whitelist (
-        ip TEXT PRIMARY KEY,
-        source TEXT NOT NULL,
-        added_at TIMESTAMP NOT NULL,
-        reason TEXT,
-        comment TEXT
+      CREATE TABLE IF NOT EXISTS feed_state (
+        feed TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        digest TEXT,
+        checked_at TIMESTAMP NOT NULL,
+        changed_at TIMESTAMP
+      )
+    ''')
+    db.execute('''
+      CREATE TABLE IF NOT EXISTS flow_counts (
+        ip TEXT NOT NULL,
+        seen_at TIMESTAMP NOT NULL,
+        flows INTEGER NOT NULL
+      )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_flow_counts_ip ON flow_counts (ip, seen_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_flow_counts_seen_at ON flow_counts (seen_at)')
+    db.execute('''
+      CREATE TABLE IF NOT EXISTS flow_ports (
+        ip TEXT NOT NULL,
+        port TEXT NOT NULL,
+        seen_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (ip, port)
+      )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_flow_ports_seen_at ON flow_ports (seen_at)')
+    db.execute('''
+      CREATE TABLE IF NOT EXISTS feed_entries (
+        feed TEXT NOT NULL,
+        ip TEXT NOT NULL,
+        PRIMARY KEY (feed, ip)
       )
     ''')
     db.commit()
+  compact_changelog()
 
-def add_to_blacklist(ip: str, source: str, reason: Optional[str], comment: Optional[str]) -> str:
+def _init_changelog(db: sqlite3.Connection):
   """
-  Pievieno vienu IP melnajam sarakstam.
-  Ja IP jau pastāv melnajā sarakstā, atgriež brīdinājuma ziņojumu.
+  Izveido versiju izmaiņu žurnālu un trigerus, kas tajā ieraksta katru dzēšanu
+  abos sarakstos. Pievienošanas ieraksta pati ievietošana (_log_inserts), vienā
+  vaicājumā katrai daļai, jo trigeris katrai ievietotajai rindai samazināja
+  masveida importa ātrumu par ~25%.
+  """
+  created = db.execute(
+    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'changelog'"
+  ).fetchone() is None
+
+  db.execute('''
+    CREATE TABLE IF NOT EXISTS changelog (
+      version INTEGER PRIMARY KEY AUTOINCREMENT,
+      list_type TEXT NOT NULL,
+      op TEXT NOT NULL,
+      ip TEXT NOT NULL,
+      changed_at TIMESTAMP NOT NULL
+    )
+  ''')
+  db.execute('''
+    CREATE TABLE IF NOT EXISTS meta (
+      key TEXT PRIMARY KEY,
+      value
+    )
+  ''')
+  for list_type in LIST_TYPES:
+    db.execute(f'DROP TRIGGER IF EXISTS {list_type}_log_add')
+    db.execute(f'''
+      CREATE TRIGGER IF NOT EXISTS {list_type}_log_remove
+      AFTER DELETE ON {list_type}
+      BEGIN
+        INSERT INTO changelog (list_type, op, ip, changed_at)
+        VALUES ('{list_type}', 'remove', OLD.ip, CURRENT_TIMESTAMP);
+      END
+    ''')
+
+  if created:
+    # Ieraksti, kas pastāvēja pirms žurnāla izveides, nav pieejami kā izmaiņas
+    existing = any(
+      db.execute(f'SELECT 1 FROM {list_type} LIMIT 1').fetchone()
+      for list_type in LIST_TYPES
+    )
+    db.execute(
+      "INSERT OR REPLACE INTO meta (key, value) VALUES ('changelog_floor', ?)",
+      (1 if existing else 0,)
+    )
+
+def _migrate_ranges(db: sqlite3.Connection, list_type: str):
+  """
+  Pievieno diapazonu kolonnas vecākām datubāzēm un aizpilda tās esošajiem ierakstiem.
+  """
+  columns = {row['name'] for row in db.execute(f'PRAGMA table_info({list_type})')}
+  if 'range_start' in columns:
+    return
+
+  for column, column_type in (('family', 'INTEGER'), ('range_start', 'BLOB'), ('range_end', 'BLOB')):
+    db.execute(f'ALTER TABLE {list_type} ADD COLUMN {column} {column_type}')
+
+  updates = []
+  for row in db.execute(f'SELECT ip FROM {list_type}'):
+    try:
+      updates.append(range_columns(row['ip']) + (row['ip'],))
+    except ValueError:
+      logger.warning(f"Skipping invalid {list_type} entry {row['ip']} during migration")
+  db.executemany(f'''
+    UPDATE {list_type} SET family = ?, range_start = ?, range_end = ? WHERE ip = ?
+  ''', updates)
+  logger.info(f"Migrated {len(updates)} {list_type} entries to range storage")
+
+def _migrate_expiry(db: sqlite3.Connection, list_type: str):
+  """
+  Pievieno expires_at kolonnu vecākām datubāzēm.
+  """
+  columns = {row['name'] for row in db.execute(f'PRAGMA table_info({list_type})')}
+  if 'expires_at' not in columns:
+    db.execute(f'ALTER TABLE {list_type} ADD COLUMN expires_at TIMESTAMP')
+
+def _source_ttl(source: str, ttl: Optional[int], default: Optional[int] = None) -> Optional[int]:
   """
+  Atgriež ieraksta derīguma laiku sekundēs: norādīto, avota noklusējumu no SOURCE_TTLS
+  vai default. Vērtība 0 nozīmē, ka ieraksts nebeidzas.
+  """
+  if ttl is None:
+    ttl = default
+    for item in current_app.config['SOURCE_TTLS'].split(','):
+      name, _, value = item.partition('=')
+      if name.strip() == source and value.strip():
+        ttl = int(value)
+        break
+  return ttl or None
+
+def _expires_at(added_at: datetime, ttl: Optional[int]) -> Optional[datetime]:
+  return added_at + timedelta(seconds=ttl) if ttl else None
+
+def _entry_row(ip: str, source: str, added_at: datetime, reason: Optional[str], comment: Optional[str],
+               expires_at: Optional[datetime] = None) -> tuple:
+  """
+  Sagatavo ieraksta rindu ar normalizētu adresi un tās diapazonu.
+  """
+  parsed = parse_network(ip)
+  if parsed is None:
+    raise ValueError('Invalid IP address')
+  return (parsed[0], source, added_at, reason, comment, expires_at) + parsed[1:]
+
+def _add_entry(list_type: str, ip: str, source: str, reason: Optional[str], comment: Optional[str],
+               ttl: Optional[int] = None) -> str:
+  """
+  Pievieno vienu IP vai CIDR tīklu norādītajam sarakstam.
+  """
+  check_list_type(list_type)
   with get_db() as db:
+    added_at = datetime.now()
+    row = _entry_row(ip, source, added_at, reason, comment, _expires_at(added_at, _source_ttl(source, ttl)))
+    ip = row[0]
     try:
+      db.execute(f'''
+        INSERT INTO {list_type} (ip, source, added_at, reason, comment, expires_at, family, range_start, range_end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+      ''', row)
       db.execute('''
-        INSERT INTO blacklist (ip, source, added_at, reason, comment)
-        VALUES (?, ?, ?, ?, ?)
-      ''', (ip, source, datetime.now(), reason, comment))
+        INSERT INTO changelog (list_type, op, ip, changed_at)
+        VALUES (?, 'add', ?, CURRENT_TIMESTAMP)
+      ''', (list_type, ip))
       db.commit()
-      message = f"Added {ip} to blacklist from source {source}"
+      _notify_change()
+      message = f"Added {ip} to {list_type} from source {source}"
       logger.info(message)
       return message
     except sqlite3.IntegrityError:
-      message = f"IP {ip} already exists in blacklist"
+      message = f"IP {ip} already exists in {list_type}"
       logger.warning(message)
       return message
 
-def add_to_whitelist(ip: str, source: str, reason: Optional[str], comment: Optional[str]) -> str:
+def add_to_blacklist(ip: str, source: str, reason: Optional[str], comment: Optional[str],
+                  ttl: Optional[int] = None) -> str:
+  """
+  Pievieno vienu IP melnajam sarakstam.
+  Ja IP jau pastāv melnajā sarakstā, atgriež brīdinājuma ziņojumu.
+  """
+  return _add_entry('blacklist', ip, source, reason, comment, ttl)
+
+def add_to_whitelist(ip: str, source: str, reason: Optional[str], comment: Optional[str],
+                     ttl: Optional[int] = None) -> str:
   """
   Pievieno vienu IP baltajam sarakstam.
   Ja IP jau pastāv baltajā sarakstā, atgriež brīdinājuma ziņojumu.
   """
-  with get_db() as db:
-    try:
-      db.execute('''
-        INSERT INTO whitelist (ip, source, added_at, reason, comment)
-        VALUES (?, ?, ?, ?, ?)
-      ''', (ip, source, datetime.now(), reason, comment))
-      db.commit()
-      message = f"Added {ip} to whitelist from source {source}"
-      logger.info(message)
-      return message
-    except sqlite3.IntegrityError:
-      message = f"IP {ip} already exists in whitelist"
-      logger.warning(message)
-      return message
+  return _add_entry('whitelist', ip, source, reason, comment, ttl)
 
 def get_list(source: Optional[str] = None, list_type: str = 'blacklist') -> List[dict]:
   """
@@ -91,34 +396,583 @@ def get_list(source: Optional[str] = None, list_type: str = 'blacklist') -> List
   Ja norādīts avots, filtrē pēc avota.
   """
   with get_db() as db:
-    query = f'SELECT * FROM {list_type}'
-    params = []
+    query = f'SELECT {ENTRY_COLUMNS} FROM {list_type} WHERE {ACTIVE_SCAN_FILTER}'
+    params = [datetime.now()]
     
     if source:
-      query += ' WHERE source = ?'
+      query += ' AND source = ?'
       params.append(source)
     
     rows = db.execute(query, params).fetchall()
     return [dict(row) for row in rows]
 
+def _load_rows(db: sqlite3.Connection, list_type: str, source: Optional[str] = None) -> List[sqlite3.Row]:
+  """
+  Nolasa aktīvos saraksta ierakstus ar diapazonu kolonnām (ENTRY_COLUMNS, family, range_start, range_end).
+  """
+  query = f'SELECT {ENTRY_COLUMNS}, family, range_start, range_end FROM {list_type} WHERE family IS NOT NULL AND {ACTIVE_SCAN_FILTER}'
+  params = [datetime.now()]
+  if source:
+    query += ' AND source = ?'
+    params.append(source)
+  return db.execute(query, params).fetchall()
+
+def _row_ranges(rows: Iterable[sqlite3.Row]) -> List[tuple]:
+  """
+  Pārveido _load_rows rindas (family, start, end, row) diapazonos.
+  Kolonnas tiek nolasītas pēc pozīcijas, jo nosaukuma meklēšana sqlite3.Row ir lēnāka.
+  """
+  return [
+    (row[6], unpack_address(row[7]), unpack_address(row[8]), row)
+    for row in rows if row[6] is not None
+  ]
+
+# Baltā saraksta diapazoni pēc datubāzes ceļa
+_whitelist_cache = {}
+
+def _valid_until(rows: Iterable[sqlite3.Row]) -> Optional[str]:
+  """
+  Atgriež agrāko derīguma termiņu starp ielādētajiem ierakstiem.
+  Līdz tam atmiņā saglabātais rezultāts paliek derīgs.
+  """
+  return min(filter(None, (row[EXPIRES_AT] for row in rows)), default=None)
+
+def _is_fresh(cached: Optional[tuple], version: int) -> bool:
+  return (
+    cached is not None and cached[0] == version
+    and (cached[1] is None or cached[1] > str(datetime.now()))
+  )
+
+def _whitelist_index(db: sqlite3.Connection) -> tuple:
+  """
+  Atgriež (versija, derīgs_līdz, diapazoni, atslēgas): apvienotus baltā saraksta
+  diapazonus un to (family, start) atslēgas range_overlaps meklēšanai,
+  saglabātus atmiņā līdz nākamajām izmaiņām.
+  """
+  version = _current_version(db)
+  path = current_app.config['DATABASE_PATH']
+  cached = _whitelist_cache.get(path)
+  if _is_fresh(cached, version):
+    return cached
+  loaded = _load_rows(db, 'whitelist')
+  ranges = merge_ranges((family, start, end) for family, start, end, _ in _row_ranges(loaded))
+  keys = [(family, start) for family, start, _ in ranges]
+  cached = _whitelist_cache[path] = (version, _valid_until(loaded), ranges, keys)
+  return cached
+
+def _whitelist_ranges(db: sqlite3.Connection) -> Tuple[List[tuple], Optional[str]]:
+  """
+  Atgriež apvienotus baltā saraksta diapazonus un to derīguma termiņu.
+  """
+  _, valid_until, ranges, _ = _whitelist_index(db)
+  return ranges, valid_until
+
+def get_whitelist_ranges() -> List[tuple]:
+  """
+  Atgriež apvienotus aktīvos baltā saraksta (family, start, end) diapazonus.
+  """
+  with get_db() as db:
+    return _whitelist_ranges(db)[0]
+
+def _subtract_whitelist(db: sqlite3.Connection, rows: List[sqlite3.Row]) -> List[dict]:
+  """
+  Izņem baltā saraksta tīklus no melnā saraksta ierakstiem (_load_rows rindām).
+  Daļēji aizsargāti ieraksti tiek sadalīti CIDR tīklos ar to pašu avotu un komentāru.
+  Ieraksti, kas nepārklājas ar balto sarakstu, tiek atgriezti tabulas secībā, un
+  diapazonu atņemšana tiek veikta tikai pārklātajiem ierakstiem, kuri seko beigās.
+  """
+  _, _, whitelist, keys = _whitelist_index(db)
+  if not whitelist:
+    return [dict(zip(ENTRY_FIELDS, row)) for row in rows if row[6] is not None]
+
+  entries = []
+  covered = []
+  for row in rows:
+    family, packed_start, packed_end = row[6], row[7], row[8]
+    if family is None:
+      continue
+    start = int.from_bytes(packed_start, 'big')
+    end = start if packed_end == packed_start else int.from_bytes(packed_end, 'big')
+    if range_overlaps(whitelist, keys, family, start, end):
+      covered.append((family, start, end, row))
+    else:
+      entries.append(dict(zip(ENTRY_FIELDS, row)))
+  for family, start, end, row in subtract_ranges(covered, whitelist):
+    entries.extend(dict(zip(ENTRY_FIELDS, row), ip=network) for network in range_to_cidrs(family, start, end))
+  return entries
+
+def _current_version(db: sqlite3.Connection) -> int:
+  row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changelog'").fetchone()
+  return row['seq'] if row else 0
+
+def _changelog_floor(db: sqlite3.Connection) -> int:
+  row = db.execute("SELECT value FROM meta WHERE key = 'changelog_floor'").fetchone()
+  return row['value'] if row else 0
+
+def get_version() -> int:
+  """
+  Atgriež pašreizējo datu versiju (pēdējās izmaiņu žurnāla rindas numuru).
+  """
+  with get_db() as db:
+    return _current_version(db)
+
+def compact_changelog(retention: Optional[int] = None) -> int:
+  """
+  Dzēš izmaiņu žurnāla rindas, kas vecākas par pēdējām `retention` versijām.
+  Klienti ar vecāku versiju pēc tam saņem pilnu sarakstu.
+  """
+  if retention is None:
+    retention = current_app.config['CHANGELOG_RETENTION']
+  with get_db() as db:
+    floor = _current_version(db) - retention
+    if floor <= _changelog_floor(db):
+      return 0
+    deleted = db.execute('DELETE FROM changelog WHERE version <= ?', (floor,)).rowcount
+    db.execute(
+      "INSERT OR REPLACE INTO meta (key, value) VALUES ('changelog_floor', ?)",
+      (floor,)
+    )
+    db.commit()
+    logger.info(f"Compacted {deleted} changelog entries up to version {floor}")
+    return deleted
+
+def _compact_changelog_if_due() -> int:
+  """
+  Saspiež izmaiņu žurnālu tikai tad, kad tajā sakrājušās vairāk nekā divas reizes
+  CHANGELOG_RETENTION rindas, lai dzēšana nenotiktu pēc katras rakstīšanas.
+  """
+  retention = current_app.config['CHANGELOG_RETENTION']
+  with get_db() as db:
+    if _current_version(db) - _changelog_floor(db) <= 2 * retention:
+      return 0
+  return compact_changelog(retention)
+
+# Momentuzņēmumi pēc (datubāzes ceļš, avots), jo versiju numuri dažādās datubāzēs sakrīt
+_blacklist_cache = {}
+_blacklist_cache_lock = threading.Lock()
+_change_listeners = []
+
+def add_change_listener(callback):
+  """
+  Reģistrē funkciju, kas tiek izsaukta pēc katras šajā procesā apstiprinātas izmaiņas sarakstos.
+  """
+  _change_listeners.append(callback)
+
+def _notify_change():
+  for callback in _change_listeners:
+    try:
+      callback()
+    except Exception as e:
+      logger.error(f"Change listener failed: {str(e)}")
+
+def expire_due():
+  """
+  Dzēš ierakstus, kuru termiņš ir beidzies, pirms eksporta nolasīšanas, lai katra
+  beigšanās būtu izmaiņu žurnālā ar savu versiju arī tad, ja fona dzēšana
+  (EXPIRY_SWEEP_INTERVAL) ir izslēgta vai vēl nav notikusi.
+  """
+  with get_db() as db:
+    now = str(datetime.now())
+    due = any(_has_expired(db, list_type, now) for list_type in LIST_TYPES)
+  if due:
+    sweep_expired()
+
+def _snapshot(source: Optional[str] = None) -> tuple:
+  """
+  Atgriež (versija, derīgs_līdz, ieraksti) no atmiņas vai pārrēķina tos vienā transakcijā.
+  Kamēr atmiņā saglabātais rezultāts ir derīgs, neviens ieraksts nav beidzies, tāpēc
+  beigušos ierakstu dzēšana tiek pārbaudīta tikai pirms pārrēķināšanas.
+  Pārrēķināšana (pirmais pieprasījums pēc izmaiņām) nolasa visu melno sarakstu:
+  ~0,5 s uz 200k ierakstiem, un ar baltā saraksta atņemšanu vēl ~0,2 s.
+  """
+  key = (current_app.config['DATABASE_PATH'], source)
+  with get_db() as db:
+    cached = _blacklist_cache.get(key)
+    if _is_fresh(cached, _current_version(db)):
+      return cached
+
+  expire_due()
+  with get_db() as db:
+    db.execute('BEGIN')
+    version = _current_version(db)
+    cached = _blacklist_cache.get(key)
+    if _is_fresh(cached, version):
+      return cached
+    rows = _load_rows(db, 'blacklist', source)
+    entries = _subtract_whitelist(db, rows)
+    valid_until = min(filter(None, (_valid_until(rows), _whitelist_ranges(db)[1])), default=None)
+
+  snapshot = (version, valid_until, entries)
+  with _blacklist_cache_lock:
+    cached = _blacklist_cache.get(key)
+    if cached is None or cached[0] <= version:
+      _blacklist_cache[key] = snapshot
+  return snapshot
+
+def get_blacklist_snapshot(source: Optional[str] = None) -> Tuple[int, List[dict]]:
+  """
+  Atgriež datu versiju un melno sarakstu bez baltā saraksta adresēm un tīkliem.
+  Abi tiek nolasīti vienā transakcijā, tāpēc versija atbilst datiem.
+  Rezultāts tiek saglabāts atmiņā, kamēr versija nemainās un neviens
+  no ierakstiem nav sasniedzis derīguma termiņu.
+  """
+  version, _, entries = _snapshot(source)
+  return version, list(entries)
+
+def get_snapshot_tag() -> str:
+  """
+  Atgriež pašreizējā melnā saraksta eksporta identifikatoru: datu versiju un,
+  ja kāds ieraksts beigsies, tuvāko derīguma termiņu. Izmanto ETag veidošanai.
+  """
+  version, valid_until, _ = _snapshot()
+  if valid_until:
+    return f"{version}-{''.join(ch for ch in valid_until if ch.isdigit())}"
+  return str(version)
+
 def get_blacklist(source: Optional[str] = None) -> List[dict]:
   """
-  Iegūst melno sarakstu, izņemot IP, kas atrodas baltajā sarakstā.
+  Iegūst melno sarakstu, izņemot IP un tīklus, kas atrodas baltajā sarakstā.
   Ja norādīts avots, filtrē pēc avota.
+  Rezultāts tiek saglabāts atmiņā līdz nākamajām izmaiņām kādā no sarakstiem.
+  """
+  return get_blacklist_snapshot(source)[1]
+
+def get_blacklist_delta(since: int) -> Optional[dict]:
+  """
+  Atgriež melnā saraksta eksporta izmaiņas kopš norādītās versijas:
+  pievienotās un noņemtās adreses un jauno versiju.
+  Atgriež None, ja izmaiņas nav pieejamas (versija saspiesta, nezināma
+  vai kopš tās mainījies baltais saraksts) un klientam jāsaņem pilns saraksts.
+  Beigušies ieraksti tiek dzēsti pirms nolasīšanas un parādās kā noņemtie.
   """
+  expire_due()
   with get_db() as db:
-    query = '''
-      SELECT * FROM blacklist 
-      WHERE ip NOT IN (SELECT ip FROM whitelist)
-    '''
-    params = []
+    db.execute('BEGIN')
+    version = _current_version(db)
+    if since < _changelog_floor(db) or since > version:
+      return None
 
-    if source:
-      query += ' AND source = ?'
-      params.append(source)
-      
+    # Katrai adresei pietiek ar pirmo un pēdējo darbību kopš klienta versijas
+    first_op = {}
+    last_op = {}
+    for row in db.execute('''
+      SELECT list_type, op, ip FROM changelog
+      WHERE version > ?
+      ORDER BY version
+    ''', (since,)):
+      if row['list_type'] == 'whitelist':
+        return None
+      first_op.setdefault(row['ip'], row['op'])
+      last_op[row['ip']] = row['op']
+
+    added = [ip for ip, op in last_op.items() if op == 'add' and first_op[ip] == 'add']
+    removed = [ip for ip, op in last_op.items() if op == 'remove' and first_op[ip] == 'remove']
+    whitelist, _ = _whitelist_ranges(db)
+
+  added = _exported_networks(added, whitelist)
+  removed = _exported_networks(removed, whitelist)
+  if removed:
+    # Tā pati daļa var palikt eksportā, ja to joprojām nosedz cits ieraksts
+    current = {entry['ip'] for entry in get_blacklist()}
+    removed = [ip for ip in removed if ip not in current]
+
+  return {
+    'since': since,
+    'version': version,
+    'added': added,
+    'removed': removed
+  }
+
+def _exported_networks(ips: List[str], whitelist: List[tuple]) -> List[str]:
+  """
+  Atgriež CIDR tīklus, kādos norādītie ieraksti parādās eksportā pēc baltā saraksta atņemšanas.
+  """
+  pieces = subtract_ranges([ip_to_range(ip) for ip in ips], whitelist)
+  return [
+    network
+    for family, start, end in pieces
+    for network in range_to_cidrs(family, start, end)
+  ]
+
+# Atmiņas prefiksu koki adrešu pārbaudei katrai datubāzei, atjaunināti no izmaiņu žurnāla
+_lookup_indexes = {}
+_lookup_lock = threading.Lock()
+
+def _lookup_index() -> dict:
+  """
+  Atgriež konfigurētās datubāzes prefiksu koku stāvokli (versija un koki).
+  Versijas numuri dažādās datubāzēs sakrīt, tāpēc stāvoklis tiek glabāts pēc datubāzes ceļa.
+  """
+  path = current_app.config['DATABASE_PATH']
+  index = _lookup_indexes.get(path)
+  if index is None:
+    with _lookup_lock:
+      index = _lookup_indexes.setdefault(path, {'version': None, 'tries': {}})
+  return index
+
+def _build_lookup_tries(db: sqlite3.Connection) -> dict:
+  """
+  Izveido prefiksu kokus abiem sarakstiem no visiem tabulu ierakstiem.
+  Derīguma termiņš tiek pārbaudīts meklēšanas brīdī.
+  """
+  tries = {}
+  for list_type in LIST_TYPES:
+    trie = PrefixTrie()
+    for row in db.execute(f'SELECT {ENTRY_COLUMNS} FROM {list_type} WHERE family IS NOT NULL'):
+      trie.insert(row['ip'], dict(row))
+    tries[list_type] = trie
+  return tries
+
+def _apply_lookup_changes(db: sqlite3.Connection, tries: dict, since: int, version: int):
+  """
+  Atjaunina prefiksu kokus ar ierakstiem, kas mainīti starp abām versijām.
+  Katram mainītajam ierakstam tiek nolasīts tā pašreizējais stāvoklis tabulā.
+  """
+  touched = {}
+  for row in db.execute('''
+    SELECT DISTINCT list_type, ip FROM changelog
+    WHERE version > ? AND version <= ?
+  ''', (since, version)):
+    touched.setdefault(row['list_type'], []).append(row['ip'])
+
+  for list_type, ips in touched.items():
+    for offset in range(0, len(ips), 500):
+      chunk = ips[offset:offset + 500]
+      current = {
+        row['ip']: dict(row)
+        for row in db.execute(f'''
+          SELECT {ENTRY_COLUMNS} FROM {list_type}
+          WHERE family IS NOT NULL AND ip IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+      }
+      for ip in chunk:
+        try:
+          if ip in current:
+            tries[list_type].insert(ip, current[ip])
+          else:
+            tries[list_type].remove(ip)
+        except ValueError:
+          logger.warning(f"Skipping invalid {list_type} entry {ip} in lookup index")
+
+def _lookup_tries(db: sqlite3.Connection) -> dict:
+  """
+  Atgriež prefiksu kokus, kas atbilst pašreizējai datu versijai.
+  Ja žurnāls kopš pēdējās atjaunināšanas ir saspiests, koki tiek izveidoti no jauna.
+  """
+  index = _lookup_index()
+  version = _current_version(db)
+  if index['version'] == version:
+    return index['tries']
+
+  with _lookup_lock:
+    indexed = index['version']
+    if indexed is None or indexed < _changelog_floor(db):
+      started = time.perf_counter()
+      index['tries'] = _build_lookup_tries(db)
+      index['version'] = version
+      logger.info(f"Built lookup index at version {version} in {time.perf_counter() - started:.3f}s")
+    elif indexed < version:
+      _apply_lookup_changes(db, index['tries'], indexed, version)
+      index['version'] = version
+    return index['tries']
+
+def _active_matches(db: sqlite3.Connection, tries: dict, list_type: str, version: int, number: int) -> List[dict]:
+  """
+  Atgriež aktīvos saraksta ierakstus, kas satur adresi, sākot ar visspecifiskāko.
+  """
+  now = str(datetime.now())
+  found = []
+  for entry in tries[list_type].matches(version, number):
+    if entry['expires_at'] and entry['expires_at'] <= now:
+      # Atkārtots imports var pagarināt termiņu, neierakstot izmaiņu žurnālā
+      row = db.execute(f'SELECT {ENTRY_COLUMNS} FROM {list_type} WHERE ip = ?', (entry['ip'],)).fetchone()
+      if row is None or (row['expires_at'] and row['expires_at'] <= now):
+        continue
+      stale, entry = entry, dict(row)
+      # Koks ir koplietots ar _apply_lookup_changes; ieraksts tiek aizstāts tikai tad,
+      # ja to pa to laiku nav atjauninājusi cita izmaiņa
+      with _lookup_lock:
+        if tries[list_type].get(entry['ip']) is stale:
+          tries[list_type].insert(entry['ip'], entry)
+    found.append(entry)
+  return found
+
+def lookup_ips(ips: Iterable[str]) -> List[dict]:
+  """
+  Pārbauda adreses pret melno un balto sarakstu, izmantojot atmiņas prefiksu kokus.
+  Katrai adresei atgriež visspecifiskāko melnā saraksta ierakstu (entry), visus
+  to saturošos ierakstus (matches) un baltā saraksta ierakstu, kas to aizsargā.
+  Adrese ir bloķēta, ja to satur kāds melnā saraksta ieraksts un neviens baltā saraksta ieraksts.
+  """
+  results = []
+  with get_db() as db:
+    db.execute('BEGIN')
+    tries = _lookup_tries(db)
+    for ip in ips:
+      try:
+        address = ipaddress.ip_address(str(ip).strip())
+      except ValueError:
+        results.append({'ip': ip, 'error': 'Invalid IP address'})
+        continue
+      number = int(address)
+      matches = _active_matches(db, tries, 'blacklist', address.version, number)
+      whitelist = _active_matches(db, tries, 'whitelist', address.version, number)
+      results.append({
+        'ip': str(address),
+        'blocked': bool(matches) and not whitelist,
+        'entry': matches[0] if matches else None,
+        'matches': matches,
+        'whitelist': whitelist[0] if whitelist else None
+      })
+  return results
+
+def lookup_ip(ip: str) -> dict:
+  """
+  Pārbauda vienu adresi pret melno un balto sarakstu (skat. lookup_ips).
+  """
+  return lookup_ips([ip])[0]
+
+# Salīdzinātāji pēc datubāzes ceļa, jo versiju numuri dažādās datubāzēs sakrīt
+_matcher_cache = {}
+
+def get_blacklist_matcher() -> RangeMatcher:
+  """
+  Atgriež vektorizētu melnā saraksta salīdzinātāju bez baltā saraksta adresēm.
+  Ligzdoti tīkli tiek sadalīti nepārklājošos segmentos ar visspecifiskākā ieraksta id (rowid).
+  Salīdzinātājs tiek saglabāts atmiņā, kamēr nemainās dati un neviens ieraksts nebeidzas.
+  """
+  with get_db() as db:
+    db.execute('BEGIN')
+    version = _current_version(db)
+    path = current_app.config['DATABASE_PATH']
+    cached = _matcher_cache.get(path)
+    if _is_fresh(cached, version):
+      return cached[2]
+    ranges = [
+      (row['family'], unpack_address(row['range_start']), unpack_address(row['range_end']), row)
+      for row in db.execute(f'''
+        SELECT rowid, family, range_start, range_end, expires_at FROM blacklist
+        WHERE family IS NOT NULL AND {ACTIVE_SCAN_FILTER}
+      ''', (datetime.now(),))
+    ]
+    whitelist, whitelist_until = _whitelist_ranges(db)
+
+  started = time.perf_counter()
+  matcher = RangeMatcher(
+    (family, start, end, row['rowid'])
+    for family, start, end, row in flatten_ranges(subtract_ranges(ranges, whitelist))
+  )
+  blacklist_until = min(filter(None, (row['expires_at'] for *_, row in ranges)), default=None)
+  valid_until = min(filter(None, (blacklist_until, whitelist_until)), default=None)
+  _matcher_cache[path] = (version, valid_until, matcher)
+  logger.info(f"Built blacklist matcher with {len(matcher)} segments in {time.perf_counter() - started:.3f}s")
+  return matcher
+
+def match_blacklist(ips: List[str]) -> MatchResult:
+  """
+  Vektorizēti salīdzina adrešu sarakstu ar melno sarakstu.
+  Atgriež katras adreses derīgumu, trāpījuma pazīmi un atrastā ieraksta id.
+  """
+  return get_blacklist_matcher().match(ips)
+
+def get_entries_by_id(ids: Iterable[int], list_type: str = 'blacklist') -> dict:
+  """
+  Atgriež saraksta ierakstus pēc to id (rowid), ko atgriež match_blacklist.
+  """
+  ids = list(ids)
+  entries = {}
+  with get_db() as db:
+    for offset in range(0, len(ids), 500):
+      chunk = ids[offset:offset + 500]
+      for row in db.execute(f'''
+        SELECT rowid, {ENTRY_COLUMNS} FROM {list_type}
+        WHERE rowid IN ({','.join('?' * len(chunk))})
+      ''', chunk):
+        entries[row['rowid']] = dict(zip(ENTRY_FIELDS, row[1:]))
+  return entries
+
+def _parse_cursor(after) -> Tuple[int, int]:
+  """
+  Nolasa lapošanas kursoru: rowid vai "rowid:n", ja iepriekšējā lapa beidzās pēc
+  rindas n-tā CIDR tīkla (baltā saraksta sadalīta rinda). Atgriež (rowid, n).
+  """
+  if after is None:
+    return 0, 0
+  rowid, _, skip = str(after).partition(':')
+  try:
+    return int(rowid), int(skip or 0)
+  except ValueError:
+    raise ValueError(f'Invalid cursor {after!r}')
+
+def get_page(list_type: str = 'blacklist', source: Optional[str] = None, limit: int = 1000,
+             after=None) -> Tuple[List[dict], Optional[object]]:
+  """
+  Iegūst vienu saraksta lapu, izmantojot rowid kursoru (keyset lapošana),
+  tāpēc vaicājuma izmaksas ir atkarīgas no lapas, nevis tabulas izmēra.
+  Melnajam sarakstam tiek izņemtas baltā saraksta adreses un tīkli; limit ierobežo
+  atgriezto ierakstu skaitu, tāpēc rinda, ko baltais saraksts sadala vairākos tīklos,
+  var turpināties nākamajā lapā (kursors "rowid:n").
+  Atgriež ierakstus un nākamās lapas kursoru vai None, ja lapa ir pēdējā.
+  """
+  after, skip = _parse_cursor(after)
+  query = f'SELECT rowid, {ENTRY_COLUMNS}, family, range_start, range_end FROM {list_type} WHERE rowid {">=" if skip else ">"} ? AND {ACTIVE_SCAN_FILTER}'
+  params = [after, datetime.now()]
+  if source:
+    query += ' AND source = ?'
+    params.append(source)
+  query += ' ORDER BY rowid LIMIT ?'
+  params.append(limit)
+
+  with get_db() as db:
+    db.execute('BEGIN')
     rows = db.execute(query, params).fetchall()
-    return [dict(row) for row in rows]
+    if list_type != 'blacklist':
+      entries = [dict(zip(ENTRY_FIELDS, row[1:])) for row in rows]
+      return entries, rows[-1]['rowid'] if len(rows) == limit else None
+
+    entries = []
+    previous = None
+    for row in rows:
+      pieces = _subtract_whitelist(db, [row[1:]])
+      offset = skip if row['rowid'] == after else 0
+      pieces = pieces[offset:]
+      room = limit - len(entries)
+      if len(pieces) > room:
+        entries.extend(pieces[:room])
+        if offset + room == 0:
+          return entries, previous
+        return entries, f"{row['rowid']}:{offset + room}"
+      entries.extend(pieces)
+      previous = row['rowid']
+
+  next_cursor = rows[-1]['rowid'] if len(rows) == limit else None
+  return entries, next_cursor
+
+def iter_entries(list_type: str = 'blacklist', source: Optional[str] = None,
+                 chunk_size: Optional[int] = None) -> Iterator[List[dict]]:
+  """
+  Straumēti nolasa saraksta ierakstus no kursora pa daļām, neielādējot visu tabulu atmiņā.
+  Melnajam sarakstam katrai daļai tiek izņemtas baltā saraksta adreses un tīkli.
+  """
+  if chunk_size is None:
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+  query = f'SELECT {ENTRY_COLUMNS}, family, range_start, range_end FROM {list_type} WHERE {ACTIVE_SCAN_FILTER}'
+  params = [datetime.now()]
+  if source:
+    query += ' AND source = ?'
+    params.append(source)
+
+  with get_db() as db:
+    db.execute('BEGIN')
+    cursor = db.execute(query, params)
+    while True:
+      rows = cursor.fetchmany(chunk_size)
+      if not rows:
+        break
+      if list_type == 'blacklist':
+        yield _subtract_whitelist(db, rows)
+      else:
+        yield [dict(zip(ENTRY_FIELDS, row)) for row in rows]
 
 def get_whitelist(source: Optional[str] = None) -> List[dict]:
   """
@@ -126,49 +980,471 @@ def get_whitelist(source: Optional[str] = None) -> List[dict]:
   Ja norādīts avots, filtrē pēc avota.
   """
   with get_db() as db:
-    query = 'SELECT * FROM whitelist'
-    params = []
+    query = f'SELECT {ENTRY_COLUMNS} FROM whitelist WHERE {ACTIVE_SCAN_FILTER}'
+    params = [datetime.now()]
     
     if source:
-      query += ' WHERE source = ?'
+      query += ' AND source = ?'
       params.append(source)
     
     rows = db.execute(query, params).fetchall()
     return [dict(row) for row in rows]
 
-def bulk_add(entries: List[tuple], list_type: str, source: Optional[str] = None) -> str:
+@dataclass
+class IngestResult:
   """
-  Masveidā pievieno IP norādītajam saraksta veidam (melnā/baltā saraksta).
+  Masveida importa rezultāts ar faktiski ievietoto, dublēto un nederīgo rindu skaitu.
+  rejects satur pirmās nederīgās rindas ar to numuru ievadē.
+  """
+  list_type: str
+  inserted: int = 0
+  duplicates: int = 0
+  invalid: int = 0
+  removed: int = 0
+  seconds: float = 0.0
+  rejects: List[dict] = field(default_factory=list)
+
+  @property
+  def rows_per_second(self) -> float:
+    total = self.inserted + self.duplicates + self.invalid + self.removed
+    return total / self.seconds if self.seconds > 0 else 0.0
+
+  @property
+  def message(self) -> str:
+    return f'Added {self.inserted} IPs to {self.list_type}'
+
+  def to_dict(self) -> dict:
+    return {
+      'message': self.message,
+      'inserted': self.inserted,
+      'duplicates': self.duplicates,
+      'invalid': self.invalid,
+      'removed': self.removed,
+      'seconds': round(self.seconds, 3),
+      'rows_per_second': round(self.rows_per_second, 1),
+      'rejects': self.rejects
+    }
+
+def _has_expired(db: sqlite3.Connection, list_type: str, now: str) -> bool:
+  return db.execute(
+    f'SELECT 1 FROM {list_type} WHERE expires_at <= ? LIMIT 1', (now,)
+  ).fetchone() is not None
+
+def _log_revivals(db: sqlite3.Connection, list_type: str, where: str, params: Iterable[tuple]) -> int:
+  """
+  Ieraksta izmaiņu žurnālā pievienošanu ierakstiem ar beigušos termiņu, kas vēl nav dzēsti
+  un kuriem termiņš tiks pagarināts. Eksportā tie jau nav redzami, tāpēc pagarināšana
+  tos atjauno, un delta klientiem un kešotajam sarakstam ir vajadzīga jauna versija.
+  Parastai aktīvu ierakstu pagarināšanai žurnāla rindas netiek rakstītas, jo eksports nemainās.
+  """
+  cursor = db.executemany(f'''
+    INSERT INTO changelog (list_type, op, ip, changed_at)
+    SELECT '{list_type}', 'add', ip, CURRENT_TIMESTAMP FROM {list_type}
+    WHERE {where} AND expires_at <= ?
+  ''', params)
+  return max(cursor.rowcount, 0)
+
+def _log_inserts(db: sqlite3.Connection, list_type: str, after_rowid: int) -> int:
+  """
+  Ieraksta izmaiņu žurnālā visas rindas, kas ievietotas pēc after_rowid, vienā vaicājumā.
+  Atgriež ierakstīto (t.i. ievietoto) rindu skaitu.
+  """
+  cursor = db.execute(f'''
+    INSERT INTO changelog (list_type, op, ip, changed_at)
+    SELECT '{list_type}', 'add', ip, CURRENT_TIMESTAMP FROM {list_type}
+    WHERE rowid > ? ORDER BY rowid
+  ''', (after_rowid,))
+  return max(cursor.rowcount, 0)
+
+def _insert_rows(db: sqlite3.Connection, list_type: str, rows: List[tuple], expires_at: Optional[str],
+                 result: IngestResult) -> int:
+  """
+  Ievieto sagatavotas rindas; esošajiem ierakstiem tajā pašā vaicājumā tiek pagarināts
+  derīguma termiņš. Jaunās rindas tiek atrastas pēc rowid un ierakstītas izmaiņu žurnālā
+  vienā vaicājumā. Ievietoto un dublēto rindu skaits tiek pieskaitīts rezultātam.
+  Atgriež atjaunoto (beigušos, bet vēl nedzēsto) ierakstu skaitu.
   """
+  # Rakstīšanas slēdzene tiek paņemta pirms rowid nolasīšanas, lai citas rakstīšanas
+  # starplaikā neievietotu rindas, kas tiktu ierakstītas žurnālā divreiz
+  if not db.in_transaction:
+    db.execute('BEGIN IMMEDIATE')
+  revived = 0
+  if expires_at:
+    now = str(datetime.now())
+    if _has_expired(db, list_type, now):
+      revived = _log_revivals(db, list_type, 'ip = ?', ((row[0], now) for row in rows))
+  last_rowid = db.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {list_type}').fetchone()[0]
+
+  # Sakārtotas rindas tiek ievietotas indeksos ar mazāk lapu lasīšanām
+  rows.sort(key=itemgetter(0))
+  db.executemany(f'''
+    INSERT INTO {list_type} (ip, source, added_at, reason, comment, expires_at, family, range_start, range_end)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (ip) DO UPDATE SET expires_at = excluded.expires_at
+    WHERE expires_at < excluded.expires_at
+  ''', rows)
+  inserted = _log_inserts(db, list_type, last_rowid)
+  result.inserted += inserted
+  result.duplicates += len(rows) - inserted
+  return revived
+
+def bulk_ingest(ips: Iterable[str], list_type: str, source: str, reason: Optional[str] = None,
+                comment: Optional[str] = None, chunk_size: Optional[int] = None,
+                ttl: Optional[int] = None, max_rejects: Optional[int] = None,
+                progress: Optional[Callable[[IngestResult], None]] = None) -> IngestResult:
+  """
+  Straumēti pievieno IP adreses un CIDR tīklus no iteratora norādītajam sarakstam.
+  Rindas tiek validētas un ievietotas pa daļām, katru daļu apstiprinot atsevišķā
+  transakcijā, tāpēc atmiņas patēriņš nav atkarīgs no ievades apjoma.
+  Visām daļas rindām tiek izmantots viens laika zīmogs.
+  Ja ierakstiem ir derīguma laiks, atkārtoti importētiem ierakstiem tas tiek pagarināts.
+  None vērtības tiek izlaistas (piemēram, tukšas rindas), bet tiek ieskaitītas rindu numuros.
+  Ja norādīts progress, tas tiek izsaukts ar starprezultātu pēc katras daļas.
+  """
+  check_list_type(list_type)
+  if chunk_size is None:
+    chunk_size = current_app.config['IMPORT_CHUNK_SIZE']
+  if max_rejects is None:
+    max_rejects = current_app.config['IMPORT_MAX_REJECTS']
+  ttl = _source_ttl(source, ttl)
+  result = IngestResult(list_type=list_type)
+  started = time.perf_counter()
+  lines = enumerate(ips, 1)
+  revived = 0
+
   with get_db() as db:
-    db.executemany(f'''
-      INSERT OR IGNORE INTO {list_type} (ip, source, added_at, reason, comment)
-      VALUES (?, ?, ?, ?, ?)
-    ''', entries)
-    db.commit()
-    logger.info(f"Added {len(entries)} IPs to {list_type}")
-  return f'Added {len(entries)} IPs to {list_type}'
+    while True:
+      chunk = list(islice(lines, chunk_size))
+      if not chunk:
+        break
+
+      # Laika zīmogi tiek pārveidoti tekstā vienreiz katrai daļai, nevis katrai rindai
+      now = datetime.now()
+      added_at = str(now)
+      expires_at = _expires_at(now, ttl)
+      expires_at = str(expires_at) if expires_at else None
+      rows = []
+      for line, ip in chunk:
+        if ip is None:
+          continue
+        parsed = parse_network(ip) if isinstance(ip, str) else None
+        if parsed is None:
+          result.invalid += 1
+          if len(result.rejects) < max_rejects:
+            result.rejects.append({'line': line, 'value': str(ip)[:100]})
+          continue
+        rows.append((parsed[0], source, added_at, reason, comment, expires_at) + parsed[1:])
+      revived += _insert_rows(db, list_type, rows, expires_at, result)
+      db.commit()
+      if progress is not None:
+        result.seconds = time.perf_counter() - started
+        progress(result)
 
-def bulk_add_to_blacklist(entries: List[tuple], source: Optional[str] = None):
+  result.seconds = time.perf_counter() - started
+  if result.inserted or revived:
+    _notify_change()
+  _compact_changelog_if_due()
+  logger.info(
+    f"Added {result.inserted} IPs to {list_type} from source {source} "
+    f"({result.duplicates} duplicates, {result.invalid} invalid, {result.rows_per_second:.0f} rows/s)"
+  )
+  return result
+
+def bulk_add(ips: Iterable[str], list_type: str, source: str, reason: Optional[str] = None,
+             comment: Optional[str] = None, ttl: Optional[int] = None) -> str:
+  """
+  Masveidā pievieno IP norādītajam saraksta veidam (melnā/baltā saraksta).
+  CIDR tīkli tiek saglabāti kā viens ieraksts.
+  """
+  return bulk_ingest(ips, list_type, source, reason, comment, ttl=ttl).message
+
+def bulk_add_to_blacklist(ips: Iterable[str], source: str, reason: Optional[str] = None,
+                          comment: Optional[str] = None, ttl: Optional[int] = None,
+                          progress: Optional[Callable[[IngestResult], None]] = None) -> IngestResult:
   """
   Masveidā pievieno IP melnajam sarakstam.
   """
+  return bulk_ingest(ips, 'blacklist', source, reason, comment, ttl=ttl, progress=progress)
+
+def bulk_add_to_whitelist(ips: Iterable[str], source: str, reason: Optional[str] = None,
+                          comment: Optional[str] = None, ttl: Optional[int] = None,
+                          progress: Optional[Callable[[IngestResult], None]] = None) -> IngestResult:
+  """
+  Masveidā pievieno IP baltajam sarakstam.
+  """
+  return bulk_ingest(ips, 'whitelist', source, reason, comment, ttl=ttl, progress=progress)
+
+def apply_changes(list_type: str, source: str, added: Dict[str, Optional[str]], removed: Iterable[str],
+                  comment: Optional[str] = None, ttl: Optional[int] = None, importer: Optional[str] = None,
+                  checkpoints: Optional[List[dict]] = None, default_ttl: Optional[int] = None,
+                  renew: bool = False, feed_state: Optional[dict] = None,
+                  feed_entries: Optional[set] = None) -> IngestResult:
+  """
+  Vienā transakcijā pievieno adreses (adrese -> iemesls) un dzēš norādītā avota ierakstus.
+  Tiek dzēsti tikai šī avota ieraksti, tāpēc citu avotu ieraksti ar to pašu adresi paliek.
+  Ja renew, visiem avota ierakstiem tiek pagarināts derīguma termiņš, jo saraksts, no kura
+  piemērotas tikai atšķirības, joprojām satur arī nemainītos ierakstus.
+  Ja norādīti importētāja kontrolpunkti, barotnes stāvoklis vai barotnes adrešu kopa,
+  tie tiek saglabāti tajā pašā transakcijā.
+  """
+  check_list_type(list_type)
+  ttl = _source_ttl(source, ttl, default_ttl)
+  result = IngestResult(list_type=list_type)
+  started = time.perf_counter()
+  now = datetime.now()
+  added_at = str(now)
+  expires_at = _expires_at(now, ttl)
+  expires_at = str(expires_at) if expires_at else None
+
+  rows = []
+  for line, (ip, reason) in enumerate(added.items(), 1):
+    parsed = parse_network(ip)
+    if parsed is None:
+      result.invalid += 1
+      if len(result.rejects) < current_app.config['IMPORT_MAX_REJECTS']:
+        result.rejects.append({'line': line, 'value': str(ip)[:100]})
+      continue
+    rows.append((parsed[0], source, added_at, reason, comment, expires_at) + parsed[1:])
+  removals = [(parsed[0], source) for parsed in map(parse_network, removed) if parsed is not None]
+
   with get_db() as db:
-    db.executemany('''
-      INSERT OR IGNORE INTO blacklist (ip, source, added_at, comment)
-      VALUES (?, ?, ?, ?)
-    ''', entries)
+    revived = _insert_rows(db, list_type, rows, expires_at, result)
+    if removals:
+      cursor = db.executemany(f'DELETE FROM {list_type} WHERE ip = ? AND source = ?', removals)
+      result.removed = max(cursor.rowcount, 0)
+    if renew and expires_at:
+      if _has_expired(db, list_type, added_at):
+        revived += _log_revivals(db, list_type, 'source = ?', [(source, added_at)])
+      db.execute(f'''
+        UPDATE {list_type} SET expires_at = ?
+        WHERE source = ? AND expires_at < ?
+      ''', (expires_at, source, expires_at))
+    if importer is not None and checkpoints is not None:
+      save_checkpoints(importer, checkpoints, db)
+    if feed_state is not None:
+      save_feed_state(feed_state, db)
+      if feed_entries is not None:
+        save_feed_entries(feed_state['feed'], feed_entries, db)
     db.commit()
-    logger.info(f"Added {len(entries)} IPs to blacklist")
 
-def bulk_add_to_whitelist(entries: List[tuple], source: Optional[str] = None):
+  result.seconds = time.perf_counter() - started
+  if result.inserted or result.removed or revived:
+    _notify_change()
+  _compact_changelog_if_due()
+  logger.info(
+    f"Applied changes to {list_type} from source {source}: {result.inserted} added, "
+    f"{result.removed} removed, {result.duplicates} duplicates, {result.invalid} invalid"
+  )
+  return result
+
+def get_checkpoints(importer: str) -> Dict[str, dict]:
   """
-  Masveidā pievieno IP baltajam sarakstam.
+  Atgriež importētāja failu kontrolpunktus (inode, izmērs, nolasītais baitu offset
+  un sākuma baitu nospiedums) pēc faila ceļa.
+  """
+  with get_db() as db:
+    rows = db.execute('''
+      SELECT path, inode, size, offset, fingerprint FROM import_checkpoints
+      WHERE importer = ?
+    ''', (importer,)).fetchall()
+    return {row['path']: dict(row) for row in rows}
+
+def save_checkpoints(importer: str, checkpoints: Iterable[dict], db: Optional[sqlite3.Connection] = None):
+  """
+  Saglabā importētāja failu kontrolpunktus un dzēš kontrolpunktus failiem, kuru vairs nav.
+  Ja norādīts savienojums, izmaiņas tiek veiktas tā transakcijā bez apstiprināšanas.
+  """
+  if db is None:
+    with get_db() as db:
+      save_checkpoints(importer, checkpoints, db)
+      db.commit()
+    return
+  checkpoints = list(checkpoints)
+  db.execute('DELETE FROM import_checkpoints WHERE importer = ?', (importer,))
+  db.executemany('''
+    INSERT INTO import_checkpoints (importer, path, inode, size, offset, fingerprint, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+  ''', [
+    (importer, item['path'], item['inode'], item['size'], item['offset'], item['fingerprint'], datetime.now())
+    for item in checkpoints
+  ])
+
+def get_flow_window(ips: Iterable[str], since: datetime) -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
+  """
+  Atgriež norādīto adrešu plūsmu skaitu un (adrese, ports) pārus, kas saglabāti
+  iepriekšējās Elastiflow palaišanās kopš since.
+  """
+  ips = list(ips)
+  flows = {}
+  ports = []
+  with get_db() as db:
+    for offset in range(0, len(ips), 500):
+      chunk = ips[offset:offset + 500]
+      placeholders = ','.join('?' * len(chunk))
+      flows.update(
+        (row[0], row[1]) for row in db.execute(f'''
+          SELECT ip, SUM(flows) FROM flow_counts
+          WHERE ip IN ({placeholders}) AND seen_at > ?
+          GROUP BY ip
+        ''', chunk + [since])
+      )
+      ports.extend(
+        (row[0], row[1]) for row in db.execute(f'''
+          SELECT ip, port FROM flow_ports
+          WHERE ip IN ({placeholders}) AND seen_at > ?
+        ''', chunk + [since])
+      )
+  return flows, ports
+
+def save_flow_window(flows: Dict[str, int], ports: Iterable[Tuple[str, str]], seen_at: datetime,
+                     since: datetime, importer: str, checkpoints: Iterable[dict]):
+  """
+  Vienā transakcijā saglabā palaišanas plūsmu skaitu un portus, dzēš ierakstus,
+  kas vecāki par since, un saglabā failu kontrolpunktus, lai tās pašas rindas
+  netiktu ieskaitītas divreiz.
   """
   with get_db() as db:
+    db.executemany(
+      'INSERT INTO flow_counts (ip, seen_at, flows) VALUES (?, ?, ?)',
+      ((ip, seen_at, count) for ip, count in flows.items())
+    )
     db.executemany('''
-      INSERT OR IGNORE INTO whitelist (ip, source, added_at, reason, comment)
-      VALUES (?, ?, ?, ?, ?)
-    ''', entries)
+      INSERT INTO flow_ports (ip, port, seen_at) VALUES (?, ?, ?)
+      ON CONFLICT (ip, port) DO UPDATE SET seen_at = excluded.seen_at
+    ''', ((ip, port, seen_at) for ip, port in ports))
+    db.execute('DELETE FROM flow_counts WHERE seen_at <= ?', (since,))
+    db.execute('DELETE FROM flow_ports WHERE seen_at <= ?', (since,))
+    save_checkpoints(importer, checkpoints, db)
     db.commit()
-    logger.info(f"Added {len(entries)} IPs to whitelist")
\ No newline at end of file
+
+def get_source_ips(list_type: str, source: str) -> set:
+  """Atgriež visu avota ierakstu adreses, arī beigušos, kas vēl nav dzēsti"""
+  with get_db() as db:
+    return {row[0] for row in db.execute(f'SELECT ip FROM {list_type} WHERE source = ?', (source,))}
+
+def get_feed_state(feed: str) -> Optional[dict]:
+  """
+  Atgriež barotnes pēdējās lejupielādes stāvokli (URL, ETag, Last-Modified, satura
+  nospiedums un laiki) vai None, ja barotne vēl nav lejupielādēta.
+  """
+  with get_db() as db:
+    row = db.execute('''
+      SELECT feed, url, etag, last_modified, digest, checked_at, changed_at FROM feed_state
+      WHERE feed = ?
+    ''', (feed,)).fetchone()
+    return dict(row) if row else None
+
+def save_feed_state(state: dict, db: Optional[sqlite3.Connection] = None):
+  """
+  Saglabā barotnes stāvokli.
+  Ja norādīts savienojums, izmaiņas tiek veiktas tā transakcijā bez apstiprināšanas.
+  """
+  if db is None:
+    with get_db() as db:
+      save_feed_state(state, db)
+      db.commit()
+    return
+  db.execute('''
+    INSERT OR REPLACE INTO feed_state (feed, url, etag, last_modified, digest, checked_at, changed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+  ''', (
+    state['feed'], state['url'], state.get('etag'), state.get('last_modified'),
+    state.get('digest'), state['checked_at'], state.get('changed_at')
+  ))
+
+def save_feed_entries(feed: str, entries: set, db: sqlite3.Connection):
+  """
+  Saglabā adreses, ko barotne satur pēdējā lejupielādētajā versijā (tikai atšķirības).
+  """
+  stored = {row[0] for row in db.execute('SELECT ip FROM feed_entries WHERE feed = ?', (feed,))}
+  db.executemany('DELETE FROM feed_entries WHERE feed = ? AND ip = ?', ((feed, ip) for ip in stored - entries))
+  db.executemany('INSERT INTO feed_entries (feed, ip) VALUES (?, ?)', ((feed, ip) for ip in entries - stored))
+
+def has_feed_entries(feed: str) -> bool:
+  with get_db() as db:
+    return db.execute('SELECT 1 FROM feed_entries WHERE feed = ? LIMIT 1', (feed,)).fetchone() is not None
+
+def missing_feed_entries(feed: str, list_type: str) -> set:
+  """
+  Atgriež barotnes adreses, kuru sarakstā vairs nav, piemēram, jo tās bija cita avota
+  ieraksti un šis avots tās ir dzēsis.
+  """
+  check_list_type(list_type)
+  with get_db() as db:
+    return {row[0] for row in db.execute(f'''
+      SELECT ip FROM feed_entries
+      WHERE feed = ? AND NOT EXISTS (SELECT 1 FROM {list_type} WHERE {list_type}.ip = feed_entries.ip)
+    ''', (feed,))}
+
+def missing_ips(list_type: str, ips: Iterable[str]) -> set:
+  """
+  Atgriež adreses, kuras sarakstā nav neviena avota ierakstā.
+  """
+  check_list_type(list_type)
+  ips = list(ips)
+  present = set()
+  with get_db() as db:
+    for offset in range(0, len(ips), 500):
+      chunk = ips[offset:offset + 500]
+      present.update(row[0] for row in db.execute(
+        f"SELECT ip FROM {list_type} WHERE ip IN ({','.join('?' * len(chunk))})", chunk
+      ))
+  return set(ips) - present
+
+def sweep_expired(batch_size: Optional[int] = None) -> int:
+  """
+  Dzēš ierakstus ar beigušos derīguma termiņu nelielās daļās, katru savā transakcijā,
+  lai rakstīšanas slēdzene netiktu turēta ilgi. Dzēšanas tiek ierakstītas izmaiņu žurnālā.
+  """
+  if batch_size is None:
+    batch_size = current_app.config['EXPIRY_SWEEP_BATCH']
+  deleted = 0
+  for list_type in LIST_TYPES:
+    while True:
+      with get_db() as db:
+        count = db.execute(f'''
+          DELETE FROM {list_type} WHERE rowid IN (
+            SELECT rowid FROM {list_type} WHERE expires_at <= ? LIMIT ?
+          )
+        ''', (datetime.now(), batch_size)).rowcount
+        db.commit()
+      deleted += count
+      if count < batch_size:
+        break
+
+  if deleted:
+    logger.info(f"Removed {deleted} expired entries")
+    _notify_change()
+    _compact_changelog_if_due()
+  return deleted
+
+class ExpirySweeper(threading.Thread):
+  """
+  Fona pavediens, kas ik pēc EXPIRY_SWEEP_INTERVAL sekundēm dzēš beigušos ierakstus.
+  """
+  def __init__(self, app):
+    super().__init__(name='expiry-sweeper', daemon=True)
+    self.app = app
+    self.interval = app.config['EXPIRY_SWEEP_INTERVAL']
+    self._stopped = threading.Event()
+
+  def run(self):
+    while not self._stopped.wait(self.interval):
+      try:
+        with self.app.app_context():
+          sweep_expired()
+      except Exception as e:
+        logger.error(f"Expiry sweep failed: {str(e)}")
+
+  def stop(self):
+    self._stopped.set()
+
+def start_expiry_sweeper(app) -> Optional[ExpirySweeper]:
+  """
+  Palaiž beigušos ierakstu dzēšanas pavedienu, ja EXPIRY_SWEEP_INTERVAL ir pozitīvs.
+  """
+  if app.config['EXPIRY_SWEEP_INTERVAL'] <= 0:
+    return None
+  sweeper = ExpirySweeper(app)
+  sweeper.start()
+  return sweeper
@@ -0,0 +1,120 @@
+"""
+Benchmark for the SQLite connection pool and WAL settings.
+
+  python scripts/benchmark_db.py raw     # readers while a writer inserts/deletes rows
+  python scripts/benchmark_db.py api     # Flask test client throughput
+
+The raw benchmark compares a rollback journal with a new connection per read
+against WAL with one long-lived connection. The api benchmark measures the
+current tree; run it on the baseline commit as well to get the "before" column.
+"""
+import argparse
+import importlib.util
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def create_table(path: str, journal_mode: str, rows: int):
+  db = sqlite3.connect(path)
+  db.execute(f'PRAGMA journal_mode={journal_mode}')
+  db.execute('CREATE TABLE blacklist (ip TEXT PRIMARY KEY, source TEXT NOT NULL, added_at TIMESTAMP NOT NULL)')
+  db.executemany(
+    'INSERT INTO blacklist VALUES (?, ?, CURRENT_TIMESTAMP)',
+    ((f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', 'bench') for i in range(rows))
+  )
+  db.commit()
+  db.close()
+
+def writer(path: str, rows: int, stop: threading.Event):
+  """Repeatedly bulk-inserts and deletes a batch of rows"""
+  db = sqlite3.connect(path, timeout=30)
+  batch = [(f'172.16.{i >> 8 & 255}.{i & 255}', 'writer') for i in range(rows)]
+  while not stop.is_set():
+    db.executemany('INSERT OR IGNORE INTO blacklist VALUES (?, ?, CURRENT_TIMESTAMP)', batch)
+    db.commit()
+    db.execute("DELETE FROM blacklist WHERE source = 'writer'")
+    db.commit()
+  db.close()
+
+def run_raw(journal_mode: str, pooled: bool, rows: int, seconds: float) -> float:
+  """Returns reads per second while the writer is running"""
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'bench.db')
+    create_table(path, journal_mode, rows)
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(path, rows, stop))
+    thread.start()
+
+    reads = 0
+    db = sqlite3.connect(path, timeout=30) if pooled else None
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+      conn = db or sqlite3.connect(path, timeout=30)
+      conn.execute("SELECT ip, source, added_at FROM blacklist WHERE source = 'bench'").fetchall()
+      if db is None:
+        conn.close()
+      reads += 1
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    thread.join()
+    if db is not None:
+      db.close()
+  return reads / elapsed
+
+def raw(args):
+  print(f'Readers while a writer inserts/deletes {args.rows} rows ({args.seconds}s each):')
+  for label, journal_mode, pooled in (
+    ('rollback journal, connect per request', 'delete', False),
+    ('WAL, pooled connection', 'wal', True),
+  ):
+    rate = run_raw(journal_mode, pooled, args.rows, args.seconds)
+    print(f'  {label:<40} {rate:8.0f} reads/s')
+
+def api(args):
+  directory = tempfile.mkdtemp(prefix='bench-')
+  # Settings are read when config.settings is imported
+  os.environ['DATABASE_PATH'] = os.path.join(directory, 'bench.db')
+  os.environ['LOG_DIR'] = os.path.join(directory, 'logs')
+  sys.path.insert(0, ROOT)
+  spec = importlib.util.spec_from_file_location('app_main', os.path.join(ROOT, 'app.py'))
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  client = module.create_app().test_client()
+
+  def measure(request) -> float:
+    count = 0
+    deadline = time.perf_counter() + args.seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+      request(count)
+      count += 1
+    return count / (time.perf_counter() - started)
+
+  single = measure(lambda i: client.post('/import/single', json={
+    'ip': f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', 'source': 'bench'
+  }))
+  export = measure(lambda i: client.get('/export/iptables'))
+  print('Flask test client, single process:')
+  print(f'  /import/single    {single:8.0f} req/s')
+  print(f'  /export/iptables  {export:8.0f} req/s')
+
+def main():
+  parser = argparse.ArgumentParser(description='SQLite pool and WAL benchmark')
+  parser.add_argument('mode', choices=['raw', 'api'])
+  parser.add_argument('--rows', type=int, default=20000, help='Rows written per writer batch (raw)')
+  parser.add_argument('--seconds', type=float, default=5, help='Duration of each measurement')
+  args = parser.parse_args()
+  if args.mode == 'raw':
+    raw(args)
+  else:
+    api(args)
+
+if __name__ == '__main__':
+  main()
@@ -4,10 +4,13 @@ import logging
 from logging.handlers import RotatingFileHandler
 import os
 import sys
+import random
+import threading
 import time
-from typing import Optional
-import schedule
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 from config.settings import ControllerSettings
 
 # Load settings
@@ -40,21 +43,38 @@ def setup_logging():
 
 logger = setup_logging()
 
-def import_from_source(source: str, data: Optional[dict] = None) -> Optional[requests.Response]:
-  """Import IPs from specified source"""
+JOB_TIMEOUT = 300  # 5 minute limit for a single import job
+
+# Shared HTTP session so every request reuses pooled keep-alive connections
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_maxsize=settings.WORKERS))
+session.mount('https://', HTTPAdapter(pool_maxsize=settings.WORKERS))
+
+def submit_import(source: str, data: Optional[dict] = None) -> Optional[dict]:
+  """
+  Submit an import for the specified source.
+  Returns the queued job (HTTP 202) or the finished result (HTTP 201).
+  """
   try:
     headers = {'Content-Type': 'application/json'}
-    response = requests.post(
+    response = session.post(
       f"{settings.CONTROLLER_API_URL}/import/{source}",
       json=data if data else {},
       headers=headers,
-      timeout=300  # 5 minute timeout for imports
+      timeout=30
     )
     
-    if response.status_code == 201:
+    if response.status_code == 202:
+      job = response.json()
+      if job.get('coalesced'):
+        logger.info(f"Import from {source} already running as job {job['id']}")
+      else:
+        logger.info(f"Queued import from {source} as job {job['id']}")
+      return job
+    elif response.status_code == 201:
       result = response.json()
       logger.info(f"Successfully imported from {source}: {result['message']}")
-      return response
+      return result
     else:
       logger.error(f"Failed to import from {source}: {response.text}")
       return None
@@ -66,6 +86,41 @@ def import_from_source(source: str, data: Optional[dict] = None) -> Optional[req
     logger.error(f"Error importing from {source}: {str(e)}")
     return None
 
+def wait_for_job(source: str, job: dict, timeout: float = JOB_TIMEOUT) -> Optional[dict]:
+  """Poll a queued import job until it finishes, backing off from 1 to 10 seconds"""
+  if 'state' not in job:
+    return job
+
+  deadline = time.monotonic() + timeout
+  delay = 1.0
+  try:
+    while job['state'] in ('queued', 'running'):
+      if time.monotonic() >= deadline:
+        logger.error(f"Import job {job['id']} for {source} still {job['state']} after {timeout}s")
+        return None
+      time.sleep(delay)
+      delay = min(delay * 2, 10.0)
+      response = session.get(f"{settings.CONTROLLER_API_URL}/jobs/{job['id']}", timeout=30)
+      if response.status_code != 200:
+        logger.error(f"Failed to fetch import job {job['id']} for {source}: {response.text}")
+        return None
+      job = response.json()
+
+  except requests.exceptions.RequestException as e:
+    logger.error(f"Request failed for job {job['id']} ({source}): {str(e)}")
+    return None
+
+  if job['state'] == 'failed':
+    logger.error(f"Import job {job['id']} for {source} failed: {job['error']}")
+    return None
+  logger.info(f"Successfully imported from {source} in {job['duration']}s: {job['result'].get('message', '')}")
+  return job['result']
+
+def import_from_source(source: str, data: Optional[dict] = None) -> Optional[dict]:
+  """Import IPs from specified source and wait for the result"""
+  job = submit_import(source, data)
+  return wait_for_job(source, job) if job else None
+
 def add_to_whitelist(ip: str, reason: str):
   """Add IP to whitelist"""
   try:
@@ -77,7 +132,7 @@ def add_to_whitelist(ip: str, reason: str):
       'comment': f'Added by controller on {datetime.now()}'
     }
     
-    response = requests.post(
+    response = session.post(
       f"{settings.CONTROLLER_API_URL}/import/single",
       json=data,
       timeout=30
@@ -91,44 +146,118 @@ def add_to_whitelist(ip: str, reason: str):
   except Exception as e:
     logger.error(f"Error whitelisting IP {ip}: {str(e)}")
 
-def run_imports():
-  """Run all configured imports"""
-  try:
-    logger.info("Starting scheduled import run")
-    
-    # Import from blocklist.de
-    import_from_source('blocklist_de')
-    
-    # Import from elastiflow
-    import_from_source('elastiflow')
-    
-    # Import from fail2ban
-    import_from_source('fail2ban')
+def source_intervals() -> Dict[str, int]:
+  """Parse SOURCE_INTERVALS ("feeds=300,fail2ban=60"); unlisted sources use SCAN_INTERVAL"""
+  intervals = {}
+  for item in settings.SOURCE_INTERVALS.split(','):
+    name, _, value = item.partition('=')
+    if name.strip():
+      intervals[name.strip()] = int(value) if value.strip() else settings.SCAN_INTERVAL
+  return intervals
+
+class SourceScheduler:
+  """
+  Run each import source on its own interval in a bounded thread pool.
+  
+  Runs start at interval +/- SCHEDULE_JITTER and are anchored to the planned
+  start time, so they do not drift by the run duration. A source is never
+  started while its previous run is still in progress. A failed run is
+  retried after RETRY_BASE * 2^(failures - 1) seconds, capped at the interval.
+  """
+  def __init__(self, intervals: Dict[str, int], workers: int):
+    self.intervals = intervals
+    self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import')
+    self.lock = threading.Lock()
+    self.running = set()
+    # Set when a run finishes so the loop reschedules without waiting
+    self.wakeup = threading.Event()
+    self.failures = {source: 0 for source in intervals}
+    now = time.monotonic()
+    # Spread the first runs so sources don't all start at once
+    self.next_run = {source: now + random.uniform(0, settings.SCHEDULE_JITTER) * interval
+                     for source, interval in intervals.items()}
+  
+  def jittered(self, interval: float) -> float:
+    return interval * (1 + random.uniform(-settings.SCHEDULE_JITTER, settings.SCHEDULE_JITTER))
+  
+  def run_source(self, source: str):
+    """Run one import and schedule the next one based on the outcome"""
+    started = time.monotonic()
+    attempt = self.failures[source] + 1
+    result = None
+    try:
+      result = import_from_source(source)
+    except Exception as e:
+      logger.error(f"Error importing from {source}: {str(e)}")
+    duration = time.monotonic() - started
     
-    logger.info("Completed scheduled import run")
+    with self.lock:
+      interval = self.intervals[source]
+      if result is not None:
+        self.failures[source] = 0
+        planned = self.next_run[source] + self.jittered(interval)
+        # Skip missed slots instead of running back to back after a slow run
+        self.next_run[source] = planned if planned > time.monotonic() else time.monotonic() + self.jittered(interval)
+        status = 'succeeded'
+      else:
+        self.failures[source] += 1
+        delay = min(settings.RETRY_BASE * 2 ** (self.failures[source] - 1), interval)
+        self.next_run[source] = time.monotonic() + delay
+        status = 'failed'
+      self.running.discard(source)
+      next_in = self.next_run[source] - time.monotonic()
+    self.wakeup.set()
     
-  except Exception as e:
-    logger.error(f"Error during import run: {str(e)}")
-
-def main():
-  logger.info("Starting controller script")
+    # Structured timing record (logfmt) for each run
+    fields = {
+      'source': source,
+      'status': status,
+      'attempt': attempt,
+      'duration': f'{duration:.3f}',
+      'next_in': f'{next_in:.1f}',
+    }
+    for key in ('inserted', 'removed', 'duplicates', 'invalid'):
+      if result and key in result:
+        fields[key] = result[key]
+    logger.info('import_run ' + ' '.join(f'{key}={value}' for key, value in fields.items()))
   
-  # Schedule imports
-  schedule.every(settings.SCAN_INTERVAL).seconds.do(run_imports)
+  def tick(self):
+    """Start every due source that is not already running"""
+    now = time.monotonic()
+    with self.lock:
+      due = [source for source, at in self.next_run.items() if at <= now and source not in self.running]
+      self.running.update(due)
+    for source in due:
+      self.executor.submit(self.run_source, source)
   
-  # Run initial import
-  run_imports()
+  def run_forever(self):
+    while True:
+      self.tick()
+      with self.lock:
+        idle = [at for source, at in self.next_run.items() if source not in self.running]
+      wait = min(idle, default=time.monotonic() + 60) - time.monotonic()
+      self.wakeup.wait(max(wait, 0.01))
+      self.wakeup.clear()
   
+  def shutdown(self):
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+def main():
+  intervals = source_intervals()
+  logger.info(
+    "Starting controller script with sources "
+    + ', '.join(f'{source} every {interval}s' for source, interval in intervals.items())
+  )
+  
+  scheduler = SourceScheduler(intervals, settings.WORKERS)
   try:
-    # Keep running
-    while True:
-      schedule.run_pending()
-      time.sleep(1)
+    scheduler.run_forever()
       
   except Exception as e:
     logger.error(f"Controller script error: {str(e)}")
     sys.exit(1)
   finally:
+    scheduler.shutdown()
     logger.info("Shutting down controller script")
 
 if __name__ == '__main__':
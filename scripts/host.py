@@ -5,10 +5,12 @@ import logging
 from logging.handlers import RotatingFileHandler
 import os
 import sys
+import tempfile
 import time
-from typing import List, Set, Optional
+from typing import Iterator, List, Set, Optional, Tuple
 import json
 from config.settings import HostSettings
+from utils.iprange import ip_to_range, pack_ranges, range_to_cidrs, unpack_ranges
 
 # Load settings
 settings = HostSettings()
@@ -40,6 +42,57 @@ def setup_logging():
 
 logger = setup_logging()
 
+def ipfw(*args: str) -> List[str]:
+  """Build an ipfw command line using the configured binary"""
+  return [settings.IPFW_BIN, *args]
+
+def run_ipfw_file(commands: List[str]) -> Tuple[bool, str]:
+  """
+  Apply commands (one per line, without the leading 'ipfw') in a single
+  'ipfw -q <file>' invocation. ipfw stops at the first failing line.
+  """
+  with tempfile.NamedTemporaryFile('w', prefix='ipfw-', suffix='.txt') as f:
+    f.write('\n'.join(commands))
+    f.write('\n')
+    f.flush()
+    result = subprocess.run(ipfw('-q', f.name), capture_output=True, text=True)
+  return result.returncode == 0, result.stderr.strip()
+
+def apply_ipfw_commands(commands: List[str]) -> List[str]:
+  """
+  Apply commands in chunks of IPFW_BATCH_SIZE, one ipfw process per chunk.
+  A failing chunk is split in half and retried, so each bad command costs
+  O(log chunk size) extra invocations and the rest of the chunk still applies.
+  Returns the commands that failed on their own.
+  """
+  failed = []
+  
+  def apply_chunk(chunk: List[str]):
+    ok, error = run_ipfw_file(chunk)
+    if ok:
+      return
+    if len(chunk) == 1:
+      logger.error(f"ipfw command failed: {chunk[0]}: {error}")
+      failed.append(chunk[0])
+      return
+    middle = len(chunk) // 2
+    apply_chunk(chunk[:middle])
+    apply_chunk(chunk[middle:])
+  
+  for start in range(0, len(commands), settings.IPFW_BATCH_SIZE):
+    apply_chunk(commands[start:start + settings.IPFW_BATCH_SIZE])
+  return failed
+
+def get_existing_rules() -> Set[int]:
+  """Get the numbers of all rules currently loaded in IPFW"""
+  result = subprocess.run(ipfw('list'), capture_output=True, text=True, check=True)
+  rules = set()
+  for line in result.stdout.splitlines():
+    number = line.split(maxsplit=1)[0] if line.strip() else ''
+    if number.isdigit():
+      rules.add(int(number))
+  return rules
+
 def setup_base_rules():
   """Setup basic IPFW rules to ensure we don't lock ourselves out"""
   try:
@@ -56,54 +109,23 @@ def setup_base_rules():
       # Allow SSH (adjust port if needed)
       (500, "allow tcp from any to any 22 keep-state"),
       # Add other necessary services here
-      # The main blocking rule will be at settings.IPFW_RULE (default 1035)
+      # Our table-based blocking rule
+      (settings.IPFW_RULE, f"deny ip from table({settings.IPFW_TABLE}) to any"),
+      # Final default allow rule
+      (65534, "allow ip from any to any"),
     ]
     
-    for rule_num, rule in base_rules:
-      result = subprocess.run(
-        ['ipfw', 'show', str(rule_num)],
-        capture_output=True,
-        text=True
-      )
-      
-      if "65535" not in result.stdout:  # Rule doesn't exist
-        subprocess.run(
-          ['ipfw', 'add', str(rule_num), rule],
-          check=True,
-          capture_output=True
-        )
-        logger.info(f"Added base rule {rule_num}: {rule}")
-    
-    # Add our table-based blocking rule if it doesn't exist
-    block_rule = f"deny ip from table({settings.IPFW_TABLE}) to any"
-    result = subprocess.run(
-      ['ipfw', 'show', str(settings.IPFW_RULE)],
-      capture_output=True,
-      text=True
-    )
-    
-    if "65535" not in result.stdout:  # Rule doesn't exist
-      subprocess.run(
-        ['ipfw', 'add', str(settings.IPFW_RULE), block_rule],
-        check=True,
-        capture_output=True
-      )
-      logger.info(f"Added blocking rule {settings.IPFW_RULE}: {block_rule}")
-    
-    # Add final default allow rule if not present
-    result = subprocess.run(
-      ['ipfw', 'show', '65534'],
-      capture_output=True,
-      text=True
-    )
+    # One 'ipfw list' and one batch for the missing rules instead of a process per rule
+    existing = get_existing_rules()
+    missing = [(rule_num, rule) for rule_num, rule in base_rules if rule_num not in existing]
+    if not missing:
+      return
     
-    if "65535" not in result.stdout:  # Rule doesn't exist
-      subprocess.run(
-        ['ipfw', 'add', '65534', 'allow ip from any to any'],
-        check=True,
-        capture_output=True
-      )
-      logger.info("Added default allow rule")
+    failed = apply_ipfw_commands([f"add {rule_num} {rule}" for rule_num, rule in missing])
+    if failed:
+      raise RuntimeError(f"Failed to add base rules: {failed}")
+    for rule_num, rule in missing:
+      logger.info(f"Added base rule {rule_num}: {rule}")
       
   except subprocess.CalledProcessError as e:
     logger.error(f"Error setting up base rules: {e.stderr}")
@@ -116,7 +138,7 @@ def get_current_ipfw_ips() -> Set[str]:
   """Get currently blocked IPs from IPFW table"""
   try:
     result = subprocess.run(
-      ['ipfw', 'table', str(settings.IPFW_TABLE), 'list'],
+      ipfw('table', str(settings.IPFW_TABLE), 'list'),
       capture_output=True,
       text=True
     )
@@ -131,92 +153,405 @@ def get_current_ipfw_ips() -> Set[str]:
     logger.error(f"Error getting IPFW table: {str(e)}")
     return set()
 
-def update_ipfw_table(ips_to_add: Set[str], ips_to_remove: Set[str], verify_access: Optional[str] = None):
+def api_reachable() -> bool:
+  """Check that the API server can still be reached through the firewall"""
+  try:
+    response = requests.get(f"{settings.HOST_API_URL}/health", timeout=5)
+    if response.status_code != 200:
+      logger.error("Lost access to API server after update!")
+      return False
+    return True
+  except requests.exceptions.RequestException as e:
+    logger.error(f"Cannot reach API server after update: {str(e)}")
+    return False
+
+def update_ipfw_table(ips_to_add: Set[str], ips_to_remove: Set[str], verify_access: Optional[str] = None) -> bool:
   """
   Update IPFW table with new IPs
   
+  The whole diff is applied as ipfw command files (see apply_ipfw_commands)
+  instead of one process per address. Base rules are set up once at startup.
+  If any command fails or the API server cannot be reached afterwards, the
+  applied part of the diff is reverted, so the table stays at the old version.
+  
   Args:
       ips_to_add: Set of IPs to add to the block list
       ips_to_remove: Set of IPs to remove from the block list
       verify_access: Optional IP to verify access after update (e.g., API server IP)
+  
+  Returns:
+      True if the whole update was applied and kept
   """
   try:
-    # First ensure base rules are in place
-    setup_base_rules()
+    # Don't block the API server
+    if verify_access and verify_access in ips_to_add:
+      logger.warning(f"Skipping blocking API server IP: {verify_access}")
+      ips_to_add = ips_to_add - {verify_access}
     
-    # Remove IPs
-    for ip in ips_to_remove:
-      result = subprocess.run(
-        ['ipfw', 'table', str(settings.IPFW_TABLE), 'delete', ip],
-        capture_output=True
-      )
-      if result.returncode != 0:
-        logger.error(f"Failed to remove IP {ip}: {result.stderr}")
+    table = settings.IPFW_TABLE
+    commands = [f"table {table} delete {ip}" for ip in sorted(ips_to_remove)]
+    commands += [f"table {table} add {ip}" for ip in sorted(ips_to_add)]
     
-    # Add IPs
-    for ip in ips_to_add:
-      # Don't block the API server
-      if verify_access and ip == verify_access:
-        logger.warning(f"Skipping blocking API server IP: {ip}")
-        continue
-        
-      result = subprocess.run(
-        ['ipfw', 'table', str(settings.IPFW_TABLE), 'add', ip],
-        capture_output=True
-      )
-      if result.returncode != 0:
-        logger.error(f"Failed to add IP {ip}: {result.stderr}")
+    started = time.perf_counter()
+    failed = set(apply_ipfw_commands(commands))
+    logger.info(
+      f"Applied {len(commands) - len(failed)} of {len(commands)} IPFW table changes "
+      f"in {time.perf_counter() - started:.3f}s"
+    )
     
-    # Verify we can still reach the API server if specified
-    if verify_access:
-      try:
-        response = requests.get(f"{settings.HOST_API_URL}/health", timeout=5)
-        if response.status_code != 200:
-          logger.error("Lost access to API server after update!")
-          # Could implement rollback here if needed
-      except requests.exceptions.RequestException as e:
-        logger.error(f"Cannot reach API server after update: {str(e)}")
+    # A partial update must not be saved as applied; otherwise verify we can
+    # still reach the API server if specified
+    if failed:
+      logger.error(f"Rolling back IPFW table changes after {len(failed)} failed commands")
+    elif verify_access and not api_reachable():
+      logger.error("Rolling back IPFW table changes")
+    else:
+      return True
+    rollback = [f"table {table} delete {ip}" for ip in sorted(ips_to_add) if f"table {table} add {ip}" not in failed]
+    rollback += [f"table {table} add {ip}" for ip in sorted(ips_to_remove) if f"table {table} delete {ip}" not in failed]
+    apply_ipfw_commands(rollback)
+    return False
     
   except Exception as e:
     logger.error(f"Error updating IPFW table: {str(e)}")
+    return False
+
+def swap_ipfw_table(ips: Set[str], verify_access: Optional[str] = None) -> bool:
+  """
+  Replace the whole live table contents without a window of missing entries
+  
+  The standby table (IPFW_STANDBY_TABLE) is flushed and filled in batches,
+  then atomically swapped with IPFW_TABLE, so the deny rule always sees either
+  the complete old or the complete new set. If the script dies while filling
+  or an entry cannot be added, the live table is untouched. The previous contents stay in the standby
+  table, so a failed access check is rolled back by swapping again.
+  
+  Args:
+      ips: Complete set of networks the live table should contain
+      verify_access: Optional IP to verify access after update (e.g., API server IP)
+  
+  Returns:
+      True if the new table is live
+  """
+  try:
+    if verify_access and verify_access in ips:
+      logger.warning(f"Skipping blocking API server IP: {verify_access}")
+      ips = ips - {verify_access}
+    
+    live, standby = settings.IPFW_TABLE, settings.IPFW_STANDBY_TABLE
+    started = time.perf_counter()
+    # Numbered tables must exist before they can be flushed
+    info = subprocess.run(ipfw('table', str(standby), 'info'), capture_output=True, text=True)
+    commands = [] if info.returncode == 0 else [f"table {standby} create type addr"]
+    commands.append(f"table {standby} flush")
+    if apply_ipfw_commands(commands):
+      return False
+    
+    failed = apply_ipfw_commands([f"table {standby} add {ip}" for ip in sorted(ips)])
+    if failed:
+      logger.error(f"Not swapping IPFW table {live}: {len(failed)} entries could not be added to {standby}")
+      return False
+    ok, error = run_ipfw_file([f"table {live} swap {standby}"])
+    if not ok:
+      logger.error(f"Failed to swap IPFW tables {live} and {standby}: {error}")
+      return False
+    logger.info(
+      f"Swapped {len(ips)} entries into IPFW table {live} "
+      f"in {time.perf_counter() - started:.3f}s"
+    )
+    
+    if verify_access and not api_reachable():
+      logger.error(f"Rolling back IPFW table {live} to the previous contents")
+      ok, error = run_ipfw_file([f"table {live} swap {standby}"])
+      if not ok:
+        logger.error(f"Rollback swap failed: {error}")
+      return False
+    return True
+    
+  except Exception as e:
+    logger.error(f"Error swapping IPFW table: {str(e)}")
+    return False
+
+# Last blacklist version applied to the IPFW table
+last_version: Optional[int] = None
+# Ranges in the IPFW table as of last_version (None until known)
+applied_ranges: Optional[Set[Tuple[int, int, int]]] = None
+# When the IPFW table was last compared with applied_ranges
+last_drift_check: float = 0.0
+
+def fetch_blacklist_ranges() -> Optional[Tuple[int, Set[Tuple[int, int, int]]]]:
+  """Download the full blacklist in the compact binary format as numeric ranges"""
+  response = requests.get(
+    f"{settings.HOST_API_URL}/export/iptables/binary",
+    headers={'Accept-Encoding': 'gzip'},
+    timeout=60
+  )
+  if response.status_code != 200:
+    logger.error(f"Failed to get blacklist: {response.text}")
+    return None
+  
+  version, ranges = unpack_ranges(response.content)
+  return version, set(ranges)
+
+def ipfw_ranges(ips: Set[str]) -> Set[Tuple[int, int, int]]:
+  """Convert IPFW table entries (e.g. 1.2.3.4/32) to numeric ranges"""
+  ranges = set()
+  for ip in ips:
+    try:
+      ranges.add(ip_to_range(ip))
+    except ValueError:
+      logger.warning(f"Ignoring unparsable IPFW table entry: {ip}")
+  return ranges
+
+def ranges_to_ips(ranges: Set[Tuple[int, int, int]]) -> Set[str]:
+  """Convert numeric ranges to the CIDR strings used in IPFW table commands"""
+  return {network for item in ranges for network in range_to_cidrs(*item)}
+
+def api_server_host() -> str:
+  """Extract API server host from HOST_API_URL"""
+  return settings.HOST_API_URL.split('://')[1].split(':')[0]
+
+def protected_ranges() -> Set[Tuple[int, int, int]]:
+  """Ranges that are never added to the table (the API server, if given as an IP)"""
+  try:
+    return {ip_to_range(api_server_host())}
+  except ValueError:
+    return set()
+
+def load_state() -> bool:
+  """
+  Load the last applied version and ranges from HOST_STATE_FILE
+  
+  The file uses the sorted binary export format, so a restart resumes with
+  delta syncs instead of a full download. It is read in one call: the ranges
+  are kept as a set for diffing anyway, so mapping the file saves nothing.
+  """
+  global last_version, applied_ranges
+  try:
+    with open(settings.STATE_FILE, 'rb') as f:
+      version, ranges = unpack_ranges(f.read())
+  except FileNotFoundError:
+    return False
+  except (OSError, ValueError) as e:
+    logger.error(f"Ignoring unreadable state file {settings.STATE_FILE}: {str(e)}")
+    return False
+  
+  last_version, applied_ranges = version, set(ranges)
+  logger.info(f"Loaded state: version {version}, {len(applied_ranges)} entries")
+  return True
+
+def save_state():
+  """Atomically write the last applied version and ranges to HOST_STATE_FILE"""
+  directory = os.path.dirname(settings.STATE_FILE) or '.'
+  os.makedirs(directory, exist_ok=True)
+  try:
+    with tempfile.NamedTemporaryFile('wb', dir=directory, prefix='.state-', delete=False) as f:
+      f.write(pack_ranges(last_version, applied_ranges))
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(f.name, settings.STATE_FILE)
+  except OSError as e:
+    logger.error(f"Failed to save state file {settings.STATE_FILE}: {str(e)}")
+
+def current_ranges() -> Set[Tuple[int, int, int]]:
+  """Ranges currently in the IPFW table, from the local state if it is known"""
+  if applied_ranges is None:
+    return ipfw_ranges(get_current_ipfw_ips())
+  return applied_ranges
+
+def check_drift(force: bool = False) -> bool:
+  """
+  Compare the real IPFW table with the local state and repair differences
+  
+  Listing a large table is expensive, so this runs at most every
+  HOST_DRIFT_CHECK_INTERVAL seconds unless forced.
+  
+  Returns:
+      True if the table was checked
+  """
+  global applied_ranges, last_drift_check
+  if applied_ranges is None:
+    return False
+  if not force and time.monotonic() - last_drift_check < settings.DRIFT_CHECK_INTERVAL:
+    return False
+  
+  last_drift_check = time.monotonic()
+  table_ranges = ipfw_ranges(get_current_ipfw_ips())
+  missing = applied_ranges - table_ranges
+  extra = table_ranges - applied_ranges
+  if not missing and not extra:
+    logger.info(f"IPFW table matches local state ({len(table_ranges)} entries)")
+    return True
+  
+  logger.warning(f"IPFW table drifted from local state: {len(missing)} missing, {len(extra)} unexpected entries")
+  if not update_ipfw_table(ranges_to_ips(missing), ranges_to_ips(extra), verify_access=api_server_host()):
+    # Trust the real table until the next sync
+    applied_ranges = table_ranges
+  return True
+
+def apply_update(version: int, ips_to_add: Set[str], ips_to_remove: Set[str],
+                 snapshot: Optional[Set[Tuple[int, int, int]]] = None) -> bool:
+  """
+  Apply a blacklist diff to the IPFW table and remember the applied version
+  
+  Args:
+      version: Blacklist version the diff leads to
+      ips_to_add: Networks to add
+      ips_to_remove: Networks to remove
+      snapshot: Complete target ranges, if known (full resync)
+  
+  Returns:
+      True if the table now matches the version
+  """
+  global last_version, applied_ranges, last_drift_check
+  if snapshot is None:
+    snapshot = (current_ranges() - ipfw_ranges(ips_to_remove)) | ipfw_ranges(ips_to_add)
+  snapshot = snapshot - protected_ranges()
+  
+  if not ips_to_add and not ips_to_remove:
+    logger.info("No updates needed")
+    if version != last_version or applied_ranges is None:
+      last_version, applied_ranges = version, snapshot
+      save_state()
+    return True
+  
+  api_server = api_server_host()
+  # Large diffs replace the whole table through the standby table
+  if len(ips_to_add) + len(ips_to_remove) >= settings.IPFW_SWAP_THRESHOLD:
+    applied = swap_ipfw_table(ranges_to_ips(snapshot), verify_access=api_server)
+  else:
+    applied = update_ipfw_table(ips_to_add, ips_to_remove, verify_access=api_server)
+  
+  if not applied:
+    # Keep the old version so the next sync retries the same changes, after a
+    # drift check has repaired whatever made them fail (e.g. a missing entry)
+    logger.error(f"Blacklist version {version} was not applied")
+    last_drift_check = 0.0
+    return False
+  logger.info(f"Added {len(ips_to_add)} IPs, removed {len(ips_to_remove)} IPs (version {version})")
+  last_version, applied_ranges = version, snapshot
+  save_state()
+  return True
 
 def sync_with_api():
   """Sync local IPFW table with API blacklist"""
   try:
-    # Extract API server IP from HOST_API_URL
-    api_server = settings.HOST_API_URL.split('://')[1].split(':')[0]
+    check_drift()
     
-    # Get blacklist from API
-    response = requests.get(f"{settings.HOST_API_URL}/export/iptables")
-    if response.status_code != 200:
-      logger.error(f"Failed to get blacklist: {response.text}")
-      return
+    # Ask only for changes since the last applied version
+    data = None
+    if last_version is not None:
+      response = requests.get(
+        f"{settings.HOST_API_URL}/export/iptables",
+        params={'since': last_version, 'full': 'false'},
+        timeout=60
+      )
+      if response.status_code != 200:
+        logger.error(f"Failed to get blacklist changes: {response.text}")
+        return
+      data = response.json()
       
-    api_ips = set(response.json()['ips'])
-    current_ips = get_current_ipfw_ips()
-    
-    # Calculate differences
-    ips_to_add = api_ips - current_ips
-    ips_to_remove = current_ips - api_ips
-    
-    if ips_to_add or ips_to_remove:
-      update_ipfw_table(ips_to_add, ips_to_remove, verify_access=api_server)
-      logger.info(f"Added {len(ips_to_add)} IPs, removed {len(ips_to_remove)} IPs")
+    if data is not None and data.get('format') == 'delta':
+      apply_update(data['version'], set(data['added']), set(data['removed']))
     else:
-      logger.info("No updates needed")
+      # Full resync: compare numeric ranges instead of per-IP strings
+      snapshot = fetch_blacklist_ranges()
+      if snapshot is None:
+        return
+      version, api_ranges = snapshot
+      table_ranges = current_ranges()
+      
+      # Calculate differences
+      ips_to_add = ranges_to_ips(api_ranges - table_ranges)
+      ips_to_remove = ranges_to_ips(table_ranges - api_ranges)
+      apply_update(version, ips_to_add, ips_to_remove, snapshot=api_ranges)
     
   except Exception as e:
     logger.error(f"Sync failed: {str(e)}")
 
+def read_events(lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+  """Parse a server-sent events stream into (event, data) pairs"""
+  event, data = 'message', []
+  for line in lines:
+    if not line:
+      if data:
+        yield event, '\n'.join(data)
+      event, data = 'message', []
+    elif line.startswith(':'):
+      continue
+    else:
+      field, _, value = line.partition(':')
+      value = value[1:] if value.startswith(' ') else value
+      if field == 'event':
+        event = value
+      elif field == 'data':
+        data.append(value)
+
+def follow_stream() -> bool:
+  """
+  Apply blacklist changes as the API pushes them over /export/stream
+  
+  Catches up with a regular sync first, then applies each delta event as it
+  arrives. Returns when the stream ends, a resync is requested or a delta
+  cannot be applied; the caller reconnects from the last applied version.
+  
+  Returns:
+      False if the caller should back off before reconnecting
+  """
+  sync_with_api()
+  if last_version is None:
+    return False
+  
+  with requests.get(
+    f"{settings.HOST_API_URL}/export/stream",
+    params={'since': last_version},
+    stream=True,
+    timeout=(10, settings.STREAM_TIMEOUT)
+  ) as response:
+    if response.status_code != 200:
+      logger.error(f"Failed to open change stream: {response.text}")
+      return False
+    logger.info(f"Following change stream from version {last_version}")
+    
+    for event, data in read_events(response.iter_lines(decode_unicode=True)):
+      if event == 'delta':
+        delta = json.loads(data)
+        if not apply_update(delta['version'], set(delta['added']), set(delta['removed'])):
+          return False
+      elif event == 'resync':
+        logger.info("Change stream requested a full resync")
+        sync_with_api()
+        return True
+  return True
+
 def main():
-  logger.info("Starting host sync script")
+  logger.info(f"Starting host sync script in {settings.SYNC_MODE} mode")
   
   # Ensure base rules are setup on startup
   setup_base_rules()
   
+  # Resume from the saved state; the table may have been flushed (e.g. reboot)
+  if load_state():
+    check_drift(force=True)
+  
+  if settings.SYNC_MODE == 'stream':
+    delay = 1
+    while True:
+      try:
+        if follow_stream():
+          delay = 1
+          continue
+      except requests.exceptions.RequestException as e:
+        logger.error(f"Change stream failed: {str(e)}")
+      except Exception as e:
+        logger.error(f"Change stream error: {str(e)}")
+      # Back off before reconnecting, up to the polling interval
+      time.sleep(delay)
+      delay = min(delay * 2, settings.SYNC_INTERVAL)
+  
   while True:
     sync_with_api()
-    time.sleep(60)  # Sync every minute
+    time.sleep(settings.SYNC_INTERVAL)
 
 if __name__ == '__main__':
   try:
@@ -0,0 +1,33 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Iestatījumi tiek nolasīti, importējot config.settings, tāpēc tie jānorāda pirms tam
+TEMP_DIR = tempfile.mkdtemp(prefix='ipbl-tests-')
+os.environ['DATABASE_PATH'] = os.path.join(TEMP_DIR, 'test.db')
+os.environ['LOG_DIR'] = os.path.join(TEMP_DIR, 'logs')
+os.environ['EXPIRY_SWEEP_INTERVAL'] = '0'
+os.environ['ELASTIFLOW_DIR'] = os.path.join(TEMP_DIR, 'elastiflow')
+os.makedirs(os.environ['ELASTIFLOW_DIR'])
+os.environ['HOST_LOG_FILE'] = os.path.join(TEMP_DIR, 'logs', 'host.log')
+os.environ['HOST_STATE_FILE'] = os.path.join(TEMP_DIR, 'host_state.bin')
+
+def load_app_module():
+  """app.py tiek ielādēts pēc faila ceļa, jo app ir arī pakotnes nosaukums"""
+  spec = importlib.util.spec_from_file_location('app_main', os.path.join(ROOT, 'app.py'))
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+@pytest.fixture(scope='session')
+def app():
+  return load_app_module().create_app()
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
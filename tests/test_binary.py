@@ -0,0 +1,42 @@
+import gzip
+import pytest
+from db.database import bulk_ingest
+from utils.iprange import ip_to_range, pack_ranges, unpack_ranges
+
+def test_pack_ranges_round_trip():
+  ranges = [
+    ip_to_range('10.0.0.1'),
+    ip_to_range('10.0.0.0/8'),
+    ip_to_range('255.255.255.255'),
+    ip_to_range('2001:db8::/32'),
+    ip_to_range('ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'),
+    ip_to_range('10.0.0.1'),
+  ]
+  body = pack_ranges(42, ranges)
+  assert len(body) == 24 + 3 * 8 + 2 * 32
+
+  version, unpacked = unpack_ranges(body)
+  assert version == 42
+  assert unpacked == sorted(set(ranges))
+
+def test_unpack_rejects_bad_header_and_truncated_body():
+  body = pack_ranges(1, [ip_to_range('10.0.0.1')])
+  with pytest.raises(ValueError):
+    unpack_ranges(b'XXXX' + body[4:])
+  with pytest.raises(ValueError):
+    unpack_ranges(body[:-1])
+
+def test_binary_export_matches_json_export(app, client):
+  with app.app_context():
+    bulk_ingest(['198.18.11.1', '198.18.12.0/24', '2001:db8:11::/48'], 'blacklist', 'binary-test')
+
+  expected = {ip_to_range(ip) for ip in client.get('/export/iptables').json['ips']}
+  response = client.get('/export/iptables/binary')
+  assert response.status_code == 200
+  version, ranges = unpack_ranges(response.data)
+  assert version == client.get('/export/iptables').json['version']
+  assert set(ranges) == expected
+
+  compressed = client.get('/export/iptables/binary', headers={'Accept-Encoding': 'gzip'})
+  assert compressed.headers['Content-Encoding'] == 'gzip'
+  assert unpack_ranges(gzip.decompress(compressed.data)) == (version, ranges)
@@ -0,0 +1,41 @@
+import os
+from app.importers.elastiflow import import_elastiflow
+from db.database import get_source_ips
+
+HEADER = 'flow.src.ip.addr,flow.dst.l4.port.id\n'
+
+def test_thresholds_count_flows_across_runs(app):
+  path = os.path.join(app.config['ELASTIFLOW_DIR'], 'flows.csv')
+  app.config.update(ELASTIFLOW_MIN_FLOWS=3, ELASTIFLOW_MIN_PORTS=0)
+  try:
+    with app.app_context():
+      with open(path, 'w') as f:
+        f.write(HEADER + '192.0.2.50,22\n192.0.2.50,23\n')
+      result, _ = import_elastiflow()
+      assert result.inserted == 0
+
+      with open(path, 'a') as f:
+        f.write('192.0.2.50,24\n192.0.2.50,25\n')
+      result, stats = import_elastiflow()
+      assert stats['rows'] == 2
+      assert result.inserted == 1
+      assert '192.0.2.50' in get_source_ips('blacklist', 'elastiflow')
+  finally:
+    app.config.update(ELASTIFLOW_MIN_FLOWS=1000, ELASTIFLOW_MIN_PORTS=100)
+
+def test_distinct_ports_count_across_runs(app):
+  path = os.path.join(app.config['ELASTIFLOW_DIR'], 'ports.csv')
+  app.config.update(ELASTIFLOW_MIN_FLOWS=0, ELASTIFLOW_MIN_PORTS=3)
+  try:
+    with app.app_context():
+      with open(path, 'w') as f:
+        f.write(HEADER + '192.0.2.60,22\n192.0.2.60,22\n')
+      assert import_elastiflow()[0].inserted == 0
+      with open(path, 'a') as f:
+        f.write('192.0.2.60,22\n192.0.2.60,80\n')
+      assert import_elastiflow()[0].inserted == 0
+      with open(path, 'a') as f:
+        f.write('192.0.2.60,443\n')
+      assert import_elastiflow()[0].inserted == 1
+  finally:
+    app.config.update(ELASTIFLOW_MIN_FLOWS=1000, ELASTIFLOW_MIN_PORTS=100)
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+import db.database
+from db.database import bulk_ingest
+
+class Later(datetime):
+  """Pulkstenis, kas ir divas stundas priekšā, lai ieraksti ar ttl=3600 būtu beigušies"""
+  @classmethod
+  def now(cls, tz=None):
+    return datetime.now(tz) + timedelta(hours=2)
+
+def test_etag_is_stable_without_changes(client):
+  first = client.get('/export/iptables')
+  etag = first.headers['ETag']
+  assert client.get('/export/iptables').headers['ETag'] == etag
+
+  cached = client.get('/export/iptables', headers={'If-None-Match': etag})
+  assert cached.status_code == 304
+  assert cached.data == b''
+
+def test_etag_changes_after_write(client):
+  etag = client.get('/export/iptables').headers['ETag']
+  response = client.post('/import/single', json={'ip': '198.18.9.1', 'source': 'etag-test'})
+  assert response.status_code == 201
+
+  response = client.get('/export/iptables', headers={'If-None-Match': etag})
+  assert response.status_code == 200
+  assert response.headers['ETag'] != etag
+  assert '198.18.9.1' in response.json['ips']
+
+def test_etag_changes_after_expiry(app, client, monkeypatch):
+  with app.app_context():
+    bulk_ingest(['198.18.9.2'], 'blacklist', 'etag-test', ttl=3600)
+  response = client.get('/export/iptables')
+  etag = response.headers['ETag']
+  assert '198.18.9.2' in response.json['ips']
+
+  # Termiņš beidzas bez rakstīšanas caur API, tāpēc tikai derīguma termiņš ETag padara atbildi novecojušu
+  monkeypatch.setattr(db.database, 'datetime', Later)
+  response = client.get('/export/iptables', headers={'If-None-Match': etag})
+  assert response.status_code == 200
+  assert response.headers['ETag'] != etag
+  assert '198.18.9.2' not in response.json['ips']
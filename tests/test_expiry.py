@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from db.database import bulk_ingest, get_blacklist, get_blacklist_delta, get_db, get_version
+
+def expire(ip):
+  """Pārvieto ieraksta termiņu pagātnē, neizmantojot fona dzēšanu"""
+  with get_db() as db:
+    db.execute(
+      'UPDATE blacklist SET expires_at = ? WHERE ip = ?',
+      (str(datetime.now() - timedelta(seconds=1)), ip)
+    )
+    db.commit()
+
+def test_expired_entry_is_removed_from_delta_without_sweeper(app):
+  with app.app_context():
+    bulk_ingest(['203.0.113.10'], 'blacklist', 'expiry-test', ttl=3600)
+    version = get_version()
+    expire('203.0.113.10')
+
+    delta = get_blacklist_delta(version)
+    assert '203.0.113.10' in delta['removed']
+    assert delta['version'] > version
+    assert '203.0.113.10' not in {entry['ip'] for entry in get_blacklist()}
+
+def test_renewing_expired_entry_writes_changelog(app):
+  with app.app_context():
+    bulk_ingest(['203.0.113.20'], 'blacklist', 'expiry-test', ttl=3600)
+    expire('203.0.113.20')
+    version = get_version()
+
+    bulk_ingest(['203.0.113.20'], 'blacklist', 'expiry-test', ttl=3600)
+    delta = get_blacklist_delta(version)
+    assert delta['version'] > version
+    assert '203.0.113.20' in delta['added']
+    assert '203.0.113.20' in {entry['ip'] for entry in get_blacklist()}
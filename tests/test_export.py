@@ -0,0 +1,46 @@
+import ipaddress
+import pytest
+from utils.iprange import aggregate_networks, ip_to_range
+
+def covers(networks, address):
+  return any(ipaddress.ip_address(address) in ipaddress.ip_network(network) for network in networks)
+
+def test_aggregate_does_not_widen_over_excluded_ranges():
+  networks = aggregate_networks(
+    [ip_to_range('10.0.0.0/25')],
+    max_prefix=16,
+    excluded=[ip_to_range('10.0.0.128/25')]
+  )
+  assert not covers(networks, '10.0.0.128')
+  assert not covers(networks, '10.0.0.255')
+  assert covers(networks, '10.0.0.1')
+  assert covers(networks, '10.0.255.1')
+
+def test_aggregated_export_keeps_whitelisted_hosts_open(client):
+  client.post('/import/single', json={'ip': '10.20.0.0/24', 'type': 'blacklist', 'source': 'test'})
+  client.post('/import/single', json={'ip': '10.20.0.128/25', 'type': 'whitelist', 'source': 'test'})
+
+  response = client.get('/export/iptables?aggregate=true&max_prefix=16')
+  assert response.status_code == 200
+  networks = [network for network in response.json['ips'] if network.startswith('10.')]
+  assert networks
+  assert not covers(networks, '10.20.0.200')
+  assert covers(networks, '10.20.0.1')
+
+def failing_chunks():
+  yield [{'ip': '192.0.2.1'}]
+  raise RuntimeError('cursor failed')
+
+def test_json_stream_is_not_closed_after_failure(app):
+  from app.routes.export import stream_json
+  parts = []
+  with app.app_context():
+    with pytest.raises(RuntimeError):
+      for part in stream_json(failing_chunks()):
+        parts.append(part)
+  assert not ''.join(parts).endswith(']')
+
+def test_csv_stream_raises_after_failure():
+  from app.routes.export import stream_csv
+  with pytest.raises(RuntimeError):
+    list(stream_csv(failing_chunks()))
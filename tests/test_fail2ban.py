@@ -0,0 +1,89 @@
+import gzip
+import os
+import shutil
+import pytest
+from app.importers.fail2ban import import_fail2ban
+from db.database import get_source_ips
+
+def line(second, action, ip):
+  return f'2024-01-15 10:30:{second:02d},123 fail2ban.actions [1234]: NOTICE  [sshd] {action} {ip}\n'.encode()
+
+@pytest.fixture
+def log_dir(app, tmp_path):
+  previous = app.config['FAIL2BAN_DIR']
+  app.config['FAIL2BAN_DIR'] = str(tmp_path)
+  try:
+    with app.app_context():
+      yield tmp_path
+  finally:
+    app.config['FAIL2BAN_DIR'] = previous
+
+def write(path, *lines, mode='ab'):
+  with open(path, mode) as f:
+    f.write(b''.join(lines))
+
+def test_resumes_from_offset_and_skips_unfinished_line(log_dir):
+  path = log_dir / 'fail2ban.log'
+  write(path, line(0, 'Ban', '198.18.16.1'))
+  result, stats = import_fail2ban()
+  assert result.inserted == 1
+  assert stats['bytes_read'] == os.path.getsize(path)
+
+  unfinished = line(2, 'Ban', '198.18.16.3')
+  write(path, line(1, 'Ban', '198.18.16.2'), unfinished[:20])
+  result, stats = import_fail2ban()
+  assert result.inserted == 1
+  assert stats['bytes_read'] == len(line(1, 'Ban', '198.18.16.2'))
+
+  write(path, unfinished[20:])
+  result, stats = import_fail2ban()
+  assert result.inserted == 1
+  assert stats['bytes_read'] == len(unfinished)
+  assert {'198.18.16.1', '198.18.16.2', '198.18.16.3'} <= get_source_ips('blacklist', 'fail2ban')
+
+  result, stats = import_fail2ban()
+  assert stats['bytes_read'] == 0
+  assert result.inserted == 0
+
+def test_rotated_and_compressed_logs_are_not_read_again(log_dir):
+  path = log_dir / 'fail2ban.log'
+  write(path, line(0, 'Ban', '198.18.17.1'))
+  import_fail2ban()
+
+  # Rindas, kas ierakstītas tieši pirms rotācijas, tiek nolasītas no pārsauktā faila
+  write(path, line(1, 'Ban', '198.18.17.2'))
+  os.rename(path, log_dir / 'fail2ban.log.1')
+  write(path, line(2, 'Unban', '198.18.17.1'))
+  os.utime(log_dir / 'fail2ban.log.1', (1, 1))
+  result, stats = import_fail2ban()
+  assert stats['files'] == 2
+  assert result.inserted == 1
+  assert result.removed == 1
+  assert get_source_ips('blacklist', 'fail2ban') >= {'198.18.17.2'}
+  assert '198.18.17.1' not in get_source_ips('blacklist', 'fail2ban')
+
+  # logrotate saspiež rotēto failu: tas ir jauns fails ar to pašu saturu
+  with open(log_dir / 'fail2ban.log.1', 'rb') as source, gzip.open(log_dir / 'fail2ban.log.2.gz', 'wb') as target:
+    shutil.copyfileobj(source, target)
+  os.remove(log_dir / 'fail2ban.log.1')
+  result, stats = import_fail2ban()
+  assert stats['bytes_read'] == 0
+  assert result.inserted == 0 and result.removed == 0
+
+def test_truncated_log_is_read_from_start(log_dir):
+  path = log_dir / 'fail2ban.log'
+  write(path, line(0, 'Ban', '198.18.18.1'), line(1, 'Ban', '198.18.18.2'))
+  import_fail2ban()
+
+  # copytruncate: tas pats inode, bet saturs sākas no jauna un ir īsāks par offset
+  write(path, line(5, 'Ban', '198.18.18.3'), mode='wb')
+  result, stats = import_fail2ban()
+  assert stats['bytes_read'] == os.path.getsize(path)
+  assert result.inserted == 1
+
+  # Tāda paša izmēra jauns saturs tiek atpazīts pēc atšķirīga sākuma
+  write(path, line(6, 'Ban', '198.18.18.4'), mode='wb')
+  result, stats = import_fail2ban()
+  assert stats['bytes_read'] == os.path.getsize(path)
+  assert result.inserted == 1
+  assert {'198.18.18.3', '198.18.18.4'} <= get_source_ips('blacklist', 'fail2ban')
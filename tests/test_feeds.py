@@ -0,0 +1,64 @@
+import threading
+from unittest import mock
+from app.importers.feeds import Feed, import_feed
+from db.database import apply_changes, bulk_ingest, get_source_ips
+
+class FakeResponse:
+  def __init__(self, content, status_code=200):
+    self.content = content
+    self.status_code = status_code
+    self.headers = {}
+
+  @property
+  def text(self):
+    # Kā requests bez charset galvenes, kad kodējuma minējums ir kļūdains
+    return self.content.decode('utf-16', errors='replace')
+
+def fetch(feed, content, status_code=200):
+  session = mock.Mock()
+  session.get.return_value = FakeResponse(content, status_code)
+  with mock.patch('app.importers.feeds.get_session', return_value=session):
+    return import_feed(feed, force=True)
+
+def test_feed_body_is_decoded_as_utf8(app):
+  feed = Feed(name='test-encoding', url='http://feeds.invalid/encoding.txt', source='test-encoding', ttl=3600)
+  with app.app_context():
+    result = fetch(feed, b'2.2.2.2\n3.3.3.3\n')
+    assert result['status'] == 'updated'
+    assert get_source_ips('blacklist', 'test-encoding') == {'2.2.2.2', '3.3.3.3'}
+
+def test_feed_does_not_readd_other_sources_and_restores_them(app):
+  feed = Feed(name='test-owner', url='http://feeds.invalid/owner.txt', source='test-owner', ttl=3600)
+  with app.app_context():
+    bulk_ingest(['4.4.4.4'], 'blacklist', 'manual-owner')
+
+    result = fetch(feed, b'4.4.4.4\n5.5.5.5\n')
+    assert result['inserted'] == 1
+    assert result['duplicates'] == 0
+    assert get_source_ips('blacklist', 'test-owner') == {'5.5.5.5'}
+
+    # Cits avots dzēš adresi, bet barotne nav mainījusies (304)
+    apply_changes('blacklist', 'manual-owner', {}, ['4.4.4.4'])
+    result = fetch(feed, b'', status_code=304)
+    assert result['status'] == 'unchanged'
+    assert result['inserted'] == 1
+    assert get_source_ips('blacklist', 'test-owner') == {'4.4.4.4', '5.5.5.5'}
+
+def test_feed_jobs_share_per_feed_keys(app):
+  from app.jobs import get_job_queue
+  with app.app_context():
+    queue = get_job_queue()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+      started.set()
+      release.wait(5)
+      return {}
+
+    job, created = queue.submit('feeds', slow, key=['feed:a', 'feed:b'])
+    assert created
+    started.wait(5)
+    other, created = queue.submit('b', lambda: {}, key='feed:b')
+    assert not created and other is job
+    release.set()
@@ -0,0 +1,224 @@
+import ipaddress
+import json
+import subprocess
+import pytest
+from utils.iprange import ip_to_range
+
+class FakeIpfw:
+  """
+  Aizstāj subprocess.run ar ipfw tabulu imitāciju. Komandu faili tiek izpildīti
+  līdz pirmajai kļūdai tāpat kā ar 'ipfw -q <fails>', kas neuzskata par kļūdu
+  esoša ieraksta pievienošanu vai trūkstoša dzēšanu.
+  """
+  def __init__(self, tables=None, broken=()):
+    self.tables = {number: set(entries) for number, entries in (tables or {}).items()}
+    self.broken = set(broken)
+    self.invocations = []
+
+  def execute(self, words, quiet=False):
+    if words[0] != 'table':
+      return True
+    number, command, args = int(words[1]), words[2], words[3:]
+    if command == 'create':
+      self.tables.setdefault(number, set())
+      return True
+    if number not in self.tables:
+      return False
+    table = self.tables[number]
+    if command == 'flush':
+      table.clear()
+    elif command == 'swap':
+      other = int(args[0])
+      self.tables[number], self.tables[other] = self.tables[other], table
+    elif command in ('add', 'delete'):
+      # ipfw glabā ierakstus kā tīklus ar prefiksa garumu
+      entry = str(ipaddress.ip_network(args[0]))
+      if command == 'add':
+        if entry in self.broken or (entry in table and not quiet):
+          return False
+        table.add(entry)
+      else:
+        if entry not in table and not quiet:
+          return False
+        table.discard(entry)
+    return True
+
+  def __call__(self, args, capture_output=False, text=False, check=False):
+    args = args[1:]
+    if args[0] == '-q':
+      with open(args[1]) as f:
+        lines = f.read().splitlines()
+      self.invocations.append(lines)
+      ok = all(self.execute(line.split(), quiet=True) for line in lines)
+      stdout = ''
+    elif args[0] == 'table' and args[2] == 'list':
+      ok = int(args[1]) in self.tables
+      stdout = ''.join(f'{entry} 0\n' for entry in sorted(self.tables.get(int(args[1]), ())))
+    else:
+      ok = self.execute(args)
+      stdout = ''
+    return subprocess.CompletedProcess(args, 0 if ok else 65, stdout, '' if ok else 'ipfw: failed')
+
+@pytest.fixture
+def host(monkeypatch, tmp_path):
+  import scripts.host as host
+  monkeypatch.setattr(host.settings, 'STATE_FILE', str(tmp_path / 'state.bin'))
+  monkeypatch.setattr(host, 'last_version', None)
+  monkeypatch.setattr(host, 'applied_ranges', None)
+  monkeypatch.setattr(host, 'last_drift_check', 0.0)
+  monkeypatch.setattr(host, 'api_reachable', lambda: True)
+  return host
+
+@pytest.fixture
+def ipfw(host, monkeypatch):
+  fake = FakeIpfw({host.settings.IPFW_TABLE: {'192.0.2.1/32'}})
+  monkeypatch.setattr(host.subprocess, 'run', fake)
+  return fake
+
+def test_diff_is_applied_in_batches(host, ipfw, monkeypatch):
+  monkeypatch.setattr(host.settings, 'IPFW_BATCH_SIZE', 3)
+  added = {f'198.18.19.{i}/32' for i in range(6)}
+  assert host.update_ipfw_table(added, {'192.0.2.1/32'})
+  assert [len(lines) for lines in ipfw.invocations] == [3, 3, 1]
+  assert ipfw.tables[host.settings.IPFW_TABLE] == added
+
+def test_failing_command_is_isolated_and_reported(host, ipfw, monkeypatch):
+  monkeypatch.setattr(host.settings, 'IPFW_BATCH_SIZE', 4)
+  commands = [f'table 2 add 198.18.19.{i}/32' for i in range(4)]
+  ipfw.broken.add('198.18.19.2/32')
+  assert host.apply_ipfw_commands(commands) == ['table 2 add 198.18.19.2/32']
+  assert ipfw.tables[2] == {'192.0.2.1/32', '198.18.19.0/32', '198.18.19.1/32', '198.18.19.3/32'}
+
+def test_partial_failure_is_rolled_back_and_not_saved(host, ipfw):
+  host.last_version, host.applied_ranges = 1, {ip_to_range('192.0.2.1/32')}
+  ipfw.broken.add('198.18.19.2/32')
+  added = {'198.18.19.1/32', '198.18.19.2/32'}
+  assert not host.update_ipfw_table(added, {'192.0.2.1/32'})
+  assert ipfw.tables[host.settings.IPFW_TABLE] == {'192.0.2.1/32'}
+
+  assert not host.apply_update(2, added, {'192.0.2.1/32'})
+  assert host.last_version == 1
+  assert host.applied_ranges == {ip_to_range('192.0.2.1/32')}
+  assert not host.load_state()
+
+def test_unreachable_api_rolls_back(host, ipfw, monkeypatch):
+  monkeypatch.setattr(host, 'api_reachable', lambda: False)
+  assert not host.update_ipfw_table({'198.18.19.1/32'}, {'192.0.2.1/32'}, verify_access='192.0.2.10')
+  assert ipfw.tables[host.settings.IPFW_TABLE] == {'192.0.2.1/32'}
+
+def test_large_diff_swaps_standby_table(host, ipfw, monkeypatch):
+  monkeypatch.setattr(host.settings, 'IPFW_SWAP_THRESHOLD', 2)
+  live, standby = host.settings.IPFW_TABLE, host.settings.IPFW_STANDBY_TABLE
+  host.last_version, host.applied_ranges = 1, {ip_to_range('192.0.2.1/32')}
+  added = {'198.18.20.1/32', '198.18.20.2/32'}
+  assert host.apply_update(2, added, {'192.0.2.1/32'})
+  assert ['table 3 create type addr', 'table 3 flush'] in ipfw.invocations
+  assert ['table 2 swap 3'] in ipfw.invocations
+  assert ipfw.tables[live] == added
+  assert ipfw.tables[standby] == {'192.0.2.1/32'}
+  assert host.last_version == 2
+
+  host.last_version = None
+  assert host.load_state()
+  assert host.last_version == 2
+  assert host.applied_ranges == {ip_to_range(ip) for ip in added}
+
+def test_failed_swap_keeps_live_table(host, ipfw, monkeypatch):
+  live = host.settings.IPFW_TABLE
+  ipfw.broken.add('198.18.20.2/32')
+  assert not host.swap_ipfw_table({'198.18.20.1/32', '198.18.20.2/32'})
+  assert ipfw.tables[live] == {'192.0.2.1/32'}
+  assert not any('swap' in line for lines in ipfw.invocations for line in lines)
+
+  ipfw.broken.clear()
+  monkeypatch.setattr(host, 'api_reachable', lambda: False)
+  assert not host.swap_ipfw_table({'198.18.20.1/32'}, verify_access='192.0.2.10')
+  assert ipfw.tables[live] == {'192.0.2.1/32'}
+
+class FakeResponse:
+  def __init__(self, payload=None, lines=()):
+    self.status_code = 200
+    self.payload = payload
+    self.lines = lines
+    self.text = ''
+
+  def json(self):
+    return self.payload
+
+  def iter_lines(self, decode_unicode=False):
+    return iter(self.lines)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+def event(name, **data):
+  return [f'event: {name}', f'data: {json.dumps(data)}', '']
+
+@pytest.fixture
+def api(host, monkeypatch):
+  """Aizstāj requests.get: delta vaicājumi neatgriež izmaiņas, plūsmas atbildes tiek ņemtas no streams"""
+  calls, streams = [], []
+
+  def get(url, params=None, **kwargs):
+    path = url[len(host.settings.HOST_API_URL):]
+    calls.append((path, params))
+    if path == '/export/stream':
+      return FakeResponse(lines=streams.pop(0))
+    return FakeResponse({'format': 'delta', 'version': params['since'], 'added': [], 'removed': []})
+
+  monkeypatch.setattr(host.requests, 'get', get)
+  return calls, streams
+
+def test_stream_reconnects_from_last_applied_version(host, ipfw, api):
+  calls, streams = api
+  host.last_version, host.applied_ranges = 5, {ip_to_range('192.0.2.1/32')}
+  streams.append([': connected', ''] + event('delta', version=6, added=['198.18.21.1'], removed=[]))
+  streams.append(event('delta', version=7, added=[], removed=['192.0.2.1/32']) + event('resync'))
+
+  assert host.follow_stream()
+  assert host.last_version == 6
+  assert ipfw.tables[host.settings.IPFW_TABLE] == {'192.0.2.1/32', '198.18.21.1/32'}
+
+  # Pēc plūsmas beigām savienojums tiek atjaunots no pēdējās lietotās versijas
+  assert host.follow_stream()
+  streams_opened = [params['since'] for path, params in calls if path == '/export/stream']
+  assert streams_opened == [5, 6]
+  assert host.last_version == 7
+  assert ipfw.tables[host.settings.IPFW_TABLE] == {'198.18.21.1/32'}
+  # resync notikums izraisa parastu sinhronizāciju no versijas 7
+  assert calls[-1] == ('/export/iptables', {'since': 7, 'full': 'false'})
+
+def test_stream_stops_on_failed_delta(host, ipfw, api):
+  calls, streams = api
+  host.last_version, host.applied_ranges = 5, {ip_to_range('192.0.2.1/32')}
+  ipfw.broken.add('198.18.21.2/32')
+  streams.append(
+    event('delta', version=6, added=['198.18.21.2'], removed=[])
+    + event('delta', version=7, added=['198.18.21.3'], removed=[])
+  )
+  streams.append([])
+
+  assert not host.follow_stream()
+  assert host.last_version == 5
+  assert ipfw.tables[host.settings.IPFW_TABLE] == {'192.0.2.1/32'}
+
+  ipfw.broken.clear()
+  host.follow_stream()
+  assert [params['since'] for path, params in calls if path == '/export/stream'] == [5, 5]
+
+def test_state_file_round_trip(host, tmp_path):
+  host.last_version = 9
+  host.applied_ranges = {ip_to_range('198.18.22.0/24'), ip_to_range('2001:db8::1')}
+  host.save_state()
+  host.last_version, host.applied_ranges = None, None
+  assert host.load_state()
+  assert host.last_version == 9
+  assert host.applied_ranges == {ip_to_range('198.18.22.0/24'), ip_to_range('2001:db8::1')}
+
+  with open(host.settings.STATE_FILE, 'wb') as f:
+    f.write(b'IPBL')
+  assert not host.load_state()
+  assert host.last_version == 9
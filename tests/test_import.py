@@ -0,0 +1,27 @@
+import pytest
+from db.database import bulk_ingest, get_blacklist
+
+@pytest.mark.parametrize('list_type', ['foo', 'blacklist; DROP TABLE whitelist'])
+def test_bulk_import_rejects_unknown_list_type(client, list_type):
+  response = client.post('/import/bulk', json={'ips': ['192.0.2.1'], 'type': list_type})
+  assert response.status_code == 400
+  assert 'Invalid list type' in response.json['error']
+
+  response = client.post(f'/import/bulk?type={list_type}', data='192.0.2.1\n', content_type='text/plain')
+  assert response.status_code == 400
+
+def test_single_import_rejects_unknown_list_type(client):
+  response = client.post('/import/single', json={'ip': '192.0.2.1', 'type': 'foo'})
+  assert response.status_code == 400
+
+def test_bulk_ingest_validates_list_type(app):
+  with app.app_context():
+    with pytest.raises(ValueError):
+      bulk_ingest(['192.0.2.1'], 'foo', 'test')
+
+def test_single_import_accepts_string_ttl(app, client):
+  response = client.post('/import/single', json={'ip': '198.18.7.50', 'source': 'ttl-test', 'ttl': '60'})
+  assert response.status_code == 201
+  with app.app_context():
+    entry = next(entry for entry in get_blacklist() if entry['ip'] == '198.18.7.50')
+  assert entry['expires_at'] is not None
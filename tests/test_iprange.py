@@ -0,0 +1,71 @@
+from db.database import bulk_ingest, get_blacklist
+from utils.iprange import ip_to_range, merge_ranges, range_overlaps, range_to_cidrs, subtract_ranges
+
+def subtract(blacklist, whitelist):
+  ranges = [ip_to_range(value) + (value,) for value in blacklist]
+  return [
+    (network, payload)
+    for family, start, end, payload in subtract_ranges(ranges, [ip_to_range(value) for value in whitelist])
+    for network in range_to_cidrs(family, start, end)
+  ]
+
+def test_whitelist_covering_entry_removes_it():
+  assert subtract(['10.1.0.0/24', '10.1.0.5'], ['10.0.0.0/8']) == []
+
+def test_whitelist_inside_entry_splits_it():
+  assert subtract(['10.1.0.0/24'], ['10.1.0.64/26']) == [
+    ('10.1.0.0/26', '10.1.0.0/24'),
+    ('10.1.0.128/25', '10.1.0.0/24'),
+  ]
+
+def test_overlapping_whitelist_ranges_are_merged():
+  assert subtract(['10.1.0.0/24'], ['10.1.0.0/25', '10.1.0.64/26', '10.1.0.96/27']) == [
+    ('10.1.0.128/25', '10.1.0.0/24'),
+  ]
+
+def test_whitelist_overlapping_entry_edge():
+  assert subtract(['10.1.0.0/25'], ['10.1.0.96/27', '10.1.0.128/25']) == [
+    ('10.1.0.0/26', '10.1.0.0/25'),
+    ('10.1.0.64/27', '10.1.0.0/25'),
+  ]
+
+def test_adjacent_whitelist_keeps_entry():
+  assert subtract(['10.1.1.0/24'], ['10.1.0.0/24', '10.1.2.0/24']) == [('10.1.1.0/24', '10.1.1.0/24')]
+
+def test_adjacent_whitelist_ranges_remove_entry():
+  assert subtract(['10.1.0.0/23'], ['10.1.0.0/24', '10.1.1.0/24']) == []
+
+def test_families_are_subtracted_separately():
+  assert subtract(['10.1.0.1', '2001:db8::1'], ['::/0']) == [('10.1.0.1', '10.1.0.1')]
+  assert subtract(['2001:db8::/127'], ['2001:db8::1']) == [('2001:db8::', '2001:db8::/127')]
+
+def test_blacklist_export_splits_partially_whitelisted_network(app):
+  with app.app_context():
+    bulk_ingest(['10.30.0.0/24'], 'blacklist', 'subtract-test', comment='split')
+    bulk_ingest(['10.30.0.0/25', '10.30.0.192/26'], 'whitelist', 'subtract-test')
+    entries = [entry for entry in get_blacklist() if entry['ip'].startswith('10.30.')]
+  assert [entry['ip'] for entry in entries] == ['10.30.0.128/26']
+  assert entries[0]['source'] == 'subtract-test'
+  assert entries[0]['comment'] == 'split'
+
+def test_range_overlaps_checks_neighbouring_ranges():
+  ranges = merge_ranges([ip_to_range('10.1.0.0/24'), ip_to_range('10.1.2.0/24'), ip_to_range('2001:db8::/32')])
+  keys = [(family, start) for family, start, _ in ranges]
+  assert range_overlaps(ranges, keys, *ip_to_range('10.1.0.7'))
+  assert range_overlaps(ranges, keys, *ip_to_range('10.1.1.0/23'))
+  assert range_overlaps(ranges, keys, *ip_to_range('10.0.0.0/8'))
+  assert not range_overlaps(ranges, keys, *ip_to_range('10.1.1.0/24'))
+  assert not range_overlaps(ranges, keys, *ip_to_range('10.1.3.0'))
+  assert not range_overlaps(ranges, keys, *ip_to_range('9.0.0.0/8'))
+  assert not range_overlaps(ranges, keys, 6, 0, 1)
+
+def test_blacklist_snapshot_is_kept_per_database(app):
+  from test_lookup import other_app
+  first = other_app(app, 'snapshot-first')
+  second = other_app(app, 'snapshot-second')
+  with first.app_context():
+    bulk_ingest(['198.18.24.1'], 'blacklist', 'first')
+    assert [entry['ip'] for entry in get_blacklist()] == ['198.18.24.1']
+  with second.app_context():
+    bulk_ingest(['198.18.24.2'], 'blacklist', 'second')
+    assert [entry['ip'] for entry in get_blacklist()] == ['198.18.24.2']
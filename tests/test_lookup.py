@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timedelta
+from flask import Flask
+from conftest import TEMP_DIR
+from db.database import _lookup_index, bulk_ingest, get_db, init_db, lookup_ip
+
+def test_lookup_refreshes_renewed_entry(app, client):
+  client.post('/import/single', json={'ip': '198.51.100.7', 'source': 'test', 'ttl': 3600})
+  with app.app_context():
+    assert lookup_ip('198.51.100.7')['blocked']
+
+    # Indeksā ieraksts ir beidzies, bet tabulā tā termiņš ir pagarināts
+    trie = _lookup_index()['tries']['blacklist']
+    stale = dict(trie.get('198.51.100.7'), expires_at=str(datetime.now() - timedelta(seconds=1)))
+    trie.insert('198.51.100.7', stale)
+
+    result = lookup_ip('198.51.100.7')
+    assert result['blocked']
+    assert trie.get('198.51.100.7') is not stale
+
+    with get_db() as db:
+      db.execute(
+        'UPDATE blacklist SET expires_at = ? WHERE ip = ?',
+        (str(datetime.now() - timedelta(seconds=1)), '198.51.100.7')
+      )
+      db.commit()
+    trie.insert('198.51.100.7', stale)
+    assert not lookup_ip('198.51.100.7')['blocked']
+
+def other_app(app, name):
+  """Otra lietotne tajā pašā procesā ar atsevišķu datubāzi"""
+  other = Flask(name)
+  other.config.update(app.config)
+  other.config['DATABASE_PATH'] = os.path.join(TEMP_DIR, f'{name}.db')
+  with other.app_context():
+    init_db()
+  return other
+
+def test_lookup_index_is_kept_per_database(app):
+  first = other_app(app, 'lookup-first')
+  second = other_app(app, 'lookup-second')
+  # Abās datubāzēs pēc viena importa ir vienāda versija
+  with first.app_context():
+    bulk_ingest(['198.18.13.1'], 'blacklist', 'first')
+    assert lookup_ip('198.18.13.1')['blocked']
+  with second.app_context():
+    bulk_ingest(['198.18.13.2'], 'blacklist', 'second')
+    assert not lookup_ip('198.18.13.1')['blocked']
+    assert lookup_ip('198.18.13.2')['blocked']
+  with first.app_context():
+    assert not lookup_ip('198.18.13.2')['blocked']
@@ -0,0 +1,46 @@
+import random
+from db.database import bulk_ingest, get_entries_by_id, lookup_ips, match_blacklist
+from test_lookup import other_app
+
+BLACKLIST = [
+  '198.18.20.0/24', '198.18.20.128/25', '198.18.20.200', '198.18.21.7',
+  '2001:db8:20::/48', '2001:db8:20:1::/64', '2001:db8:20:1::99', '2001:db8:21::1',
+]
+WHITELIST = ['198.18.20.64/26', '2001:db8:20:2::/64']
+
+def sample_addresses():
+  rng = random.Random(13)
+  ips = ['198.18.20.200', '198.18.20.70', '198.18.21.7', '198.18.21.8', '2001:db8:20:1::99',
+         '2001:db8:20:2::5', '2001:db8:21::1', '2001:db8:21::2', 'not-an-ip', '']
+  ips += [f'198.18.{rng.randint(19, 22)}.{rng.randint(0, 255)}' for _ in range(300)]
+  ips += [f'2001:db8:{rng.choice(["20", "21", "22"])}:{rng.randint(0, 3):x}::{rng.randint(0, 255):x}' for _ in range(300)]
+  return ips
+
+def test_matcher_agrees_with_trie_lookup(app):
+  with app.app_context():
+    bulk_ingest(BLACKLIST, 'blacklist', 'match-test')
+    bulk_ingest(WHITELIST, 'whitelist', 'match-test')
+    ips = sample_addresses()
+    result = match_blacklist(ips)
+    lookups = lookup_ips(ips)
+    entries = get_entries_by_id(result.ids[result.hits].tolist())
+
+  assert result.invalid == 2
+  for position, lookup in enumerate(lookups):
+    assert bool(result.valid[position]) == ('error' not in lookup), lookup['ip']
+    if 'error' in lookup:
+      continue
+    assert bool(result.hits[position]) == lookup['blocked'], lookup['ip']
+    if lookup['blocked']:
+      # Abi atrod visspecifiskāko ierakstu
+      assert entries[int(result.ids[position])]['ip'] == lookup['entry']['ip'], lookup['ip']
+
+def test_matcher_is_kept_per_database(app):
+  first = other_app(app, 'match-first')
+  second = other_app(app, 'match-second')
+  with first.app_context():
+    bulk_ingest(['198.18.23.1'], 'blacklist', 'first')
+    assert match_blacklist(['198.18.23.1']).matched == 1
+  with second.app_context():
+    bulk_ingest(['198.18.23.2'], 'blacklist', 'second')
+    assert match_blacklist(['198.18.23.1', '198.18.23.2']).hits.tolist() == [False, True]
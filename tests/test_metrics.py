@@ -0,0 +1,58 @@
+import pytest
+from utils.metrics import REGISTRY, Counter, Histogram
+
+@pytest.fixture
+def metric():
+  created = []
+
+  def make(cls, *args, **kwargs):
+    created.append(cls(*args, **kwargs))
+    return created[-1]
+
+  yield make
+  for item in created:
+    REGISTRY.remove(item)
+
+def test_histogram_buckets_are_cumulative_and_inclusive(metric):
+  histogram = metric(Histogram, 'test_seconds', 'Test', ('path',), buckets=(0.5, 0.1, 1.0))
+  for value in (0.05, 0.1, 0.3, 1.0, 7.0):
+    histogram.observe(value, 'bulk')
+  assert histogram.render() == [
+    '# HELP test_seconds Test',
+    '# TYPE test_seconds histogram',
+    'test_seconds_bucket{path="bulk",le="0.1"} 2',
+    'test_seconds_bucket{path="bulk",le="0.5"} 3',
+    'test_seconds_bucket{path="bulk",le="1.0"} 4',
+    'test_seconds_bucket{path="bulk",le="+Inf"} 5',
+    'test_seconds_sum{path="bulk"} 8.45',
+    'test_seconds_count{path="bulk"} 5',
+  ]
+
+def test_histogram_without_labels(metric):
+  histogram = metric(Histogram, 'test_plain_seconds', 'Test', buckets=(1.0,))
+  histogram.observe(2.0)
+  assert histogram.render()[2:] == [
+    'test_plain_seconds_bucket{le="1.0"} 0',
+    'test_plain_seconds_bucket{le="+Inf"} 1',
+    'test_plain_seconds_sum 2.0',
+    'test_plain_seconds_count 1',
+  ]
+
+def test_label_values_are_escaped_and_sorted(metric):
+  counter = metric(Counter, 'test_total', 'Test', ('source', 'outcome'))
+  counter.inc('b', 'ok')
+  counter.inc('a "quoted"\\path\nline', 'ok', amount=3)
+  assert counter.render()[2:] == [
+    'test_total{source="a \\"quoted\\"\\\\path\\nline",outcome="ok"} 3',
+    'test_total{source="b",outcome="ok"} 1',
+  ]
+
+def test_metrics_endpoint_labels_requests_by_endpoint(client):
+  client.get('/export/iptables?full=true')
+  response = client.get('/metrics')
+  assert response.status_code == 200
+  assert response.mimetype == 'text/plain'
+  text = response.get_data(as_text=True)
+  assert '# TYPE http_request_duration_seconds histogram' in text
+  assert 'http_requests_total{blueprint="export",endpoint="export.export_iptables",method="GET",status="200"}' in text
+  assert 'http_request_duration_seconds_bucket{blueprint="export",endpoint="export.export_iptables",method="GET",le="+Inf"}' in text
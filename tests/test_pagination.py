@@ -0,0 +1,52 @@
+from db.database import bulk_ingest, get_page
+
+def page_through(client, path, limit):
+  """Nolasa visas lapas un atgriež (lapu izmēri, visi ieraksti)"""
+  sizes = []
+  ips = []
+  after = None
+  while True:
+    url = f'{path}?limit={limit}' + (f'&after={after}' if after is not None else '')
+    response = client.get(url)
+    assert response.status_code == 200
+    page = response.json['ips']
+    sizes.append(len(page))
+    ips.extend(page)
+    after = response.json['next']
+    if after is None:
+      return sizes, ips
+
+def test_iptables_page_limit_counts_output_entries(app, client):
+  with app.app_context():
+    bulk_ingest(['10.40.0.0/24', '10.40.1.5', '10.40.2.0/24'], 'blacklist', 'page-test')
+    # Sadala 10.40.0.0/24 četros tīklos: .0/27, .64/26, .128/26, .192/27
+    bulk_ingest(['10.40.0.32/27', '10.40.0.224/27'], 'whitelist', 'page-test')
+
+  full = [ip for ip in client.get('/export/iptables').json['ips'] if ip.startswith('10.40.')]
+  assert len(full) == 6
+
+  sizes, ips = page_through(client, '/export/iptables', 2)
+  assert max(sizes) <= 2
+  assert [ip for ip in ips if ip.startswith('10.40.')] == [
+    '10.40.0.0/27', '10.40.0.64/26', '10.40.0.128/26', '10.40.0.192/27', '10.40.1.5', '10.40.2.0/24'
+  ]
+  assert sorted(ip for ip in ips if ip.startswith('10.40.')) == sorted(full)
+
+def test_invalid_cursor_is_rejected(client):
+  response = client.get('/export/iptables?limit=2&after=abc')
+  assert response.status_code == 400
+
+def test_whitelist_ranges_are_kept_per_database(app):
+  from test_lookup import other_app
+  first = other_app(app, 'whitelist-first')
+  second = other_app(app, 'whitelist-second')
+  with first.app_context():
+    bulk_ingest(['198.18.25.0/24'], 'blacklist', 'first')
+    bulk_ingest(['198.18.25.0/25'], 'whitelist', 'first')
+    page, _ = get_page('blacklist', limit=10)
+    assert [entry['ip'] for entry in page] == ['198.18.25.128/25']
+  with second.app_context():
+    bulk_ingest(['198.18.25.0/24'], 'blacklist', 'second')
+    bulk_ingest(['198.18.26.0/25'], 'whitelist', 'second')
+    page, _ = get_page('blacklist', limit=10)
+    assert [entry['ip'] for entry in page] == ['198.18.25.0/24']
@@ -0,0 +1,47 @@
+import threading
+from typing import Callable, Dict, Tuple
+
+class ExportCache:
+  """
+  Procesa atmiņas kešs eksportu atbildēm.
+  Katrs formāts tiek sagatavots vienreiz katrai datu versijai (tag) un atkārtoti
+  izmantots, līdz mainās dati vai tiek izsaukts invalidate().
+  """
+  def __init__(self):
+    self._entries: Dict[str, Tuple[str, bytes]] = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+
+  def get_or_render(self, key: str, tag: str, render: Callable[[], bytes]) -> bytes:
+    """
+    Atgriež kešoto atbildi norādītajai versijai vai sagatavo un saglabā jaunu.
+    """
+    entry = self._entries.get(key)
+    if entry is not None and entry[0] == tag:
+      with self._lock:
+        self.hits += 1
+      return entry[1]
+
+    body = render()
+    with self._lock:
+      self.misses += 1
+      self._entries[key] = (tag, body)
+    return body
+
+  def invalidate(self):
+    """Izmet visas kešotās atbildes"""
+    with self._lock:
+      self._entries.clear()
+      self.invalidations += 1
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        'entries': len(self._entries),
+        'hits': self.hits,
+        'misses': self.misses,
+        'invalidations': self.invalidations,
+        'bytes': sum(len(body) for _, body in self._entries.values())
+      }
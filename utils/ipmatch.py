@@ -0,0 +1,111 @@
+import socket
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Tuple
+import numpy as np
+
+@dataclass
+class MatchResult:
+  """
+  Vektorizētas salīdzināšanas rezultāts: katrai adresei pazīme, vai tā ir derīga,
+  vai tā atrasta sarakstā, un atrastā ieraksta id (-1, ja nav atrasts).
+  """
+  valid: np.ndarray
+  hits: np.ndarray
+  ids: np.ndarray
+
+  @property
+  def matched(self) -> int:
+    return int(self.hits.sum())
+
+  @property
+  def invalid(self) -> int:
+    return int((~self.valid).sum())
+
+  @classmethod
+  def concat(cls, results: List['MatchResult']) -> 'MatchResult':
+    if not results:
+      return cls(np.zeros(0, dtype=bool), np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64))
+    return cls(
+      np.concatenate([result.valid for result in results]),
+      np.concatenate([result.hits for result in results]),
+      np.concatenate([result.ids for result in results])
+    )
+
+def parse_addresses(ips: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+  """
+  Pārveido adreses skaitliskos masīvos bez ipaddress objektu veidošanas.
+  Atgriež IPv4 pozīcijas un uint32 vērtības, IPv6 pozīcijas un 16 baitu big-endian vērtības.
+  Nederīgās adreses netiek iekļautas nevienā masīvā.
+  """
+  index4, index6 = [], []
+  packed4, packed6 = bytearray(), bytearray()
+  for position, ip in enumerate(ips):
+    address = str(ip).strip()
+    try:
+      packed4 += socket.inet_pton(socket.AF_INET, address)
+      index4.append(position)
+      continue
+    except OSError:
+      pass
+    try:
+      packed6 += socket.inet_pton(socket.AF_INET6, address)
+      index6.append(position)
+    except OSError:
+      pass
+  return (
+    np.array(index4, dtype=np.int64),
+    np.frombuffer(bytes(packed4), dtype='>u4').astype(np.uint32),
+    np.array(index6, dtype=np.int64),
+    np.frombuffer(bytes(packed6), dtype='S16')
+  )
+
+class RangeMatcher:
+  """
+  Sakārtots nepārklājošos (family, start, end, id) segmentu masīvs,
+  pret kuru adreses tiek salīdzinātas ar np.searchsorted.
+  IPv4 adreses glabājas kā uint32, IPv6 kā 16 baitu big-endian virknes,
+  kuru leksikogrāfiskā secība sakrīt ar skaitlisko.
+  """
+  def __init__(self, segments: Iterable[Tuple[int, int, int, int]]):
+    segments = sorted(segments)
+    ipv4 = [item for item in segments if item[0] == 4]
+    ipv6 = [item for item in segments if item[0] == 6]
+    self._ipv4 = (
+      np.array([item[1] for item in ipv4], dtype=np.uint32),
+      np.array([item[2] for item in ipv4], dtype=np.uint32),
+      np.array([item[3] for item in ipv4], dtype=np.int64)
+    )
+    self._ipv6 = (
+      np.array([item[1].to_bytes(16, 'big') for item in ipv6], dtype='S16'),
+      np.array([item[2].to_bytes(16, 'big') for item in ipv6], dtype='S16'),
+      np.array([item[3] for item in ipv6], dtype=np.int64)
+    )
+
+  def __len__(self) -> int:
+    return len(self._ipv4[0]) + len(self._ipv6[0])
+
+  @staticmethod
+  def _search(table: tuple, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    starts, ends, ids = table
+    position = np.searchsorted(starts, values, side='right') - 1
+    found = position >= 0
+    position = np.maximum(position, 0)
+    hits = found & (values <= ends[position])
+    return hits, np.where(hits, ids[position], -1)
+
+  def match(self, ips: Sequence[str]) -> MatchResult:
+    """
+    Salīdzina adreses ar segmentiem un atgriež MatchResult tādā pašā secībā kā ievade.
+    """
+    index4, values4, index6, values6 = parse_addresses(ips)
+    count = len(ips)
+    result = MatchResult(
+      valid=np.zeros(count, dtype=bool),
+      hits=np.zeros(count, dtype=bool),
+      ids=np.full(count, -1, dtype=np.int64)
+    )
+    for index, values, table in ((index4, values4, self._ipv4), (index6, values6, self._ipv6)):
+      result.valid[index] = True
+      if len(index) and len(table[0]):
+        result.hits[index], result.ids[index] = self._search(table, values)
+    return result
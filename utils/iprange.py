@@ -0,0 +1,249 @@
+import ipaddress
+import socket
+import struct
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+# Adreses platums baitos katrai IP versijai
+ADDRESS_BYTES = {4: 4, 6: 16}
+
+def normalize_network(value: str) -> Optional[str]:
+  """
+  Pārveido IP vai CIDR adresi kanoniskā formā.
+  Atsevišķa adrese (arī /32 vai /128) tiek atgriezta bez prefiksa garuma.
+  """
+  try:
+    network = ipaddress.ip_network(value.strip(), strict=False)
+  except (ValueError, AttributeError):
+    return None
+  if network.num_addresses == 1:
+    return str(network.network_address)
+  return str(network)
+
+def ip_to_range(value: str) -> Tuple[int, int, int]:
+  """
+  Atgriež IP vai CIDR adreses versiju un skaitlisko sākuma un beigu adresi.
+  Atsevišķām adresēm netiek veidots ipaddress tīkla objekts.
+  """
+  if '/' not in value:
+    address = ipaddress.ip_address(value)
+    return address.version, int(address), int(address)
+  network = ipaddress.ip_network(value, strict=False)
+  return (
+    network.version,
+    int(network.network_address),
+    int(network.broadcast_address)
+  )
+
+def pack_address(version: int, number: int) -> bytes:
+  """
+  Iepako adresi fiksēta platuma big-endian baitos, lai SQLite BLOB salīdzināšana
+  sakristu ar skaitlisko secību.
+  """
+  return number.to_bytes(ADDRESS_BYTES[version], 'big')
+
+def unpack_address(data: bytes) -> int:
+  """Atpako pack_address iepakoto adresi"""
+  return int.from_bytes(data, 'big')
+
+def range_columns(value: str) -> Tuple[int, bytes, bytes]:
+  """
+  Atgriež (family, range_start, range_end) vērtības glabāšanai datubāzē.
+  """
+  parsed = parse_network(value)
+  if parsed is None:
+    raise ValueError(f'Invalid IP address {value!r}')
+  return parsed[1:]
+
+def parse_network(value: str) -> Optional[Tuple[str, int, bytes, bytes]]:
+  """
+  Normalizē adresi un aprēķina tās diapazona kolonnas ar vienu parsēšanu.
+  Atgriež (ip, family, range_start, range_end) vai None, ja adrese nav derīga.
+  IPv4 adresēm bez prefiksa tiek izmantots inet_pton, neveidojot ipaddress objektus,
+  bet IPv6 adresēm bez prefiksa ip_address, nevis ip_network.
+  """
+  try:
+    value = value.strip()
+    if '/' not in value:
+      if ':' not in value:
+        packed = socket.inet_pton(socket.AF_INET, value)
+        return socket.inet_ntop(socket.AF_INET, packed), 4, packed, packed
+      address = ipaddress.ip_address(value)
+      packed = int(address).to_bytes(ADDRESS_BYTES[address.version], 'big')
+      return str(address), address.version, packed, packed
+    network = ipaddress.ip_network(value, strict=False)
+  except (OSError, ValueError, AttributeError):
+    return None
+  version = network.version
+  start, end = int(network.network_address), int(network.broadcast_address)
+  ip = str(network.network_address) if start == end else str(network)
+  return ip, version, pack_address(version, start), pack_address(version, end)
+
+def range_to_cidrs(version: int, start: int, end: int) -> List[str]:
+  """
+  Pārveido skaitlisku adrešu diapazonu minimālā CIDR tīklu sarakstā.
+  """
+  address = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+  return [
+    normalize_network(str(network))
+    for network in ipaddress.summarize_address_range(address(start), address(end))
+  ]
+
+def merge_ranges(ranges: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+  """
+  Apvieno pārklājošos un blakus esošos (family, start, end) diapazonus.
+  Atgriež sakārtotu, nepārklājošos diapazonu sarakstu.
+  """
+  merged = []
+  for family, start, end in sorted(ranges):
+    if merged and merged[-1][0] == family and start <= merged[-1][2] + 1:
+      if end > merged[-1][2]:
+        merged[-1] = (family, merged[-1][1], end)
+    else:
+      merged.append((family, start, end))
+  return merged
+
+def range_overlaps(ranges: List[Tuple[int, int, int]], keys: List[Tuple[int, int]],
+                   family: int, start: int, end: int) -> bool:
+  """
+  Pārbauda, vai diapazons pārklājas ar kādu no merge_ranges apvienotajiem diapazoniem.
+  keys ir to (family, start) pāri. Pietiek pārbaudīt pēdējo diapazonu, kas sākas
+  ne vēlāk par end, jo apvienotie diapazoni ir sakārtoti un nepārklājas.
+  """
+  index = bisect_right(keys, (family, end))
+  if index == 0:
+    return False
+  other_family, _, other_end = ranges[index - 1]
+  return other_family == family and other_end >= start
+
+def subtract_ranges(ranges: Iterable[tuple], excluded: Iterable[Tuple[int, int, int]]) -> List[tuple]:
+  """
+  Izņem no (family, start, end, *payload) diapazoniem visas izslēgtās adreses.
+  Diapazoni, kas daļēji pārklājas ar izslēgtajiem, tiek sadalīti daļās ar to pašu payload.
+  Sarežģītība ir O((n+m) log(n+m)) plus izvades apjoms.
+  """
+  holes = merge_ranges(excluded)
+  hole_keys = [(family, start) for family, start, _ in holes]
+  result = []
+  for item in sorted(ranges, key=lambda item: (item[0], item[1])):
+    family, start, end = item[0], item[1], item[2]
+    payload = tuple(item[3:])
+    # Pirmais izslēgtais diapazons, kas varētu pārklāties ar šo
+    index = bisect_right(hole_keys, (family, start)) - 1
+    if index < 0 or holes[index][0] != family or holes[index][2] < start:
+      index += 1
+    cursor = start
+    while index < len(holes) and holes[index][0] == family and holes[index][1] <= end:
+      _, hole_start, hole_end = holes[index]
+      if hole_start > cursor:
+        result.append((family, cursor, hole_start - 1) + payload)
+      cursor = max(cursor, hole_end + 1)
+      if cursor > end:
+        break
+      index += 1
+    if cursor <= end:
+      result.append((family, cursor, end) + payload)
+  return result
+
+def flatten_ranges(ranges: Iterable[tuple]) -> List[tuple]:
+  """
+  Sadala ligzdotus (family, start, end, *payload) diapazonus, piemēram, CIDR tīklus,
+  nepārklājošos segmentos. Katrs segments saglabā visspecifiskākā (iekšējā)
+  diapazona payload, tāpēc adresi var atrast ar vienu bināro meklēšanu.
+  """
+  result = []
+  stack = []
+  cursor = 0
+
+  def close(item):
+    nonlocal cursor
+    if cursor <= item[2]:
+      result.append((item[0], cursor, item[2]) + tuple(item[3:]))
+      cursor = item[2] + 1
+
+  for item in sorted(ranges, key=lambda item: (item[0], item[1], -item[2])):
+    family, start = item[0], item[1]
+    while stack and (stack[-1][0] != family or stack[-1][2] < start):
+      close(stack.pop())
+    if stack and cursor < start:
+      result.append((family, cursor, start - 1) + tuple(stack[-1][3:]))
+    stack.append(item)
+    cursor = start
+  while stack:
+    close(stack.pop())
+  return result
+
+def widen_range(version: int, start: int, end: int, max_prefix: Optional[int]) -> Tuple[int, int]:
+  """
+  Paplašina diapazonu līdz tīklam, kura prefikss nav garāks par max_prefix.
+  """
+  bits = ADDRESS_BYTES[version] * 8
+  if max_prefix is None or max_prefix >= bits:
+    return start, end
+  host_mask = (1 << (bits - max_prefix)) - 1
+  return start & ~host_mask, end | host_mask
+
+def aggregate_networks(ranges: Iterable[Tuple[int, int, int]], max_prefix: Optional[int] = None,
+                       max_prefix6: Optional[int] = None,
+                       excluded: Iterable[Tuple[int, int, int]] = ()) -> List[str]:
+  """
+  Apvieno pārklājošās un blakus esošās adreses un tīklus minimālā CIDR kopā.
+  Ja norādīts max_prefix (IPv4) vai max_prefix6 (IPv6), šaurāki tīkli tiek
+  paplašināti līdz šim prefiksam, upurējot precizitāti mazāka noteikumu skaita labā.
+  Izslēgtie diapazoni (baltais saraksts) tiek atņemti pēc paplašināšanas, tāpēc
+  paplašināts tīkls nekad nenosedz aizsargātas adreses.
+  """
+  limits = {4: max_prefix, 6: max_prefix6}
+  widened = (
+    (version,) + widen_range(version, start, end, limits[version])
+    for version, start, end in ranges
+  )
+  return [
+    network
+    for version, start, end in subtract_ranges(merge_ranges(widened), excluded)
+    for network in range_to_cidrs(version, start, end)
+  ]
+
+# Binārā eksporta formāts: galvene (maģija, formāta versija, datu versija,
+# IPv4 un IPv6 diapazonu skaits), tad sakārtoti (start, end) pāri
+BINARY_MAGIC = b'IPBL'
+BINARY_FORMAT_VERSION = 1
+BINARY_HEADER = struct.Struct('>4sB3xQII')
+
+def pack_ranges(data_version: int, ranges: Iterable[Tuple[int, int, int]]) -> bytes:
+  """
+  Iepako (family, start, end) diapazonus kompaktā binārā formātā:
+  4 baiti uz IPv4 adresi un 16 baiti uz IPv6 adresi.
+  """
+  ranges = sorted(set(ranges))
+  ipv4 = [item for item in ranges if item[0] == 4]
+  ipv6 = [item for item in ranges if item[0] == 6]
+  parts = [BINARY_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, data_version, len(ipv4), len(ipv6))]
+  parts.extend(struct.pack('>II', start, end) for _, start, end in ipv4)
+  parts.extend(start.to_bytes(16, 'big') + end.to_bytes(16, 'big') for _, start, end in ipv6)
+  return b''.join(parts)
+
+def unpack_ranges(data: bytes) -> Tuple[int, List[Tuple[int, int, int]]]:
+  """
+  Atpako pack_ranges formātu, neveidojot adrešu virknes.
+  Atgriež datu versiju un (family, start, end) diapazonu sarakstu.
+  """
+  view = memoryview(data)
+  if len(view) < BINARY_HEADER.size:
+    raise ValueError('Truncated binary blacklist')
+  magic, format_version, data_version, count4, count6 = BINARY_HEADER.unpack_from(view)
+  if magic != BINARY_MAGIC or format_version != BINARY_FORMAT_VERSION:
+    raise ValueError('Unsupported binary blacklist format')
+
+  offset = BINARY_HEADER.size
+  end4 = offset + count4 * 8
+  end6 = end4 + count6 * 32
+  if len(view) < end6:
+    raise ValueError('Truncated binary blacklist')
+
+  ranges = [(4, start, end) for start, end in struct.iter_unpack('>II', view[offset:end4])]
+  ranges.extend(
+    (6, (start_high << 64) | start_low, (end_high << 64) | end_low)
+    for start_high, start_low, end_high, end_low in struct.iter_unpack('>QQQQ', view[end4:end6])
+  )
+  return data_version, ranges
@@ -0,0 +1,86 @@
+import ipaddress
+from typing import Any, Dict, List, Optional
+
+# Mezgla lauki: bērns bitam 0, bērns bitam 1, saglabātā vērtība
+ZERO, ONE, VALUE = 0, 1, 2
+
+class PrefixTrie:
+  """
+  Binārs prefiksu koks IPv4 un IPv6 tīkliem.
+  Katram tīklam tiek saglabāta viena vērtība; meklēšana atgriež visus tīklus,
+  kas satur adresi, sākot ar visspecifiskāko. Meklēšanas izmaksas ir atkarīgas
+  tikai no adreses garuma (32 vai 128 soļi), nevis no ierakstu skaita.
+  """
+  def __init__(self):
+    self._roots: Dict[int, list] = {4: [None, None, None], 6: [None, None, None]}
+    self._size = 0
+
+  def __len__(self) -> int:
+    return self._size
+
+  @staticmethod
+  def _path(network: str):
+    network = ipaddress.ip_network(network, strict=False)
+    bits = network.max_prefixlen
+    number = int(network.network_address)
+    return network.version, [(number >> (bits - 1 - depth)) & 1 for depth in range(network.prefixlen)]
+
+  def insert(self, network: str, value: Any):
+    """Saglabā vai aizstāj tīkla vērtību"""
+    version, path = self._path(network)
+    node = self._roots[version]
+    for bit in path:
+      if node[bit] is None:
+        node[bit] = [None, None, None]
+      node = node[bit]
+    if node[VALUE] is None:
+      self._size += 1
+    node[VALUE] = value
+
+  def remove(self, network: str) -> bool:
+    """Izņem tīklu un tukšos mezglus; atgriež False, ja tīkla kokā nebija"""
+    version, path = self._path(network)
+    nodes = [self._roots[version]]
+    for bit in path:
+      node = nodes[-1][bit]
+      if node is None:
+        return False
+      nodes.append(node)
+    if nodes[-1][VALUE] is None:
+      return False
+    nodes[-1][VALUE] = None
+    self._size -= 1
+
+    for depth in range(len(path), 0, -1):
+      node = nodes[depth]
+      if node[ZERO] is not None or node[ONE] is not None or node[VALUE] is not None:
+        break
+      nodes[depth - 1][path[depth - 1]] = None
+    return True
+
+  def get(self, network: str) -> Optional[Any]:
+    """Atgriež tieši šī tīkla vērtību vai None"""
+    version, path = self._path(network)
+    node = self._roots[version]
+    for bit in path:
+      node = node[bit]
+      if node is None:
+        return None
+    return node[VALUE]
+
+  def matches(self, version: int, number: int) -> List[Any]:
+    """
+    Atgriež visu tīklu vērtības, kas satur skaitlisko adresi,
+    sākot ar visgarāko prefiksu.
+    """
+    node = self._roots[version]
+    bits = 32 if version == 4 else 128
+    found = [node[VALUE]] if node[VALUE] is not None else []
+    for depth in range(bits):
+      node = node[(number >> (bits - 1 - depth)) & 1]
+      if node is None:
+        break
+      if node[VALUE] is not None:
+        found.append(node[VALUE])
+    found.reverse()
+    return found
@@ -1,45 +1,167 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from flask import current_app, request
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import current_app, has_request_context, request
 from werkzeug.local import LocalProxy
+from utils.metrics import Counter
+
+LOG_RECORDS_DROPPED = Counter('log_records_dropped_total', 'Log records dropped because the log queue was full')
+LOG_RECORDS_SUPPRESSED = Counter(
+    'log_records_suppressed_total', 'Log records suppressed by per-category rate limits', ('category',)
+)
+
+_listener = None
 
 def get_log_dir():
     """
     Iegūst log direktoriju no Flask  konfigurācijas.
     Ja nav pieejams, atgriež noklusējuma 'logs' direktoriju.
     """
+    return get_setting('LOG_DIR', 'logs')
+
+def get_setting(name, default):
+    """
+    Iegūst žurnālu iestatījumu no Flask konfigurācijas vai atgriež noklusējumu.
+    """
     try:
-        return current_app.config.get('LOG_DIR', 'logs')
+        return current_app.config.get(name, default)
     except RuntimeError:
         # Atgriež noklusējumu, ja ārpus lietojumprogrammas konteksta
-        return 'logs'
+        return default
+
+class RemoteAddrFilter(logging.Filter):
+    """
+    Pievieno ierakstam pieprasījuma attālo adresi izsaucēja pavedienā, jo fona
+    pavedienā, kurā ieraksts tiek formatēts, pieprasījuma konteksts nav pieejams.
+    """
+    def filter(self, record):
+        if not hasattr(record, 'remote_addr'):
+            record.remote_addr = request.remote_addr if has_request_context() else 'N/A'
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ierobežo INFO un DEBUG ierakstu skaitu sekundē katrai kategorijai (žurnāla nosaukuma
+    prefiksam) ar žetonu spaini. Brīdinājumi un kļūdas vienmēr tiek izlaisti cauri.
+    Nākamajam izlaistajam kategorijas ierakstam tiek pievienots izlaisto ierakstu skaits.
+    """
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = limits
+        self._categories = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def category(self, name):
+        """Atrod garāko konfigurēto prefiksu žurnāla nosaukumam (rezultāts tiek kešots)"""
+        try:
+            return self._categories[name]
+        except KeyError:
+            pass
+        matches = [
+            prefix for prefix in self.limits
+            if name == prefix or name.startswith(prefix + '.')
+        ]
+        category = max(matches, key=len) if matches else None
+        self._categories[name] = category
+        return category
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        category = self.category(record.name)
+        if category is None:
+            return True
+
+        rate = self.limits[category]
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(category, (rate, now, 0))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[category] = (tokens, now, suppressed + 1)
+                allowed = False
+            else:
+                self._buckets[category] = (tokens - 1, now, 0)
+                allowed = True
+
+        if not allowed:
+            LOG_RECORDS_SUPPRESSED.inc(category)
+            return False
+        if suppressed:
+            record.msg = f'{record.msg} [{suppressed} similar messages suppressed]'
+        return True
+
+def parse_rate_limits(value):
+    """Nolasa "prefikss=ieraksti_sekundē,..." konfigurāciju"""
+    limits = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            limits[name.strip()] = float(rate)
+    return limits
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Ievieto ierakstus rindā bez formatēšanas, lai formatēšana un faila I/O notiktu
+    QueueListener pavedienā. Ja rinda ir pilna, ieraksts tiek atmests, nevis bloķēts
+    pieprasījums.
+    """
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
 
 class RequestFormatter(logging.Formatter):
     """
     Pielāgots log formatētājs, kas pievieno pieprasījuma attālo adresi žurnāla ierakstam.
+    Adrese parasti jau ir pievienota ar RemoteAddrFilter ieraksta izveides brīdī.
     """
     def format(self, record):
-        record.remote_addr = request.remote_addr if request else 'N/A'
+        if not hasattr(record, 'remote_addr'):
+            record.remote_addr = request.remote_addr if has_request_context() else 'N/A'
         return super().format(record)
 
+@atexit.register
+def stop_logging():
+    """
+    Aptur fona žurnālu pavedienu, pirms tam ierakstot visus rindā esošos ierakstus.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 def setup_logging():
     """
     Iestata log veidošanu.
     Ietver log direktorijas izveidi, log formatētāju un apstrādātāju konfigurēšanu,
-    un līmeņa iestatīšanu logā.
+    un līmeņa iestatīšanu logā. Faila un konsoles apstrādātāji darbojas QueueListener
+    fona pavedienā, bet saknes žurnālam tiek pievienots tikai rindas apstrādātājs.
     """
+    global _listener
+
     # Iegūst žurnālu direktoriju no konfigurācijas vai noklusējuma
     log_dir = get_log_dir()
-    
+
     # Izveido žurnālu direktoriju, ja tas nepastāv
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # Konfigurē žurnālu veidošanu
     formatter = RequestFormatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(remote_addr)s - %(message)s'
     )
-    
+
     # Iestata failu apstrādātāju
     file_handler = RotatingFileHandler(
         os.path.join(log_dir, 'api.log'),
@@ -47,23 +169,30 @@ def setup_logging():
         backupCount=5
     )
     file_handler.setFormatter(formatter)
-    
+
     # Iestata konsoles apstrādātāju
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    
+
+    # Iestata rindas apstrādātāju un filtrus, kas darbojas izsaucēja pavedienā
+    queue_handler = BackgroundQueueHandler(queue.Queue(get_setting('LOG_QUEUE_SIZE', 10000)))
+    queue_handler.addFilter(RateLimitFilter(parse_rate_limits(get_setting('LOG_RATE_LIMITS', ''))))
+    queue_handler.addFilter(RemoteAddrFilter())
+
     # Konfigurē saknes žurnālu
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    
-    # Noņem esošos apstrādātājus, ja tādi ir
+
+    # Noņem esošos apstrādātājus, ja tādi ir, un aptur iepriekšējo fona pavedienu
     root_logger.handlers.clear()
-    
+    stop_logging()
+
     # Pievieno apstrādātājus
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    root_logger.addHandler(queue_handler)
+    _listener = QueueListener(queue_handler.queue, file_handler, console_handler)
+    _listener.start()
+
     # Apspiež werkzeug žurnālu veidošanu
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
-    
-    return root_logger
\ No newline at end of file
+
+    return root_logger
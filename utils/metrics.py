@@ -0,0 +1,188 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+from flask import Response, g, request
+
+# Noklusējuma histogrammu robežas sekundēs (HTTP pieprasījumiem)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Datubāzes vaicājumi parasti ir daudz ātrāki par pieprasījumiem
+DB_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def _escape(value: str) -> str:
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+  pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+  if extra:
+    pairs.append(extra)
+  return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+  """
+  Metrika ar nosaukumu, aprakstu un iezīmēm. Vērtības katrai iezīmju kombinācijai
+  tiek glabātas vārdnīcā; visas izmaiņas notiek zem vienas slēdzenes.
+  """
+  kind = 'untyped'
+
+  def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+    self.name = name
+    self.help = help_text
+    self.label_names = tuple(labels)
+    self._values: Dict[Tuple[str, ...], object] = {}
+    self._lock = threading.Lock()
+    REGISTRY.append(self)
+
+  def render(self) -> List[str]:
+    lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+    with self._lock:
+      items = sorted(self._values.items())
+    for labels, value in items:
+      lines.extend(self._render_value(labels, value))
+    return lines
+
+  def _render_value(self, labels: Tuple[str, ...], value) -> List[str]:
+    return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}']
+
+class Counter(Metric):
+  """Tikai augošs skaitītājs"""
+  kind = 'counter'
+
+  def inc(self, *labels: str, amount: float = 1):
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(Metric):
+  """Vērtība, kas var gan augt, gan samazināties"""
+  kind = 'gauge'
+
+  def set(self, value: float, *labels: str):
+    with self._lock:
+      self._values[labels] = value
+
+  def inc(self, *labels: str, amount: float = 1):
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def dec(self, *labels: str, amount: float = 1):
+    self.inc(*labels, amount=-amount)
+
+class Histogram(Metric):
+  """
+  Novērojumu sadalījums pa fiksētām robežām. Katrai iezīmju kombinācijai tiek glabāts
+  skaits katrā intervālā, summa un kopējais skaits; kumulatīvās vērtības tiek
+  aprēķinātas tikai izvadot, tāpēc novērošana ir viena bisect un dažas saskaitīšanas.
+  """
+  kind = 'histogram'
+
+  def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+    super().__init__(name, help_text, labels)
+    self.buckets = tuple(sorted(buckets))
+
+  def observe(self, value: float, *labels: str):
+    index = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      state = self._values.get(labels)
+      if state is None:
+        state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      state[0][index] += 1
+      state[1] += value
+      state[2] += 1
+
+  def _render_value(self, labels: Tuple[str, ...], value) -> List[str]:
+    counts, total, count = value
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+      cumulative += bucket_count
+      le = f'le="{_format_value(bound)}"'
+      lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}')
+    label_text = _format_labels(self.label_names, labels)
+    lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+    lines.append(f'{self.name}_count{label_text} {count}')
+    return lines
+
+REGISTRY: List[Metric] = []
+
+def render_metrics() -> str:
+  """Izvada visas reģistrētās metrikas Prometheus teksta formātā"""
+  lines = []
+  for metric in REGISTRY:
+    lines.extend(metric.render())
+  return '\n'.join(lines) + '\n'
+
+HTTP_REQUESTS = Counter(
+  'http_requests_total', 'HTTP requests by route, method and status', ('blueprint', 'endpoint', 'method', 'status')
+)
+HTTP_LATENCY = Histogram(
+  'http_request_duration_seconds', 'HTTP request latency by route', ('blueprint', 'endpoint', 'method')
+)
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being handled', ('blueprint',))
+
+DB_QUERY_LATENCY = Histogram(
+  'db_query_duration_seconds', 'SQLite statement execution time by statement type', ('statement',), buckets=DB_BUCKETS
+)
+DB_CONNECTIONS_OPENED = Counter('db_connections_opened_total', 'SQLite connections opened by the pool')
+
+IMPORT_ROWS = Counter('import_rows_total', 'Imported rows by import path and outcome', ('path', 'outcome'))
+IMPORT_LATENCY = Histogram('import_duration_seconds', 'Import run duration by import path', ('path',))
+IMPORT_ROWS_PER_SECOND = Gauge('import_rows_per_second', 'Throughput of the last import run by import path', ('path',))
+
+# Vaicājumu veidi, kas tiek izdalīti atsevišķi; pārējie tiek uzskaitīti kā OTHER
+STATEMENT_TYPES = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'CREATE', 'WITH'}
+
+def observe_query(sql: str, seconds: float):
+  """Reģistrē SQL vaicājuma izpildes laiku pēc tā veida"""
+  words = sql.lstrip().split(None, 1)
+  statement = words[0].upper() if words else 'OTHER'
+  DB_QUERY_LATENCY.observe(seconds, statement if statement in STATEMENT_TYPES else 'OTHER')
+
+def record_import(path: str, result):
+  """Reģistrē importa rezultātu (IngestResult): rindas pēc iznākuma, ilgumu un ātrumu"""
+  for outcome in ('inserted', 'duplicates', 'invalid', 'removed'):
+    value = getattr(result, outcome)
+    if value:
+      IMPORT_ROWS.inc(path, outcome, amount=value)
+  IMPORT_LATENCY.observe(result.seconds, path)
+  IMPORT_ROWS_PER_SECOND.set(result.rows_per_second, path)
+
+def init_metrics(app):
+  """
+  Reģistrē pieprasījumu laika mērīšanu un /metrics galapunktu.
+  Maršruta iezīme ir Flask endpoint nosaukums, tāpēc iezīmju skaits ir ierobežots
+  arī tad, ja URL satur mainīgas daļas.
+  """
+  @app.before_request
+  def start_timer():
+    g.metrics_started = time.perf_counter()
+    g.metrics_blueprint = request.blueprint or ''
+    HTTP_IN_FLIGHT.inc(g.metrics_blueprint)
+
+  @app.after_request
+  def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+  # Straumētām atbildēm teardown notiek pēc straumes beigām
+  @app.teardown_request
+  def record_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+      return
+    blueprint = g.pop('metrics_blueprint', '')
+    endpoint = request.endpoint or 'unmatched'
+    status = g.pop('metrics_status', 500 if exc is not None else 200)
+    HTTP_IN_FLIGHT.dec(blueprint)
+    HTTP_LATENCY.observe(time.perf_counter() - started, blueprint, endpoint, request.method)
+    HTTP_REQUESTS.inc(blueprint, endpoint, request.method, str(status))
+
+  @app.route('/metrics')
+  def metrics():
+    """Atgriež metrikas Prometheus teksta formātā"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,27 @@
+import threading
+from typing import Optional
+
+class ChangeNotifier:
+  """
+  Ļauj pavedieniem gaidīt nākamo šajā procesā apstiprināto izmaiņu, nevis periodiski
+  vaicāt datubāzei. Katra izmaiņa palielina paaudzes skaitītāju un pamodina gaidītājus.
+  """
+  def __init__(self):
+    self._condition = threading.Condition()
+    self._generation = 0
+
+  @property
+  def generation(self) -> int:
+    return self._generation
+
+  def notify(self):
+    with self._condition:
+      self._generation += 1
+      self._condition.notify_all()
+
+  def wait(self, generation: int, timeout: Optional[float] = None) -> bool:
+    """
+    Gaida, līdz paaudze atšķiras no norādītās. Atgriež False, ja beidzās timeout.
+    """
+    with self._condition:
+      return self._condition.wait_for(lambda: self._generation != generation, timeout)
@@ -1,6 +1,7 @@
 import ipaddress
 from typing import Union, Optional
 import csv
+import gzip
 import os
 
 def validate_ip(ip: str) -> Optional[str]:
@@ -31,23 +32,18 @@ def validate_csv_file(filepath: str) -> bool:
 #     return False
 
 def validate_fail2ban_file(filepath: str) -> bool:
-  return True
-#   """Validē, vai fails pastāv un tam ir fail2ban formāts"""
-#   if not os.path.exists(filepath):
-#     return False
+  """Validē, vai fails pastāv un tam ir fail2ban formāts (arī gzip saspiestiem failiem)"""
+  if not os.path.isfile(filepath):
+    return False
     
-#   try:
-#     with open(filepath, 'r') as f:
-#       # Pārbauda pirmās dažas rindas fail2ban formāta indikatoriem
-#       for _ in range(5):
-#         line = f.readline()
-#         if 'fail2ban' in line.lower():
-#           return True
-#     return False
-#   except:
-#     return False
-
-def parse_ip_range(ip_range: str) -> list[str]:
-  """Parsē IP adreses no CIDR diapazona"""
-  network = ipaddress.ip_network(ip_range, strict=False)
-  return [str(ip) for ip in network.hosts()]
\ No newline at end of file
+  try:
+    opener = gzip.open if filepath.endswith('.gz') else open
+    with opener(filepath, 'rt', errors='replace') as f:
+      # Pārbauda pirmās dažas rindas fail2ban formāta indikatoriem
+      for _ in range(5):
+        line = f.readline()
+        if 'fail2ban' in line.lower():
+          return True
+    return False
+  except (OSError, EOFError):
+    return False